@@ -1,4 +1,5 @@
 from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
 import os
@@ -30,13 +31,21 @@ class TextInput(BaseModel):
     text: str
 
 @app.post("/process-text")
-def process_text(input_data: TextInput):
-    output = jarvis._handle_user_input(input_data.text, response_format='HTML')
+async def process_text(input_data: TextInput):
+    output = await jarvis._ahandle_user_input(input_data.text, response_format='HTML')
     # Get the current agent name
     #agent_name = jarvis.current_agent.name if hasattr(jarvis, 'current_agent') and jarvis.current_agent else "Mia"
     # Return just the output
     return {"output": output}
 
+@app.post("/process-text-stream")
+async def process_text_stream(input_data: TextInput):
+    # newline-delimited JSON: a "start" event, "token" events, then the "final" response
+    async def event_stream():
+        async for event in jarvis.astream_user_input(input_data.text, response_format='HTML'):
+            yield json.dumps(event) + "\n"
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
+
 # Helper function to read file and return list of strings
 def read_file(filepath: str) -> list:
     if not os.path.exists(filepath):
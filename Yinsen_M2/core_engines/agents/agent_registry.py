@@ -0,0 +1,74 @@
+import logging
+import asyncio
+import threading
+from typing import Dict, List, Any, Optional
+
+from core_engines.agents.llm_agent import LLMAgent
+
+
+class AgentRegistry:
+    """
+    Lazily constructed LLM agents, one instance per agent type.
+
+    Agents are described by the agent config (main agents at the top level, helper
+    agents under helper_agents), but only built the first time they are requested.
+    Building an agent reads its instructions and loads its conversation history, so
+    startup only pays for the agents that are actually used.
+    """
+
+    def __init__(self, agent_config: Dict[str, Any], agent_type_to_name_map: str):
+        self.logger = logging.getLogger(__name__)
+        self.agent_config = agent_config
+        self.agent_type_to_name_map = agent_type_to_name_map
+
+        # agent_type -> (agent_category, config section the agent reads its settings from)
+        self._specs = {}
+        for agent_type, agent_data in agent_config.items():
+            if isinstance(agent_data, dict) and 'name' in agent_data:
+                self._specs[agent_type] = ("main", agent_config)
+        for agent_type, agent_data in agent_config.get('helper_agents', {}).items():
+            if isinstance(agent_data, dict) and 'name' in agent_data:
+                self._specs[agent_type] = ("helper", agent_config['helper_agents'])
+
+        self._agents = {}
+        self._lock = threading.Lock()
+
+    def agent_types(self, agent_category: Optional[str] = None) -> List[str]:
+        """Configured agent types, optionally only those of one category"""
+        return [agent_type for agent_type, (category, _) in self._specs.items()
+                if agent_category is None or category == agent_category]
+
+    def agent_name(self, agent_type: str) -> str:
+        """Configured name of an agent, without constructing it"""
+        _, section = self._specs[agent_type]
+        return section[agent_type]['name']
+
+    def is_loaded(self, agent_type: str) -> bool:
+        return agent_type in self._agents
+
+    def get(self, agent_type: str) -> LLMAgent:
+        """Get the agent of a type, constructing it on first use"""
+        agent = self._agents.get(agent_type)
+        if agent is not None:
+            return agent
+
+        # agents can be requested from worker threads (e.g. the tool handler)
+        with self._lock:
+            if agent_type not in self._agents:
+                agent_category, section = self._specs[agent_type]
+                self._agents[agent_type] = LLMAgent(
+                    agent_name=section[agent_type]['name'],
+                    config=section,
+                    agent_type=agent_type,
+                    agent_category=agent_category,
+                    agent_type_to_name_map=self.agent_type_to_name_map
+                )
+                self.logger.info(f"{agent_type} agent '{self._agents[agent_type].agent_name}' initialized")
+            return self._agents[agent_type]
+
+    async def aget(self, agent_type: str) -> LLMAgent:
+        """Async version of get; a first-time construction (file reads) runs in a worker thread"""
+        agent = self._agents.get(agent_type)
+        if agent is not None:
+            return agent
+        return await asyncio.to_thread(self.get, agent_type)
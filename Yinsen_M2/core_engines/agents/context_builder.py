@@ -0,0 +1,107 @@
+import logging
+import math
+import threading
+from functools import lru_cache
+from typing import Dict, List, Any, Optional
+
+from core_engines.agents.history_compactor import is_summary_message
+
+try:
+    import tiktoken
+except ImportError:  # optional dependency, fall back to an estimate
+    tiktoken = None
+
+
+# Tokens added by the chat format around every message (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+class TokenCounter:
+    """
+    Count tokens of chat messages with a local tokenizer.
+
+    Uses tiktoken when it is installed, otherwise estimates ~4 characters per token.
+    Per-message counts are cached, so a message is only tokenized once while it
+    stays in the conversation history.
+    """
+
+    def __init__(self, model_name: str, cache_size: int = 4096):
+        self.logger = logging.getLogger(__name__)
+        self.model_name = model_name
+        self.encoding = self._load_encoding(model_name)
+        self.count_message = lru_cache(maxsize=cache_size)(self._count_message)
+
+    def _load_encoding(self, model_name: str):
+        if tiktoken is None:
+            self.logger.info("tiktoken not installed, estimating token counts from text length")
+            return None
+        try:
+            try:
+                return tiktoken.encoding_for_model(model_name)
+            except KeyError:
+                return tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            # tiktoken downloads the encoding on first use, which fails offline
+            self.logger.warning(f"Could not load tokenizer for {model_name}, estimating token counts: {e}")
+            return None
+
+    def count_text(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.encoding is None:
+            return math.ceil(len(text) / 4)
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def _count_message(self, role: str, content: str) -> int:
+        return self.count_text(role) + self.count_text(content) + MESSAGE_OVERHEAD_TOKENS
+
+    def count(self, message: Dict[str, Any]) -> int:
+        return self.count_message(message.get('role', ''), str(message.get('content') or ''))
+
+
+_token_counters = {}
+_token_counters_lock = threading.Lock()
+
+def get_token_counter(model_name: str) -> TokenCounter:
+    """Get the process-wide token counter for a model, so agents on the same model share a cache"""
+    with _token_counters_lock:
+        if model_name not in _token_counters:
+            _token_counters[model_name] = TokenCounter(model_name)
+        return _token_counters[model_name]
+
+
+class ContextBuilder:
+    """
+    Select the conversation history messages to send with a prompt.
+
+    Messages are taken newest-first until the token budget is used up, so the size of
+    the prompt (and the latency of the call) stays predictable no matter how large
+    individual messages, e.g. dumped tool results, are.
+    """
+
+    def __init__(self, model_name: str, token_budget: int, max_messages: Optional[int] = None):
+        self.token_counter = get_token_counter(model_name)
+        self.token_budget = token_budget
+        self.max_messages = max_messages
+
+    def select(self, history: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Return the newest messages of history that fit in the token budget, oldest first"""
+        # the rolling summary of older turns is always kept if it fits
+        pinned = []
+        if history and is_summary_message(history[0]):
+            pinned, history = history[:1], history[1:]
+
+        selected = []
+        used = sum(self.token_counter.count(message) for message in pinned)
+        if used > self.token_budget:
+            pinned, used = [], 0
+        for message in reversed(history):
+            if self.max_messages is not None and len(selected) >= self.max_messages:
+                break
+            tokens = self.token_counter.count(message)
+            if used + tokens > self.token_budget:
+                break
+            selected.append(message)
+            used += tokens
+        selected.reverse()
+        return pinned + selected
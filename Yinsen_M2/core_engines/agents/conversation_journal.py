@@ -0,0 +1,126 @@
+import logging
+import json
+import gzip
+import os
+import tempfile
+import threading
+from typing import Dict, List, Any
+
+
+class ConversationJournal:
+    """
+    Append-only persistence for an agent's conversation history.
+
+    The history is stored as a gzipped JSON snapshot (the agent's history_file) plus a
+    JSONL journal next to it. Each turn only appends its new messages to the journal,
+    so saving costs O(message) instead of rewriting the whole history. Every
+    compaction_interval journal entries the snapshot is rewritten and the journal truncated.
+
+    Journal lines look like {"gen": <snapshot generation>, "seq": <index in the history>,
+    "message": {...}}. Every compaction writes the snapshot with the next generation before
+    the journal is truncated, so after a crash between the two steps the old entries are
+    recognised by their generation and skipped instead of being replayed onto a snapshot
+    that already contains them (or that was shortened by replace_prefix).
+    """
+
+    def __init__(self, history_file: str, compaction_interval: int = 200):
+        self.logger = logging.getLogger(__name__)
+        self.snapshot_file = history_file
+        self.journal_file = self._journal_path(history_file)
+        self.compaction_interval = compaction_interval
+
+        self.persisted_length = 0  # number of history messages on disk
+        self.generation = 0        # generation of the snapshot on disk, journal entries are tagged with it
+        self.journal_entries = 0   # number of entries in the journal since the last compaction
+        self._lock = threading.Lock()
+
+    def _journal_path(self, history_file: str) -> str:
+        base = history_file
+        for suffix in ('.gz', '.json'):
+            if base.endswith(suffix):
+                base = base[:-len(suffix)]
+        return base + '.journal.jsonl'
+
+    def load(self) -> List[Dict[str, Any]]:
+        """Load the snapshot and replay the journal on top of it"""
+        history = []
+        self.generation = 0
+        if os.path.exists(self.snapshot_file):
+            with gzip.open(self.snapshot_file, 'rt', encoding='utf-8') as f:
+                snapshot = json.load(f)
+            # snapshots from before generations are a plain list (generation 0)
+            if isinstance(snapshot, dict):
+                history, self.generation = snapshot['history'], snapshot['generation']
+            else:
+                history = snapshot
+
+        self.journal_entries = 0
+        if os.path.exists(self.journal_file):
+            with open(self.journal_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # torn write at the end of the journal
+                        self.logger.warning(f"Skipping unreadable journal entry in {self.journal_file}")
+                        continue
+                    if entry.get('gen', 0) != self.generation:
+                        continue  # written before the snapshot was compacted, already part of it
+                    self.journal_entries += 1
+                    if entry['seq'] == len(history):
+                        history.append(entry['message'])
+
+        self.persisted_length = len(history)
+        return history
+
+    def sync(self, history: List[Dict[str, Any]]):
+        """Append the messages not yet on disk to the journal, compacting when due"""
+        with self._lock:
+            new_messages = history[self.persisted_length:]
+            if not new_messages:
+                return
+
+            os.makedirs(os.path.dirname(self.journal_file) or '.', exist_ok=True)
+            with open(self.journal_file, 'a', encoding='utf-8') as f:
+                for seq, message in enumerate(new_messages, start=self.persisted_length):
+                    f.write(json.dumps({'gen': self.generation, 'seq': seq, 'message': message}, ensure_ascii=False) + '\n')
+                f.flush()
+
+            self.persisted_length = len(history)
+            self.journal_entries += len(new_messages)
+
+            if self.journal_entries >= self.compaction_interval:
+                self._compact(history)
+
+    def replace_prefix(self, history: List[Dict[str, Any]], count: int, messages: List[Dict[str, Any]]):
+        """Replace the first count messages of history in place and rewrite the snapshot"""
+        with self._lock:
+            history[:count] = messages
+            self._compact(history)
+
+    def compact(self, history: List[Dict[str, Any]]):
+        """Rewrite the snapshot with the full history and truncate the journal"""
+        with self._lock:
+            self._compact(history)
+
+    def _compact(self, history: List[Dict[str, Any]]):
+        directory = os.path.dirname(self.snapshot_file) or '.'
+        os.makedirs(directory, exist_ok=True)
+
+        # write next to the target so the rename is atomic
+        generation = self.generation + 1
+        fd, temp_filename = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as raw, gzip.open(raw, 'wt', encoding='utf-8') as f:
+                json.dump({'generation': generation, 'history': history}, f, ensure_ascii=False)
+            os.replace(temp_filename, self.snapshot_file)
+        except Exception:
+            os.unlink(temp_filename)
+            raise
+
+        # the journal is now folded into the snapshot; its entries carry the old generation until it is truncated
+        self.generation = generation
+        open(self.journal_file, 'w').close()
+        self.persisted_length = len(history)
+        self.journal_entries = 0
+        self.logger.info(f"Compacted conversation history into {self.snapshot_file} ({len(history)} messages)")
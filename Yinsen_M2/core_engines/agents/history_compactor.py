@@ -0,0 +1,125 @@
+import logging
+import json
+import gzip
+import os
+import threading
+from typing import Dict, List, Any
+
+# Marks the rolling summary message that replaces old turns at the start of the history
+SUMMARY_PREFIX = "Summary of the earlier conversation with the user: "
+
+SUMMARY_INSTRUCTIONS = "You maintain the long-term memory of an assistant agent. \
+Summarize the conversation below into a concise summary of at most 250 words. \
+Keep facts about the user, their preferences, decisions made, open tasks and anything the agent promised to do. \
+If the conversation starts with an earlier summary, merge it into the new summary. \
+Return only the summary text."
+
+# Long messages (e.g. dumped tool results) are cut before being summarized
+MAX_CHARS_PER_MESSAGE = 2000
+
+
+def is_summary_message(message: Dict[str, Any]) -> bool:
+    return message.get('role') == 'system' and str(message.get('content', '')).startswith(SUMMARY_PREFIX)
+
+
+class HistoryCompactor:
+    """
+    Keep an agent's resident conversation history bounded.
+
+    When the history grows past max_resident_messages, the oldest turns (all but the
+    keep_recent_messages newest) are summarized into a single rolling summary message by a
+    background thread. The thread never touches the history itself: the agent swaps the
+    summary in with apply() on its own thread when it next saves. The raw turns are then
+    appended to a gzipped JSONL archive next to the history file, and the snapshot is
+    rewritten with the compacted history, so memory use and load time stay flat for
+    long-lived agents.
+    """
+
+    def __init__(self, agent, max_resident_messages: int = 200, keep_recent_messages: int = 50):
+        self.logger = logging.getLogger(__name__)
+        self.agent = agent
+        self.max_resident_messages = max_resident_messages
+        self.keep_recent_messages = keep_recent_messages
+        self.archive_file = self._archive_path(agent.history_file)
+
+        self._thread = None
+        self._pending = None  # (folded messages, summary message) waiting for apply()
+        self._lock = threading.Lock()
+
+    def _archive_path(self, history_file: str) -> str:
+        base = history_file
+        for suffix in ('.gz', '.json'):
+            if base.endswith(suffix):
+                base = base[:-len(suffix)]
+        return base + '.archive.jsonl.gz'
+
+    def maybe_compact(self):
+        """Start a background compaction if the history is over the limit and none is running"""
+        if not self.max_resident_messages or len(self.agent.conversation_history) <= self.max_resident_messages:
+            return
+        with self._lock:
+            if self._pending is not None or (self._thread is not None and self._thread.is_alive()):
+                return
+            self._thread = threading.Thread(target=self._compact, daemon=True)
+            self._thread.start()
+
+    def _compact(self):
+        try:
+            history = self.agent.conversation_history
+            fold_count = len(history) - self.keep_recent_messages
+            if fold_count <= 1:
+                return
+            to_fold = history[:fold_count]
+
+            summary = self._summarize(to_fold)
+            summary_message = {"role": "system", "content": SUMMARY_PREFIX + summary}
+            with self._lock:
+                self._pending = (to_fold, summary_message)
+
+        except Exception as e:
+            self.logger.error(f"Error compacting conversation history: {e}")
+
+    def apply(self, history: List[Dict[str, Any]]) -> bool:
+        """
+        Fold a finished summary into history, called from the thread that owns the history.
+        Returns True if the history was compacted (the snapshot is then rewritten).
+        """
+        with self._lock:
+            pending, self._pending = self._pending, None
+        if pending is None:
+            return False
+        to_fold, summary_message = pending
+        # a turn discarded while we summarized changes the prefix: summarize again later
+        if len(history) < len(to_fold) or any(message is not folded for message, folded in zip(history, to_fold)):
+            self.logger.info(f"{self.agent.agent_name}'s history changed while it was summarized, not compacting")
+            return False
+
+        self._archive([message for message in to_fold if not is_summary_message(message)])
+        self.agent.history_journal.replace_prefix(history, len(to_fold), [summary_message])
+        self.logger.info(f"Folded {len(to_fold)} messages of {self.agent.agent_name}'s history into a summary")
+        return True
+
+    def _summarize(self, messages: List[Dict[str, Any]]) -> str:
+        transcript = "\n".join(
+            f"{message.get('role')}: {str(message.get('content', ''))[:MAX_CHARS_PER_MESSAGE]}"
+            for message in messages
+        )
+        response = self.agent.client.chat.completions.create(
+            model=self.agent.model_name,
+            messages=[
+                {"role": "system", "content": SUMMARY_INSTRUCTIONS},
+                {"role": "user", "content": transcript}
+            ],
+            max_tokens=500,
+            temperature=0.2
+        )
+        return response.choices[0].message.content.strip()
+
+    def _archive(self, messages: List[Dict[str, Any]]):
+        """Append raw messages to the cold storage archive (one gzip member per batch)"""
+        if not messages:
+            return
+        os.makedirs(os.path.dirname(self.archive_file) or '.', exist_ok=True)
+        with gzip.open(self.archive_file, 'at', encoding='utf-8') as f:
+            for message in messages:
+                f.write(json.dumps(message, ensure_ascii=False) + '\n')
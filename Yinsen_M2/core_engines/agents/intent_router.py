@@ -0,0 +1,165 @@
+import logging
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Any, Optional, Tuple
+
+TOKEN_PATTERN = re.compile(r"[a-z]+")
+
+STOPWORDS = {
+    "the", "and", "for", "you", "your", "are", "with", "that", "this", "from", "have", "has", "can",
+    "will", "would", "should", "any", "all", "not", "but", "its", "into", "when", "what", "how",
+    "need", "use", "using", "such", "also", "them", "they", "their", "our", "ask", "user", "agent",
+    "response", "please", "want", "like", "some", "about", "just",
+}
+
+# Explicit switch commands, e.g. "switch to Flock", "take me back to the orchestrator"
+SWITCH_COMMAND_PATTERN = re.compile(
+    r"^\s*(?:please\s+)?(?:switch|change|go|talk|take\s+me|connect\s+me|transfer\s+me)(?:\s+back)?\s+to\s+(?:the\s+)?(.+?)[\s.!?]*$",
+    re.IGNORECASE)
+
+
+def _stem(word: str) -> str:
+    """Very small suffix stripper, enough to match 'expenses'/'expense' or 'logging'/'log'"""
+    if word.endswith("ies") and len(word) > 4:
+        word = word[:-3] + "y"
+    elif word.endswith("s") and not word.endswith("ss") and len(word) > 3:
+        word = word[:-1]
+    for suffix in ("ing", "ed"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)]
+            if len(word) > 2 and word[-1] == word[-2]:
+                word = word[:-1]
+            break
+    if word.endswith("e") and len(word) > 3:
+        word = word[:-1]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    return [_stem(word) for word in TOKEN_PATTERN.findall(text.lower())
+            if len(word) > 2 and word not in STOPWORDS]
+
+
+class IntentRouter:
+    """
+    CPU-only routing of user input to a main agent, in front of the LLM agents.
+
+    Two mechanisms:
+    - an alias table (agent type, configured name, domain words and configured aliases),
+      used for explicit switch commands and by MAS_system_1._switch_agent;
+    - a TF-IDF nearest-centroid classifier trained from each main agent's instruction
+      file plus its route_keywords. A decision is only acted on if its score is at least
+      min_score and its share of all agents' scores (the confidence) is at least
+      min_confidence; everything else goes to the current agent. It is trained at startup
+      only if routing is enabled, otherwise on first use.
+
+    tool_words (the email/calendar tools every main agent can use) are left out of the
+    classifier, so a request that is only about a shared tool stays with the current agent.
+    """
+
+    def __init__(self, agent_config: Dict[str, Any], agent_types: List[str], router_config: Dict[str, Any] = None):
+        self.logger = logging.getLogger(__name__)
+        router_config = router_config or {}
+        self.min_score = router_config.get('min_score', 0.05)
+        self.min_confidence = router_config.get('min_confidence', 0.6)
+        self.tool_words = {_stem(word.lower()) for word in router_config.get('tool_words', [])}
+
+        self.agent_config = agent_config
+        self.agent_types = agent_types
+        self.aliases = self._build_aliases(agent_config, agent_types)
+        self.idf, self.centroids = None, None
+        if router_config.get('enabled', False):
+            self.idf, self.centroids = self._train(agent_config, agent_types)
+
+    # Alias lookup ---------------------------------------------------------------------------------------
+    def _build_aliases(self, agent_config: Dict[str, Any], agent_types: List[str]) -> Dict[str, str]:
+        aliases = {}
+        for agent_type in agent_types:
+            domain = agent_type.split('_')[0]
+            names = [agent_type, agent_type.replace('_', ' '), agent_config[agent_type]['name'],
+                     domain, f"{domain} agent", f"{domain} manager"]
+            names += agent_config[agent_type].get('aliases', [])
+            for name in names:
+                aliases.setdefault(self._normalize_alias(name), agent_type)
+        return aliases
+
+    def _normalize_alias(self, name: str) -> str:
+        return " ".join(str(name).lower().replace('_', ' ').split())
+
+    def resolve_alias(self, name: str) -> Optional[str]:
+        """Agent type for a name or alias, or None if unknown"""
+        if not isinstance(name, str):
+            return None
+        name = name.strip().strip('"\'')
+        return self.aliases.get(self._normalize_alias(name))
+
+    def match_switch_command(self, user_input: str) -> Optional[str]:
+        """Agent type requested by an explicit switch command, or None"""
+        match = SWITCH_COMMAND_PATTERN.match(user_input)
+        if not match:
+            return None
+        target = self._normalize_alias(match.group(1))
+        if target.endswith(" agent") and target not in self.aliases:
+            target = target[:-len(" agent")]
+        return self.aliases.get(target)
+
+    # Classifier -----------------------------------------------------------------------------------------
+    def _train(self, agent_config: Dict[str, Any], agent_types: List[str]):
+        # every line of an instruction file is a document, so boilerplate shared by all agents gets a low idf
+        documents = {}
+        for agent_type in agent_types:
+            lines = []
+            with open(agent_config[agent_type]['instructions'], 'r') as f:
+                lines += [self._tokenize(line) for line in f]
+            # keywords count as a document of their own, repeated to outweigh incidental mentions
+            keywords = " ".join(agent_config[agent_type].get('route_keywords', []))
+            lines += [self._tokenize(keywords)] * 3
+            documents[agent_type] = [line for line in lines if line]
+
+        all_documents = [line for lines in documents.values() for line in lines]
+        document_frequency = Counter(token for line in all_documents for token in set(line))
+        idf = {token: math.log(len(all_documents) / count) + 1.0 for token, count in document_frequency.items()}
+
+        centroids = {}
+        for agent_type, lines in documents.items():
+            centroid = Counter()
+            for line in lines:
+                for token, weight in self._vectorize(line, idf).items():
+                    centroid[token] += weight
+            centroids[agent_type] = self._normalize(centroid)
+        return idf, centroids
+
+    def _tokenize(self, text: str) -> List[str]:
+        return [token for token in tokenize(text) if token not in self.tool_words]
+
+    def _vectorize(self, tokens: List[str], idf: Dict[str, float]) -> Dict[str, float]:
+        counts = Counter(token for token in tokens if token in idf)
+        return self._normalize({token: count * idf[token] for token, count in counts.items()})
+
+    def _normalize(self, vector: Dict[str, float]) -> Dict[str, float]:
+        norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+        return {token: weight / norm for token, weight in vector.items()} if norm else {}
+
+    def scores(self, user_input: str) -> List[Tuple[str, float]]:
+        """Cosine similarity of the input to every agent, best first"""
+        if self.centroids is None:
+            self.idf, self.centroids = self._train(self.agent_config, self.agent_types)
+        query = self._vectorize(self._tokenize(user_input), self.idf)
+        scores = [(agent_type, sum(weight * centroid.get(token, 0.0) for token, weight in query.items()))
+                  for agent_type, centroid in self.centroids.items()]
+        return sorted(scores, key=lambda score: score[1], reverse=True)
+
+    def classify(self, user_input: str) -> Optional[str]:
+        """Agent type for a high-confidence routing decision, or None"""
+        scores = self.scores(user_input)
+        if not scores:
+            return None
+        best_type, best_score = scores[0]
+        if best_score < self.min_score:
+            return None
+        confidence = best_score / sum(score for _, score in scores)
+        if confidence < self.min_confidence:
+            return None
+        self.logger.info(f"Routed input to {best_type} (score {best_score:.3f}, confidence {confidence:.2f})")
+        return best_type
@@ -1,15 +1,34 @@
 import logging
-import openai
-from openai import OpenAI
-from typing import Optional, Dict, List, Any, Tuple
+import asyncio
+from typing import Optional, Dict, List, Any, Tuple, Iterator, AsyncIterator
 import os
 from dotenv import load_dotenv
 import json
-import gzip
 from pathlib import Path
-import tempfile
 import re
 from core_engines.utils.utils import get_formatted_datetime
+from core_engines.utils.clients import get_openai_client, get_async_openai_client
+from core_engines.agents.conversation_journal import ConversationJournal
+from core_engines.agents.context_builder import ContextBuilder
+from core_engines.agents.history_compactor import HistoryCompactor
+from core_engines.agents.response_cache import ResponseCache
+from functools import lru_cache
+
+
+@lru_cache(maxsize=None)
+def _read_instructions_file(path: str) -> str:
+    """Read an instructions file once per process; the text is shared by all agents using it"""
+    with open(path, 'r') as f:
+        return f.read()
+
+
+@lru_cache(maxsize=None)
+def _read_response_schema(path: str) -> Dict[str, Any]:
+    """Read a versioned JSON response schema (core_engines/instructions/schemas/*.vN.json) once per process"""
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
 class LLMAgent:
     """
     LLM-powered agent that can generate responses to user queries
@@ -56,6 +75,17 @@ class LLMAgent:
         
         # Initialize clients
         self._init_clients()
+
+        # JSON-schema structured output (opt-in per agent), replaces the free-text response format
+        self.response_schema = self._init_response_schema(agent_config.get('structured_output', {}))
+
+        # Exact-match response cache (opt-in per agent)
+        self.response_cache = self._init_response_cache(agent_config.get('response_cache', {}))
+
+        # Token-budgeted selection of the conversation history sent with each prompt
+        self.context_builder = ContextBuilder(self.model_name,
+                                              token_budget=agent_config.get('context_token_budget', config.get('context_token_budget', 2000)),
+                                              max_messages=agent_config.get('context_max_messages', config.get('context_max_messages')))
         
         # Initialize conversation history
         self.conversation_history = []
@@ -63,9 +93,17 @@ class LLMAgent:
         # Get agent-specific history file from config
         self.history_file = agent_config.get('history_file', 'data/random_conversation_history.json.gz')
         #print(f"DEBUG: History file: {self.history_file}")
+        self.history_journal = ConversationJournal(self.history_file,
+                                                   compaction_interval=agent_config.get('history_compaction_interval', 200))
 
         # Load conversation history
         self._load_conversation_history()
+
+        # Fold old turns into a rolling summary in the background once the history gets long
+        self.history_compactor = HistoryCompactor(self,
+                                                  max_resident_messages=agent_config.get('history_max_resident_messages', 200),
+                                                  keep_recent_messages=agent_config.get('history_keep_recent_messages', 50))
+        self.history_compactor.maybe_compact()
         
         self.logger.info(f"LLM Agent {agent_name} ({agent_type}) initialized with {self.model_type} model: {self.model_name}")
     
@@ -78,8 +116,7 @@ class LLMAgent:
         else:
             general_instructions_file = ''
         if general_instructions_file:
-            with open(general_instructions_file, 'r') as f:
-                self.general_instructions = f.read()
+            self.general_instructions = _read_instructions_file(general_instructions_file)
         else:
             self.general_instructions = ''
 
@@ -88,8 +125,7 @@ class LLMAgent:
         self.system_instructions = agent_config.get('instructions', '')
         
         # read system instruction txt
-        with open(self.system_instructions, 'r') as f:
-            self.system_instructions = f.read()
+        self.system_instructions = _read_instructions_file(self.system_instructions)
         #print(f"DEBUG: System instructions: {self.system_instructions[:20]}")
 
     def _init_clients(self):
@@ -98,10 +134,36 @@ class LLMAgent:
             openai_api_key = os.environ.get('OPENAI_API_KEY')
             if not openai_api_key:
                 self.logger.error("OpenAI API key not found. Please set OPENAI_API_KEY environment variable.")
-            self.client = openai.OpenAI(api_key=openai_api_key)
+            # shared clients, so every agent hop reuses the same warm connection pool
+            self.client = get_openai_client(openai_api_key)
+            self.async_client = get_async_openai_client(openai_api_key)
         else:
             self.logger.error(f"Unsupported model type: {self.model_type}")
             self.client = None
+            self.async_client = None
+
+    def _init_response_schema(self, structured_output_config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Load the response schema if structured output is enabled in the agent config"""
+        if not structured_output_config or not structured_output_config.get('enabled', False):
+            return None
+        return _read_response_schema(structured_output_config['schema'])
+
+    def _init_response_cache(self, cache_config: Dict[str, Any]) -> Optional[ResponseCache]:
+        """Create the response cache if it is enabled in the agent config"""
+        if not cache_config or not cache_config.get('enabled', False):
+            return None
+        # helpers are keyed on their instructions, the current input and the date: the history and the
+        # minute-level datetime change on every call; main agents are keyed on the full request
+        self.cache_key_scope = cache_config.get('key_scope', 'input' if self.agent_category == 'helper' else 'request')
+        disk_dir = None
+        if cache_config.get('disk', False):
+            disk_dir = os.path.join(cache_config.get('disk_dir', 'data/cache/llm_responses'), self.agent_type)
+        return ResponseCache(ttl_seconds=cache_config.get('ttl_seconds', 3600),
+                             max_entries=cache_config.get('max_entries', 256),
+                             disk_dir=disk_dir,
+                             max_disk_entries=cache_config.get('max_disk_entries', 2048),
+                             max_disk_bytes=cache_config.get('max_disk_bytes', 64 * 1024 * 1024),
+                             sweep_interval_seconds=cache_config.get('sweep_interval_seconds', 3600))
 
     def process_input_prompt(self, user_input: str) -> str:
         """Process the user input prompt"""
@@ -132,8 +194,8 @@ class LLMAgent:
                          {self.agent_type_to_name_map}"
         })
 
-        # Add conversation history (limited to last 100 messages to save tokens)
-        for msg in self.conversation_history[-10:]:
+        # Add conversation history (newest messages that fit in the agent's token budget)
+        for msg in self.context_builder.select(self.conversation_history):
             messages.append(msg)
         #print(f"DEBUG: Conversation history: {self.conversation_history[-100:]}")
         # Add current user input first
@@ -143,17 +205,27 @@ class LLMAgent:
         })
 
         # final reminder to follow the format
-        messages.append({
-            "role": "system",
-            "content": "Most importantly, follow the reponse format constraints strictly. Do not include any other text or comments. Always follow the response format constraints."
-        })
+        if self.response_schema is not None:
+            messages.append({
+                "role": "system",
+                "content": "Most importantly, respond only with a JSON object that follows the response schema. \
+                            It has the same fields as the response format described above."
+            })
+        else:
+            messages.append({
+                "role": "system",
+                "content": "Most importantly, follow the reponse format constraints strictly. Do not include any other text or comments. Always follow the response format constraints."
+            })
 
         return messages
     
-    def generate_response(self, user_input: str) -> Dict[str, Any]:
+    def generate_response(self, user_input: str, stream: bool = False) -> Dict[str, Any]:
         """
         Generate a response to the user input and return a structured response
         
+        If stream is True, an iterator over the response text deltas is returned instead.
+        The turn is added to the conversation history once the stream is exhausted.
+
         Returns:
             Dict with the following keys:
             - response_to_user: The main response to display to the user
@@ -161,63 +233,289 @@ class LLMAgent:
         """
         try:
             
-            # Add user message to history
-            self.conversation_history.append({
-            "role": "user",
-            "content": user_input
-            })
-
-            # process input prompt and get messages ----------------------------------------------------
-            messages = self.process_input_prompt(user_input)
+            # Add user message to history and get messages ---------------------------------------------
+            _, messages = self._start_turn(user_input)
 
             #print(f"\nAPI CALL INPUT: {messages}")
 
             # generate response ------------------------------------------------------------------------
             if self.model_type == 'openai':
+                if stream:
+                    return self._stream_turn(messages)
                 #print(f"API CALL INPUT: {messages}")
                 response = self._generate_response_openai(messages)
 
             else:
                 self.logger.error(f"Unsupported model type: {self.model_type}")
-                return {
-                    "response_to_user": "I'm sorry, but I encountered an error with my language model.",
-                    "detailed_response": "Unsupported model type"
-                }
+                return self._unsupported_model_response()
                 
-            # Add assistant response to history (only the user-facing part) ---------------------------
-            self.conversation_history.append({
-                "role": "assistant",
-                "content": response
-            })
-            
-            # Save updated conversation history
-            self._save_conversation_history()
+            # Add assistant response to history and save it --------------------------------------------
+            self._finish_turn(response)
             
             return response
             
         except Exception as e:
             self.logger.error(f"Error generating response: {e}")
-            return {
-                "response_to_user": "I apologize, but I encountered an error processing your request.",
-                "detailed_response": f"Error: {str(e)}"
-            }
+            if stream:
+                return iter(())
+            return self._error_response(e)
+
+    async def agenerate_response(self, user_input: str, stream: bool = False) -> Dict[str, Any]:
+        """
+        Async counterpart of generate_response.
+        The completion is awaited on the event loop instead of blocking a thread, and the
+        history is saved in a worker thread. If stream is True, an async iterator over the
+        response text deltas is returned.
+        If the call is cancelled, the pending user turn is removed from the history again.
+        """
+        try:
+            user_message, messages = self._start_turn(user_input)
+
+            if self.model_type == 'openai':
+                if stream:
+                    return self._astream_turn(user_message, messages)
+                try:
+                    response = await self._agenerate_response_openai(messages)
+                except asyncio.CancelledError:
+                    self._rollback_turn(user_message)
+                    raise
+            else:
+                self.logger.error(f"Unsupported model type: {self.model_type}")
+                return self._unsupported_model_response()
+
+            try:
+                await self._afinish_turn(response)
+            except asyncio.CancelledError:
+                # cancelled while the answered turn was being saved: drop it as a whole
+                self.discard_turn(user_input)
+                raise
+
+            return response
+
+        except Exception as e:
+            self.logger.error(f"Error generating response: {e}")
+            if stream:
+                return self._aempty_stream()
+            return self._error_response(e)
+
+    def _stream_turn(self, messages: List[Dict[str, str]]) -> Iterator[str]:
+        """Yield response deltas and record the full response once the stream ends"""
+        chunks = []
+        try:
+            for delta in self._stream_response_openai(messages):
+                chunks.append(delta)
+                yield delta
+        except Exception as e:
+            self.logger.error(f"Error streaming response: {e}")
+            return
+        self._finish_turn("".join(chunks))
+
+    async def _astream_turn(self, user_message: Dict[str, str], messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        """Async version of _stream_turn; a cancelled or abandoned stream removes the pending user turn"""
+        chunks = []
+        try:
+            async for delta in self._astream_response_openai(messages):
+                chunks.append(delta)
+                yield delta
+        except (asyncio.CancelledError, GeneratorExit):
+            self._rollback_turn(user_message)
+            raise
+        except Exception as e:
+            self.logger.error(f"Error streaming response: {e}")
+            return
+        await self._afinish_turn("".join(chunks))
+
+    async def _aempty_stream(self) -> AsyncIterator[str]:
+        return
+        yield
+
+    def _start_turn(self, user_input: str) -> Tuple[Dict[str, str], List[Dict[str, str]]]:
+        """Add the user message to history, returns it and the messages for the API call"""
+        user_message = {
+            "role": "user",
+            "content": user_input
+        }
+        self.conversation_history.append(user_message)
+        return user_message, self.process_input_prompt(user_input)
+
+    def _finish_turn(self, response: str):
+        """Add the assistant response to history and persist it"""
+        self.conversation_history.append({
+            "role": "assistant",
+            "content": response
+        })
+        self._save_conversation_history()
+        self.history_compactor.maybe_compact()
+
+    async def _afinish_turn(self, response: str):
+        """Async version of _finish_turn, the journal is written in a worker thread"""
+        self.conversation_history.append({
+            "role": "assistant",
+            "content": response
+        })
+        save = asyncio.ensure_future(asyncio.to_thread(self._save_conversation_history))
+        try:
+            await asyncio.shield(save)
+        except asyncio.CancelledError:
+            # the write goes on in its thread, wait for it before the caller touches the history
+            await save
+            raise
+        self.history_compactor.maybe_compact()
+
+    def _rollback_turn(self, user_message: Dict[str, str]):
+        """Remove a user message whose turn never got a response (only the unsaved tail can be rolled back)"""
+        for index in range(len(self.conversation_history) - 1, self.history_journal.persisted_length - 1, -1):
+            if self.conversation_history[index] is user_message:
+                del self.conversation_history[index]
+                self.logger.info(f"Rolled back an unanswered turn of {self.agent_name}")
+                return
+
+    def discard_turn(self, user_input: str):
+        """Remove the latest turn for user_input (the user message and its reply), on disk too if it was saved"""
+        history = self.conversation_history
+        for index in range(len(history) - 1, -1, -1):
+            if history[index]['role'] == 'user' and history[index]['content'] == user_input:
+                end = index + 2 if index + 1 < len(history) and history[index + 1]['role'] == 'assistant' else index + 1
+                saved = index < self.history_journal.persisted_length
+                del history[index:end]
+                if saved:
+                    # the journal is append-only: rewrite the snapshot without the turn
+                    self.history_journal.compact(history)
+                self.logger.info(f"Discarded an unused turn of {self.agent_name}")
+                return
+
+    def _unsupported_model_response(self) -> Dict[str, str]:
+        return {
+            "response_to_user": "I'm sorry, but I encountered an error with my language model.",
+            "detailed_response": "Unsupported model type"
+        }
+
+    def _error_response(self, e: Exception) -> Dict[str, str]:
+        return {
+            "response_to_user": "I apologize, but I encountered an error processing your request.",
+            "detailed_response": f"Error: {str(e)}"
+        }
     
+    def _completion_params(self, messages: List[Dict[str, str]]) -> Dict[str, Any]:
+        """Parameters of a chat completion request"""
+        params = {
+            "model": self.model_name,
+            "messages": messages,
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature
+        }
+        if self.response_schema is not None:
+            params["response_format"] = {"type": "json_schema", "json_schema": self.response_schema}
+        return params
+
+    def _cache_key(self, params: Dict[str, Any]) -> Optional[str]:
+        if self.response_cache is None:
+            return None
+        if self.cache_key_scope == 'request':
+            return ResponseCache.make_key(**params)
+        # the current input is the last user message (see process_input_prompt); the date is part of the key
+        # because inputs like "today" or "tomorrow at 5pm" are resolved against the datetime system message
+        user_input = next((message['content'] for message in reversed(params['messages']) if message['role'] == 'user'), '')
+        return ResponseCache.make_key(instructions=self.system_instructions,
+                                      agent_type_to_name_map=self.agent_type_to_name_map,
+                                      user_input=user_input,
+                                      current_date=get_formatted_datetime(date_only=True),
+                                      **{name: value for name, value in params.items() if name != 'messages'})
+
+    def _cached_response(self, cache_key: Optional[str]) -> Optional[str]:
+        if cache_key is None:
+            return None
+        response = self.response_cache.get(cache_key)
+        if response is not None:
+            self.logger.info(f"Response cache hit for {self.agent_name}: {self.response_cache.stats()}")
+        return response
+
+    def _cache_response(self, cache_key: Optional[str], response: str):
+        if cache_key is not None:
+            self.response_cache.put(cache_key, response)
+
+    async def _acached_response(self, cache_key: Optional[str]) -> Optional[str]:
+        """_cached_response for the async path, the disk tier is read in a worker thread"""
+        if cache_key is not None and self.response_cache.disk_dir:
+            return await asyncio.to_thread(self._cached_response, cache_key)
+        return self._cached_response(cache_key)
+
+    async def _acache_response(self, cache_key: Optional[str], response: str):
+        if cache_key is not None and self.response_cache.disk_dir:
+            await asyncio.to_thread(self._cache_response, cache_key, response)
+        else:
+            self._cache_response(cache_key, response)
+
     def _generate_response_openai(self, messages: List[Dict[str, str]]) -> str:
         """Generate response using OpenAI API"""
         try:
-            response = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=messages,
-                max_tokens=self.max_tokens,
-                temperature=self.temperature
-            )
+            params = self._completion_params(messages)
+            cache_key = self._cache_key(params)
+            cached = self._cached_response(cache_key)
+            if cached is not None:
+                return cached
+
+            response = self.client.chat.completions.create(**params)
             raw_response = response.choices[0].message.content
             #print('\nRAW RESPONSE FROM OPENAI:', raw_response)
+            self._cache_response(cache_key, raw_response)
             return raw_response
             
         except Exception as e:
             self.logger.error(f"Error from OpenAI API: {e}")
             raise
+
+    async def _agenerate_response_openai(self, messages: List[Dict[str, str]]) -> str:
+        """Generate response using the async OpenAI API"""
+        try:
+            params = self._completion_params(messages)
+            cache_key = self._cache_key(params)
+            cached = await self._acached_response(cache_key)
+            if cached is not None:
+                return cached
+
+            response = await self.async_client.chat.completions.create(**params)
+            raw_response = response.choices[0].message.content
+            await self._acache_response(cache_key, raw_response)
+            return raw_response
+
+        except Exception as e:
+            self.logger.error(f"Error from OpenAI API: {e}")
+            raise
+
+    def _stream_response_openai(self, messages: List[Dict[str, str]]) -> Iterator[str]:
+        """Stream response text deltas from the OpenAI API"""
+        params = self._completion_params(messages)
+        cache_key = self._cache_key(params)
+        cached = self._cached_response(cache_key)
+        if cached is not None:
+            yield cached
+            return
+
+        chunks = []
+        response = self.client.chat.completions.create(**params, stream=True)
+        for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                chunks.append(chunk.choices[0].delta.content)
+                yield chunk.choices[0].delta.content
+        self._cache_response(cache_key, "".join(chunks))
+
+    async def _astream_response_openai(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        """Stream response text deltas from the async OpenAI API"""
+        params = self._completion_params(messages)
+        cache_key = self._cache_key(params)
+        cached = await self._acached_response(cache_key)
+        if cached is not None:
+            yield cached
+            return
+
+        chunks = []
+        response = await self.async_client.chat.completions.create(**params, stream=True)
+        async for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                chunks.append(chunk.choices[0].delta.content)
+                yield chunk.choices[0].delta.content
+        await self._acache_response(cache_key, "".join(chunks))
     
     '''
     def _parse_response(self, raw_response: str) -> Dict:
@@ -265,14 +563,13 @@ class LLMAgent:
     '''
 
     def _load_conversation_history(self):
-        """Load conversation history from gzipped JSON file"""
+        """Load conversation history from the gzipped JSON snapshot and its journal"""
         self.conversation_history = []
         try:
             # Check if history file exists
-            if os.path.exists(self.history_file):
+            if os.path.exists(self.history_file) or os.path.exists(self.history_journal.journal_file):
                 print(f"DEBUG: Loading conversation history from {self.history_file}")
-                with gzip.open(self.history_file, 'rt', encoding='utf-8') as f:
-                    self.conversation_history = json.load(f)
+                self.conversation_history = self.history_journal.load()
                 self.logger.info(f"Loaded {len(self.conversation_history)} messages from conversation history")
         except Exception as e:
             self.logger.error(f"Error loading conversation history: {e}")
@@ -280,23 +577,10 @@ class LLMAgent:
             self.conversation_history = []
     
     def _save_conversation_history(self):
-        """Save conversation history to gzipped JSON file"""
+        """Append new conversation history messages to the journal (or fold in a finished summary)"""
         try:
-            # Ensure directory exists
-            os.makedirs(os.path.dirname(self.history_file), exist_ok=True)
-            
-            # Write to a temporary file first (atomic operation)
-            with tempfile.NamedTemporaryFile(delete=False, mode='wt', encoding='utf-8') as f:
-                json.dump(self.conversation_history, f, indent=2, ensure_ascii=False)
-                temp_filename = f.name
-            
-            # Compress the temporary file and move it to the target location
-            with open(temp_filename, 'rt', encoding='utf-8') as f_in:
-                with gzip.open(self.history_file, 'wt', encoding='utf-8') as f_out:
-                    f_out.write(f_in.read())
-            
-            # Remove the temporary file
-            os.unlink(temp_filename)
+            if not self.history_compactor.apply(self.conversation_history):
+                self.history_journal.sync(self.conversation_history)
             
         except Exception as e:
             self.logger.error(f"Error saving conversation history: {e}")
@@ -0,0 +1,175 @@
+import logging
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+
+class ResponseCache:
+    """
+    Exact-match cache of LLM responses.
+
+    Entries are keyed on a hash of whatever the caller passes to make_key (see
+    LLMAgent._cache_key) and expire after ttl_seconds. A bounded in-memory LRU is checked
+    first; if disk_dir is set, entries are also written there as one JSON file per key so
+    they survive restarts. The disk tier is swept at startup and then at most every
+    sweep_interval_seconds (or as soon as it may hold more than max_disk_entries): expired
+    files are deleted, then the oldest ones until max_disk_entries and max_disk_bytes hold.
+    Hit and miss counters are kept for both tiers.
+    """
+
+    def __init__(self, ttl_seconds: float = 3600, max_entries: int = 256, disk_dir: Optional[str] = None,
+                 max_disk_entries: int = 2048, max_disk_bytes: int = 64 * 1024 * 1024, sweep_interval_seconds: float = 3600):
+        self.logger = logging.getLogger(__name__)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.max_disk_entries = max_disk_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.sweep_interval_seconds = sweep_interval_seconds
+
+        self._entries = OrderedDict()  # key -> (expires_at, response)
+        self._lock = threading.Lock()
+        self._sweep_lock = threading.Lock()
+        self._last_sweep = 0.0
+        self._disk_entries = 0  # files on disk as of the last sweep, plus writes since
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self.sweep()
+
+    @staticmethod
+    def make_key(**request) -> str:
+        return hashlib.sha256(json.dumps(request, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+
+        entry = self._read_disk(key, now)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._store(key, entry)
+            return entry[1]
+
+    def put(self, key: str, response: str):
+        if not response:
+            return
+        entry = (time.time() + self.ttl_seconds, response)
+        with self._lock:
+            self._store(key, entry)
+        self._write_disk(key, entry)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            "entries": len(self._entries)
+        }
+
+    def _store(self, key: str, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _read_disk(self, key: str, now: float):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            self.logger.warning(f"Ignoring unreadable cache entry {path}: {e}")
+            return None
+        if data['expires_at'] <= now:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            return None
+        return data['expires_at'], data['response']
+
+    def _write_disk(self, key: str, entry):
+        if not self.disk_dir:
+            return
+        try:
+            fd, temp_filename = tempfile.mkstemp(dir=self.disk_dir, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({"expires_at": entry[0], "response": entry[1]}, f, ensure_ascii=False)
+            os.replace(temp_filename, self._disk_path(key))
+        except Exception as e:
+            self.logger.warning(f"Could not write cache entry to disk: {e}")
+            return
+        with self._sweep_lock:
+            self._disk_entries += 1
+            due = (self._disk_entries > self.max_disk_entries
+                   or time.time() - self._last_sweep >= self.sweep_interval_seconds)
+        if due:
+            self.sweep()
+
+    def sweep(self) -> int:
+        """Delete expired disk entries, then the oldest ones above the entry and byte caps; returns the number deleted"""
+        if not self.disk_dir:
+            return 0
+        with self._sweep_lock:
+            now = time.time()
+            files = []  # (mtime, size, path) of the entries that are kept so far
+            removed = 0
+            for entry in os.scandir(self.disk_dir):
+                if not entry.is_file():
+                    continue
+                try:
+                    stat = entry.stat()
+                    # an entry expires ttl_seconds after it was written; temp files left by a crash are dropped too
+                    if entry.name.endswith('.tmp') or stat.st_mtime + self.ttl_seconds <= now:
+                        os.unlink(entry.path)
+                        removed += 1
+                    else:
+                        files.append((stat.st_mtime, stat.st_size, entry.path))
+                except OSError:
+                    continue
+
+            files.sort()
+            total_bytes = sum(size for _, size, _ in files)
+            while files and (len(files) > self.max_disk_entries or total_bytes > self.max_disk_bytes):
+                _, size, path = files.pop(0)
+                try:
+                    os.unlink(path)
+                    removed += 1
+                except OSError:
+                    pass
+                total_bytes -= size
+
+            self._disk_entries = len(files)
+            self._last_sweep = now
+        if removed:
+            self.logger.info(f"Removed {removed} response cache entries from {self.disk_dir}")
+        return removed
@@ -1,13 +1,19 @@
 from core_engines.agents.llm_agent import LLMAgent
-from core_engines.utils.parsers import convert_string_to_dict, convert_tool_response_json_string_to_dict
+from core_engines.agents.agent_registry import AgentRegistry
+from core_engines.agents.intent_router import IntentRouter
+from core_engines.utils.parsers import convert_agent_response_to_dict, convert_tool_response_json_string_to_dict, FieldStreamer, StreamingResponseParser
 
 #from core_engines.utils.parsers import convert_to_boolean
 from core_engines.utils.utils import _dict_to_string
+from core_engines.utils.renderers import LocalRenderer
 from external_tools.toolbox import Toolbox
+from external_tools.tool_registry import ToolRegistry
 
-from typing import Dict, Any
+from typing import Dict, Any, Iterator, AsyncIterator
+import asyncio
 import base64
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 class MAS_system_1(object):
     def __init__(self,
@@ -37,86 +43,57 @@ class MAS_system_1(object):
         # init toolbox
         self.toolbox = Toolbox(config=self.config)
 
+        # typed tool actions, for tool calls emitted directly by the main agents
+        self.tool_registry = ToolRegistry()
+
+        # worker threads for agent calls started while the main agent is still streaming
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="mas")
+
+        # async turns share current_agent and the agents' histories: one turn at a time
+        self._turn_lock = asyncio.Lock()
+
+        # render plain replies and tabular tool results locally instead of calling the visualizer agent
+        visualizer_config = self.config['agent']['helper_agents']['visualizer_agent']
+        self.local_renderer = LocalRenderer() if visualizer_config.get('local_render', False) else None
+
         # set current agent
         self.current_agent = self.orchestrator_agent
 
     def _init_agents(self):
-        """Initialize all LLM agents"""
-        # Main agents ----------------------------------------------------------------------------------------
-        # Create orchestrator agent
-        self.orchestrator_agent = LLMAgent(
-            agent_name=self.config['agent']['orchestrator']['name'],
-            config=self.config['agent'],
-            agent_type="orchestrator",
-            agent_category="main",
-            agent_type_to_name_map=self.agent_type_to_name_map
-        )
-        self.logger.info(f"Orchestrator agent '{self.orchestrator_agent.agent_name}' initialized")
-        #print(f"Orchestrator agent '{self.orchestrator_agent.agent_name}' initialized")
-
-        # Create finance manager agent
-        self.finance_manager_agent = LLMAgent(
-            agent_name=self.config['agent']['finance_manager']['name'],
-            config=self.config['agent'],
-            agent_type="finance_manager",
-            agent_category="main",
-            agent_type_to_name_map=self.agent_type_to_name_map
-        )
-        self.logger.info(f"Finance manager agent '{self.finance_manager_agent.agent_name}' initialized")
-        #print(f"Finance manager agent '{self.finance_manager_agent.agent_name}' initialized")
-
-        # Create study manager agent
-        self.study_manager_agent = LLMAgent(
-            agent_name=self.config['agent']['study_manager']['name'],
-            config=self.config['agent'],
-            agent_type="study_manager",
-            agent_category="main",
-            agent_type_to_name_map=self.agent_type_to_name_map
-        )
-        self.logger.info(f"Study manager agent '{self.study_manager_agent.agent_name}' initialized")
-        #print(f"Study manager agent '{self.study_manager_agent.agent_name}' initialized")
-
-        # Create health manager agent
-        self.health_manager_agent = LLMAgent(
-            agent_name=self.config['agent']['health_manager']['name'],
-            config=self.config['agent'],
-            agent_type="health_manager",
-            agent_category="main",
-            agent_type_to_name_map=self.agent_type_to_name_map
-        )
-        self.logger.info(f"Health manager agent '{self.health_manager_agent.agent_name}' initialized")
-        #print(f"Health manager agent '{self.health_manager_agent.agent_name}' initialized")
-
-        # Helper agents -------------------------------------------------------------------------------------
-        self.visualizer_agent = LLMAgent(
-            agent_name=self.config['agent']['helper_agents']['visualizer_agent']['name'],
-            config=self.config['agent']['helper_agents'],
-            agent_type="visualizer_agent",
-            agent_category="helper",
-            agent_type_to_name_map=self.agent_type_to_name_map
-        )
-        self.logger.info(f"Visualizer agent '{self.visualizer_agent.agent_name}' initialized")
-        #print(f"Visualizer agent '{self.visualizer_agent.agent_name}' initialized")
-
-        self.tool_handler_agent = LLMAgent(
-            agent_name=self.config['agent']['helper_agents']['tool_handler_agent']['name'],
-            config=self.config['agent']['helper_agents'],
-            agent_type="tool_handler_agent",
-            agent_category="helper",
-            agent_type_to_name_map=self.agent_type_to_name_map
-        )
-        self.logger.info(f"Tool handler agent '{self.tool_handler_agent.agent_name}' initialized")
-        #print(f"Tool handler agent '{self.tool_handler_agent.agent_name}' initialized")
-
-        self.visualizer_agent = LLMAgent(
-            agent_name=self.config['agent']['helper_agents']['visualizer_agent']['name'],
-            config=self.config['agent']['helper_agents'],
-            agent_type="visualizer_agent",
-            agent_category="helper",
-            agent_type_to_name_map=self.agent_type_to_name_map
-        )
-        self.logger.info(f"Visualizer agent '{self.visualizer_agent.agent_name}' initialized")
-        #print(f"Visualizer agent '{self.visualizer_agent.agent_name}' initialized")
+        """Register all LLM agents; each one is constructed on first use"""
+        self.agents = AgentRegistry(self.config['agent'], self.agent_type_to_name_map)
+        self.logger.info(f"Registered agents: {', '.join(self.agents.agent_types())}")
+
+        # local alias table and intent classifier over the main agents
+        router_config = self.config.get('intent_router', {})
+        self.intent_router = IntentRouter(self.config['agent'], self.agents.agent_types("main"), router_config)
+        self.route_inputs = router_config.get('enabled', False)
+
+    # Main agents ----------------------------------------------------------------------------------------
+    @property
+    def orchestrator_agent(self) -> LLMAgent:
+        return self.agents.get("orchestrator")
+
+    @property
+    def finance_manager_agent(self) -> LLMAgent:
+        return self.agents.get("finance_manager")
+
+    @property
+    def study_manager_agent(self) -> LLMAgent:
+        return self.agents.get("study_manager")
+
+    @property
+    def health_manager_agent(self) -> LLMAgent:
+        return self.agents.get("health_manager")
+
+    # Helper agents -------------------------------------------------------------------------------------
+    @property
+    def visualizer_agent(self) -> LLMAgent:
+        return self.agents.get("visualizer_agent")
+
+    @property
+    def tool_handler_agent(self) -> LLMAgent:
+        return self.agents.get("tool_handler_agent")
 
     def _get_agent_type_to_name_map(self):
         """Get the agent type to name mapping"""
@@ -134,53 +111,75 @@ class MAS_system_1(object):
     
     def _switch_agent(self, agent_name: str):
         """Switch to a different agent"""
-        # Remove quotes from the beginning and end of the string if they exist
-        if isinstance(agent_name, str):
-            agent_name = agent_name.strip()
-            if (agent_name.startswith('"') and agent_name.endswith('"')) or \
-               (agent_name.startswith("'") and agent_name.endswith("'")):
-                agent_name = agent_name[1:-1]
-
-        if ((agent_name.lower() == "orchestrator") or (agent_name.lower() == self.orchestrator_agent.agent_name.lower()) and self.current_agent != self.orchestrator_agent):
-            self.current_agent = self.orchestrator_agent
-            print(f"\n===== SWITCHING TO ORCHESTRATOR AGENT: {self.orchestrator_agent.agent_name} =====\n")
-            #self.text_output.display(f"Switching to {self.orchestrator_agent.agent_name}")
-            return True
-        
-        elif ((agent_name.lower() == "finance_manager") or \
-              (agent_name.lower() == "finance manager") or \
-              (agent_name.lower() == "finance agent") or \
-              (agent_name.lower() == "finance") or \
-              ((agent_name.lower() == self.finance_manager_agent.agent_name.lower()) and (self.current_agent != self.finance_manager_agent))):
-            self.current_agent = self.finance_manager_agent
-            print(f"\n===== SWITCHING TO FINANCE MANAGER AGENT: {self.finance_manager_agent.agent_name} =====\n")
-            #self.text_output.display(f"Switching to {self.finance_manager_agent.agent_name}")
-            return True
-
-        elif ((agent_name.lower() == "study_manager") or \
-              (agent_name.lower() == "study manager") or \
-              (agent_name.lower() == "study agent") or \
-              (agent_name.lower() == "study") or \
-              ((agent_name.lower() == self.study_manager_agent.agent_name.lower()) and self.current_agent != self.study_manager_agent)):
-            self.current_agent = self.study_manager_agent
-            print(f"\n===== SWITCHING TO STUDY MANAGER AGENT: {self.study_manager_agent.agent_name} =====\n")
-            #self.text_output.display(f"Switching to {self.study_manager_agent.agent_name}")
-            return True
-
-        elif ((agent_name.lower() == "health_manager") or \
-              (agent_name.lower() == "health manager") or \
-              (agent_name.lower() == "health agent") or \
-              (agent_name.lower() == "health") or \
-              ((agent_name.lower() == self.health_manager_agent.agent_name.lower()) and self.current_agent != self.health_manager_agent)):
-            self.current_agent = self.health_manager_agent
-            print(f"\n===== SWITCHING TO HEALTH MANAGER AGENT: {self.health_manager_agent.agent_name} =====\n")
-            #self.text_output.display(f"Switching to {self.health_manager_agent.agent_name}")
-            return True
-
-        else:
+        agent_type = self.intent_router.resolve_alias(agent_name)
+        if agent_type is None:
             self.logger.warning(f"Unknown agent name: {agent_name}, staying with current agent")
             return False
-    
+
+        self.current_agent = self.agents.get(agent_type)
+        print(f"\n===== SWITCHING TO {agent_type.replace('_', ' ').upper()} AGENT: {self.current_agent.agent_name} =====\n")
+        #self.text_output.display(f"Switching to {self.current_agent.agent_name}")
+        return True
+
+    def _route_input(self, user_input: str, main_llm_agent: LLMAgent):
+        '''
+        Route the input locally before any LLM call.
+        An explicit switch command ("switch to Flock") is answered without calling a model;
+        a high-confidence intent for another main agent switches to it and lets it answer.
+
+        Returns the main agent to use and, for switch commands, the main agent response dict.
+        '''
+        agent_type, switch_command = self._route_decision(user_input, main_llm_agent)
+        return self._apply_route(agent_type, switch_command, main_llm_agent)
+
+    async def _aroute_input(self, user_input: str, main_llm_agent: LLMAgent):
+        '''
+        Async version of _route_input; an agent switched to is constructed in a worker thread.
+        '''
+        agent_type, switch_command = self._route_decision(user_input, main_llm_agent)
+        if agent_type is not None:
+            await self.agents.aget(agent_type)
+        return self._apply_route(agent_type, switch_command, main_llm_agent)
+
+    def _route_decision(self, user_input: str, main_llm_agent: LLMAgent):
+        '''
+        The main agent type to switch to (or None) and whether the input is an explicit switch command.
+        '''
+        if not self.route_inputs:
+            return None, False
+
+        agent_type = self.intent_router.match_switch_command(user_input)
+        if agent_type is not None:
+            return agent_type, True
+
+        agent_type = self.intent_router.classify(user_input)
+        if agent_type is not None and agent_type != main_llm_agent.agent_type:
+            return agent_type, False
+
+        return None, False
+
+    def _apply_route(self, agent_type, switch_command: bool, main_llm_agent: LLMAgent):
+        if agent_type is None:
+            return main_llm_agent, None
+
+        self._switch_agent(agent_type)
+        if not switch_command:
+            return self.current_agent, None
+        return self.current_agent, {
+            "detailed_response": f"Switching to {self.current_agent.agent_name}.",
+            "summarized_response": "Switching now.",
+            "tool_usage_flag": False,
+            "invoke_another_agent_flag": True,
+            "invoke_agent_name": agent_type
+        }
+
+    async def _aswitch_agent(self, agent_name: str):
+        """Async version of _switch_agent, the agent is constructed in a worker thread if needed"""
+        agent_type = self.intent_router.resolve_alias(agent_name)
+        if agent_type is not None:
+            await self.agents.aget(agent_type)
+        return self._switch_agent(agent_name)
+
     def get_response_from_mas_system(self,
                                     user_input: str,
                                     main_llm_agent: LLMAgent,
@@ -190,7 +189,370 @@ class MAS_system_1(object):
         Get the response from the MAS model 1.
         Here we define the flow of the MAS system.
         '''
-        return_response = {
+        return_response = self._new_return_response()
+
+        # 1-2. main agent response, agent switch or tool usage
+        overall_response, local_response = self._prepare_visualizer_input(user_input, main_llm_agent, response_format, return_response)
+        if local_response is not None:
+            return self._fill_return_response(local_response, return_response), self.current_agent
+
+        # 3. get response from visualizer agent ---------------------------------------------------------
+        visualizer_response = self.visualizer_agent.generate_response(overall_response)
+
+        return self._finalize_response(visualizer_response, return_response), self.current_agent
+
+    async def aget_response_from_mas_system(self,
+                                            user_input: str,
+                                            main_llm_agent: LLMAgent,
+                                            response_format: str
+                                            ) -> Dict[str, Any]:
+        '''
+        Async version of get_response_from_mas_system.
+        Model calls are awaited on the event loop; the (blocking) toolbox and file I/O run in
+        worker threads. Concurrent turns are serialized.
+        '''
+        async with self._turn_lock:
+            # a turn queued behind an agent switch continues with the agent switched to
+            main_llm_agent = self.current_agent
+            return_response = self._new_return_response()
+
+            overall_response, local_response = await self._aprepare_visualizer_input(user_input, main_llm_agent, response_format, return_response)
+            if local_response is not None:
+                return self._fill_return_response(local_response, return_response), self.current_agent
+
+            visualizer_agent = await self.agents.aget("visualizer_agent")
+            visualizer_response = await visualizer_agent.agenerate_response(overall_response)
+
+            return self._finalize_response(visualizer_response, return_response), self.current_agent
+
+    def stream_response_from_mas_system(self,
+                                        user_input: str,
+                                        main_llm_agent: LLMAgent,
+                                        response_format: str
+                                        ) -> Iterator[Dict[str, Any]]:
+        '''
+        Streaming version of get_response_from_mas_system.
+        Yields events:
+            {"type": "start", "current_agent_name": ..., "current_agent_type": ...}
+            {"type": "token", "text": ...}    -> deltas of final_response_to_user
+            {"type": "final", "response": ...} -> same dict as get_response_from_mas_system
+        '''
+        return_response = self._new_return_response()
+
+        overall_response, local_response = self._prepare_visualizer_input(user_input, main_llm_agent, response_format, return_response)
+
+        yield self._stream_start_event()
+
+        if local_response is not None:
+            yield {"type": "token", "text": local_response["final_response_to_user"]}
+            yield {"type": "final", "response": self._fill_return_response(local_response, return_response)}
+            return
+
+        field_streamer = FieldStreamer("final_response_to_user")
+        visualizer_chunks = []
+        streamed = False
+        for chunk in self.visualizer_agent.generate_response(overall_response, stream=True):
+            visualizer_chunks.append(chunk)
+            delta = field_streamer.feed(chunk)
+            if delta:
+                streamed = True
+                yield {"type": "token", "text": delta}
+        delta = field_streamer.close()
+        if delta:
+            streamed = True
+            yield {"type": "token", "text": delta}
+
+        response = self._finalize_response("".join(visualizer_chunks), return_response)
+        if not streamed and response["final_response_to_user"]:
+            # structured (JSON) visualizer output can only be parsed once complete
+            yield {"type": "token", "text": response["final_response_to_user"]}
+        yield {"type": "final", "response": response}
+
+    async def astream_response_from_mas_system(self,
+                                               user_input: str,
+                                               main_llm_agent: LLMAgent,
+                                               response_format: str
+                                               ) -> AsyncIterator[Dict[str, Any]]:
+        '''
+        Async version of stream_response_from_mas_system; concurrent turns are serialized.
+        '''
+        async with self._turn_lock:
+            # a turn queued behind an agent switch continues with the agent switched to
+            main_llm_agent = self.current_agent
+            return_response = self._new_return_response()
+
+            overall_response, local_response = await self._aprepare_visualizer_input(user_input, main_llm_agent, response_format, return_response)
+
+            yield self._stream_start_event()
+
+            if local_response is not None:
+                yield {"type": "token", "text": local_response["final_response_to_user"]}
+                yield {"type": "final", "response": self._fill_return_response(local_response, return_response)}
+                return
+
+            field_streamer = FieldStreamer("final_response_to_user")
+            visualizer_chunks = []
+            streamed = False
+            visualizer_agent = await self.agents.aget("visualizer_agent")
+            async for chunk in await visualizer_agent.agenerate_response(overall_response, stream=True):
+                visualizer_chunks.append(chunk)
+                delta = field_streamer.feed(chunk)
+                if delta:
+                    streamed = True
+                    yield {"type": "token", "text": delta}
+            delta = field_streamer.close()
+            if delta:
+                streamed = True
+                yield {"type": "token", "text": delta}
+
+            response = self._finalize_response("".join(visualizer_chunks), return_response)
+            if not streamed and response["final_response_to_user"]:
+                yield {"type": "token", "text": response["final_response_to_user"]}
+            yield {"type": "final", "response": response}
+
+    def _prepare_visualizer_input(self,
+                                  user_input: str,
+                                  main_llm_agent: LLMAgent,
+                                  response_format: str,
+                                  return_response: Dict[str, Any]) -> str:
+        '''
+        Run the main agent and, if needed, switch agents or use a tool.
+        Returns the input for the visualizer agent and the locally rendered response
+        (None if the visualizer agent is needed).
+        '''
+        # 0. local routing: explicit switch commands and high-confidence intents ---------------------------
+        main_llm_agent, routed_response_dict = self._route_input(user_input, main_llm_agent)
+        if routed_response_dict is not None:
+            return self._build_responses(routed_response_dict, True, None, None, response_format, return_response)
+
+        # 1. stream response from main LLM agent : simple+detailed response -------------------------------
+        # the tool handler agent is started as soon as [tool_usage_response] is complete
+        main_agent_response_dict, tool_response_future = self._run_main_agent(user_input, main_llm_agent)
+
+        switch_status = None
+        tool_response_dict = None
+        tool_execution_result = None
+
+        try:
+            # Check if we need to switch agents -------------------------------------------------------------
+            if self._needs_agent_switch(main_agent_response_dict):
+                self._discard_tool_future(tool_response_future)
+                tool_response_future = None
+                switch_status = self._switch_agent(main_agent_response_dict["invoke_agent_name"])
+
+            # 2. if using tool, use tool and get response from tool handler agent ----------------------------------------
+            elif main_agent_response_dict.get("tool_usage_flag"):
+                tool_call = self._validated_tool_call(main_agent_response_dict)
+                if tool_call is not None:
+                    # the main agent emitted a valid tool call, no tool handler agent needed
+                    self._discard_tool_future(tool_response_future)
+                    tool_response_future = None
+                    tool_response_dict, tool_execution_result = tool_call, self._execute_tool(tool_call)
+                else:
+                    if tool_response_future is not None:
+                        _, tool_response = tool_response_future.result()
+                        tool_response_future = None
+                    else:
+                        tool_response = self.tool_handler_agent.generate_response(self._build_tool_usage_instructions(main_agent_response_dict))
+                    tool_response_dict, tool_execution_result = self._execute_tool_response(tool_response)
+        finally:
+            # a tool handler call started early but not used (e.g. no tool after all)
+            self._discard_tool_future(tool_response_future)
+
+        return self._build_responses(main_agent_response_dict,
+                                     switch_status,
+                                     tool_response_dict,
+                                     tool_execution_result,
+                                     response_format,
+                                     return_response)
+
+    async def _aprepare_visualizer_input(self,
+                                         user_input: str,
+                                         main_llm_agent: LLMAgent,
+                                         response_format: str,
+                                         return_response: Dict[str, Any]) -> str:
+        '''
+        Async version of _prepare_visualizer_input.
+        '''
+        main_llm_agent, routed_response_dict = await self._aroute_input(user_input, main_llm_agent)
+        if routed_response_dict is not None:
+            return await asyncio.to_thread(self._build_responses, routed_response_dict, True, None, None, response_format, return_response)
+
+        main_agent_response_dict, tool_response_task = await self._arun_main_agent(user_input, main_llm_agent)
+
+        switch_status = None
+        tool_response_dict = None
+        tool_execution_result = None
+
+        try:
+            if self._needs_agent_switch(main_agent_response_dict):
+                await self._adiscard_tool_task(tool_response_task)
+                tool_response_task = None
+                switch_status = await self._aswitch_agent(main_agent_response_dict["invoke_agent_name"])
+
+            elif main_agent_response_dict.get("tool_usage_flag"):
+                tool_call = self._validated_tool_call(main_agent_response_dict)
+                if tool_call is not None:
+                    await self._adiscard_tool_task(tool_response_task)
+                    tool_response_task = None
+                    tool_response_dict, tool_execution_result = tool_call, await asyncio.to_thread(self._execute_tool, tool_call)
+                else:
+                    if tool_response_task is not None:
+                        _, tool_response = await tool_response_task
+                        tool_response_task = None
+                    else:
+                        tool_handler_agent = await self.agents.aget("tool_handler_agent")
+                        tool_response = await tool_handler_agent.agenerate_response(self._build_tool_usage_instructions(main_agent_response_dict))
+                    tool_response_dict, tool_execution_result = await asyncio.to_thread(self._execute_tool_response, tool_response)
+        finally:
+            # a tool handler call started early but not used (e.g. no tool after all)
+            await self._adiscard_tool_task(tool_response_task)
+
+        # reads and encodes the tool's images
+        return await asyncio.to_thread(self._build_responses,
+                                       main_agent_response_dict,
+                                       switch_status,
+                                       tool_response_dict,
+                                       tool_execution_result,
+                                       response_format,
+                                       return_response)
+
+    async def _adiscard_tool_task(self, tool_response_task):
+        '''
+        Cancel a tool handler task that is not needed and wait for it, so its pending
+        turn is rolled back (see LLMAgent.agenerate_response) before the turn ends; a task
+        that already finished has its turn removed from the tool handler's history.
+        '''
+        if tool_response_task is None:
+            return
+        tool_response_task.cancel()
+        result, = await asyncio.gather(tool_response_task, return_exceptions=True)
+        if isinstance(result, BaseException):
+            return
+        tool_usage_instructions, _ = result
+        tool_handler_agent = await self.agents.aget("tool_handler_agent")
+        await asyncio.to_thread(tool_handler_agent.discard_turn, tool_usage_instructions)
+
+    async def _atool_handler_call(self, tool_usage_instructions: str):
+        '''
+        Async version of _tool_handler_call.
+        '''
+        tool_handler_agent = await self.agents.aget("tool_handler_agent")
+        return tool_usage_instructions, await tool_handler_agent.agenerate_response(tool_usage_instructions)
+
+    def _run_main_agent(self, user_input: str, main_llm_agent: LLMAgent):
+        '''
+        Stream the main agent response through the incremental parser.
+        As soon as [tool_usage_response] is complete (and the tool flag is set), the tool
+        handler agent is started in the background while the main agent keeps generating.
+        Only the tool handler call is started early; the tool itself is executed once the
+        whole response is known, since it has side effects.
+
+        Returns the parsed response dict and the tool handler future (or None).
+        '''
+        parser = StreamingResponseParser()
+        tool_response_future = None
+        chunks = []
+
+        try:
+            for chunk in main_llm_agent.generate_response(user_input, stream=True):
+                chunks.append(chunk)
+                for key, _ in parser.feed(chunk):
+                    if tool_response_future is None and self._tool_request_complete(key, parser.fields):
+                        tool_response_future = self._executor.submit(self._tool_handler_call,
+                                                                     self._build_tool_usage_instructions(parser.fields))
+        except BaseException:
+            self._discard_tool_future(tool_response_future)
+            raise
+        parser.close()
+        main_agent_response_dict = self._main_agent_response_dict(main_llm_agent, parser, chunks)
+
+        print(f"\nResponse dict: {main_agent_response_dict}")
+        return main_agent_response_dict, tool_response_future
+
+    def _tool_handler_call(self, tool_usage_instructions: str):
+        '''
+        Tool handler agent call run by the executor; returns the instructions with the
+        response, so an unused call can be discarded from the agent's history.
+        '''
+        return tool_usage_instructions, self.tool_handler_agent.generate_response(tool_usage_instructions)
+
+    def _discard_tool_future(self, tool_response_future):
+        '''
+        Drop a tool handler call that is not needed: cancel it if it has not started,
+        otherwise wait for it and remove its turn from the tool handler's history.
+        '''
+        if tool_response_future is None or tool_response_future.cancel():
+            return
+        try:
+            tool_usage_instructions, _ = tool_response_future.result()
+        except Exception as e:
+            self.logger.warning(f"Unused tool handler call failed: {e}")
+            return
+        self.tool_handler_agent.discard_turn(tool_usage_instructions)
+
+    async def _arun_main_agent(self, user_input: str, main_llm_agent: LLMAgent):
+        '''
+        Async version of _run_main_agent; the tool handler agent is started as a task.
+        '''
+        parser = StreamingResponseParser()
+        tool_response_task = None
+        chunks = []
+
+        try:
+            async for chunk in await main_llm_agent.agenerate_response(user_input, stream=True):
+                chunks.append(chunk)
+                for key, _ in parser.feed(chunk):
+                    if tool_response_task is None and self._tool_request_complete(key, parser.fields):
+                        tool_response_task = asyncio.create_task(
+                            self._atool_handler_call(self._build_tool_usage_instructions(parser.fields)))
+        except BaseException:
+            # e.g. the request was cancelled while the main agent was streaming
+            await asyncio.shield(self._adiscard_tool_task(tool_response_task))
+            raise
+        parser.close()
+        main_agent_response_dict = self._main_agent_response_dict(main_llm_agent, parser, chunks)
+
+        print(f"\nResponse dict: {main_agent_response_dict}")
+        return main_agent_response_dict, tool_response_task
+
+    def _main_agent_response_dict(self, main_llm_agent: LLMAgent, parser: StreamingResponseParser, chunks) -> Dict[str, Any]:
+        '''
+        Fields of the main agent response. Structured (JSON) output is parsed once complete,
+        so the tool handler agent is not started early for agents that use it.
+        '''
+        if main_llm_agent.response_schema is not None:
+            return convert_agent_response_to_dict("".join(chunks))
+        return parser.fields
+
+    def _tool_request_complete(self, key: str, fields: Dict[str, Any]) -> bool:
+        # [tool_call] comes before [tool_usage_response]; a valid one makes the tool handler unnecessary
+        return key == "tool_usage_response" and fields.get("tool_usage_flag") is True \
+               and not fields.get("invoke_another_agent_flag") \
+               and self.tool_registry.validate(fields.get("tool_call"))[0] is None
+
+    def _validated_tool_call(self, main_agent_response_dict: Dict[str, Any]):
+        '''
+        The main agent's [tool_call], validated against the tool registry, or None if it
+        did not emit one or it is invalid (then the tool handler agent is used instead).
+        '''
+        tool_call = main_agent_response_dict.get("tool_call")
+        if not tool_call or tool_call in ("None", "null"):
+            return None
+        validated_tool_call, errors = self.tool_registry.validate(tool_call)
+        if errors:
+            self.logger.warning(f"Invalid tool call from main agent, using the tool handler agent: {errors}")
+        return validated_tool_call
+
+    def _stream_start_event(self) -> Dict[str, Any]:
+        return {
+            "type": "start",
+            "current_agent_name": self.current_agent.agent_name,
+            "current_agent_type": self.current_agent.agent_type
+        }
+
+    def _new_return_response(self) -> Dict[str, Any]:
+        return {
             "final_response_to_user": "",
             "summarized_response": "",
             "current_agent_name": "",
@@ -201,70 +563,100 @@ class MAS_system_1(object):
             "display_images": []
         }
 
-        # 1. get response from main LLM agent : simple+detailed response -----------------------------------
-        main_agent_response_dict = main_llm_agent.generate_response(user_input)
-        #print(f"DEBUG: Raw response: {main_agent_response_dict}")
-        # convert string to dict
-        main_agent_response_dict = convert_string_to_dict(main_agent_response_dict)
-        print(f"\nResponse dict: {main_agent_response_dict}")
-        
-        # now we have a dictionary with the following keys:
-        # a. simple response
-        # b. detailed response
-        # c. tool use response
-        # d. invoke another agent flag
-        # e. invoke agent name
-
-        # Check if we need to switch agents -------------------------------------------------------------
-        if main_agent_response_dict.get("invoke_another_agent_flag", False) and main_agent_response_dict.get("invoke_agent_name", False):
-            switch_status = self._switch_agent(main_agent_response_dict["invoke_agent_name"])
-
-        # 2. if using tool, use tool and get response from tool handler agent ----------------------------------------
-        else:
-            if main_agent_response_dict.get("tool_usage_flag"):
-                
-                tool_usage_instructions = main_agent_response_dict["tool_usage_response"]
-                
-                #current_datetime = get_formatted_datetime()
-                tool_usage_instructions = f"main_agent_response: {tool_usage_instructions}"#. current_datetime: {current_datetime}"
-                print(f"\nTool usage instructions: {tool_usage_instructions}")
+    def _needs_agent_switch(self, main_agent_response_dict: Dict[str, Any]) -> bool:
+        return bool(main_agent_response_dict.get("invoke_another_agent_flag", False) and \
+                    main_agent_response_dict.get("invoke_agent_name", False))
+
+    def _build_tool_usage_instructions(self, main_agent_response_dict: Dict[str, Any]) -> str:
+        tool_usage_instructions = main_agent_response_dict["tool_usage_response"]
                 
-                tool_response_dict = self.tool_handler_agent.generate_response(tool_usage_instructions)
-                print(f"DEBUG: Tool response: {tool_response_dict}")
-                tool_response_dict = convert_tool_response_json_string_to_dict(tool_response_dict)
-                #print(f"Tool response dict: {tool_response_dict}")
-
-                if "error" in tool_response_dict.keys():
-                    # TODO: handle error
-                    print(f"Tool error: {tool_response_dict['error']}")
-                    print(f"Tool details: {tool_response_dict['details']}")
-                    tool_execution_result = {'status': 'error', 'error': tool_response_dict['error'], 'details': tool_response_dict['details']}
-                    # TODO: update the response dict with the tool error
-                    #response_dict["detailed_response"] = tool_response_dict["details"]
-                    #response_dict["summarized_response"] = tool_response_dict["error"]
-                else:
-                    # TODO: execute the tool with the tool response dict
-                    #print(f"Tool response: {tool_response_dict}")
-                    
-                    # Execute the tool
-                    #tool_execution_response_dict = {'status': 'success'}                
-                    tool_execution_result = self.toolbox.execute_tool(tool_response_dict)
-                    print(f"DEBUG: Tool execution result: {tool_execution_result}")
-        # 3. get response from visualizer agent ---------------------------------------------------------
+        #current_datetime = get_formatted_datetime()
+        tool_usage_instructions = f"main_agent_response: {tool_usage_instructions}"#. current_datetime: {current_datetime}"
+        print(f"\nTool usage instructions: {tool_usage_instructions}")
+        return tool_usage_instructions
+
+    def _execute_tool_response(self, tool_response):
+        '''
+        Parse the tool handler agent response and execute the tool.
+        Returns the parsed tool instruction dict and the tool execution result.
+        '''
+        print(f"DEBUG: Tool response: {tool_response}")
+        tool_response_dict = convert_tool_response_json_string_to_dict(tool_response)
+        #print(f"Tool response dict: {tool_response_dict}")
+
+        if "error" in tool_response_dict.keys():
+            # TODO: handle error
+            print(f"Tool error: {tool_response_dict['error']}")
+            print(f"Tool details: {tool_response_dict['details']}")
+            tool_execution_result = {'status': 'error', 'error': tool_response_dict['error'], 'details': tool_response_dict['details']}
+            # TODO: update the response dict with the tool error
+            #response_dict["detailed_response"] = tool_response_dict["details"]
+            #response_dict["summarized_response"] = tool_response_dict["error"]
+        else:
+            # Execute the tool
+            #tool_execution_response_dict = {'status': 'success'}                
+            tool_execution_result = self._execute_tool(tool_response_dict)
+
+        return tool_response_dict, tool_execution_result
+
+    def _execute_tool(self, tool_response_dict: Dict[str, Any]):
+        tool_execution_result = self.toolbox.execute_tool(tool_response_dict)
+        print(f"DEBUG: Tool execution result: {tool_execution_result}")
+        return tool_execution_result
+
+    def _build_responses(self,
+                         main_agent_response_dict: Dict[str, Any],
+                         switch_status,
+                         tool_response_dict,
+                         tool_execution_result,
+                         response_format: str,
+                         return_response: Dict[str, Any]):
+        '''
+        Build the visualizer input and, if possible, the locally rendered response.
+        '''
+        # the visualizer input is always built: it also moves tool images into return_response
+        overall_response = self._build_visualizer_input(main_agent_response_dict,
+                                                        switch_status,
+                                                        tool_response_dict,
+                                                        tool_execution_result,
+                                                        response_format,
+                                                        return_response)
+        local_response = None
+        if self.local_renderer is not None:
+            local_response = self.local_renderer.render(main_agent_response_dict,
+                                                        switch_status,
+                                                        tool_execution_result,
+                                                        response_format,
+                                                        self.current_agent.agent_name)
+            if local_response is not None:
+                self.logger.info("Rendered response locally, skipping the visualizer agent")
+        return overall_response, local_response
+
+    def _build_visualizer_input(self,
+                                main_agent_response_dict: Dict[str, Any],
+                                switch_status,
+                                tool_response_dict,
+                                tool_execution_result,
+                                response_format: str,
+                                return_response: Dict[str, Any]) -> str:
+        '''
+        Build the input for the visualizer agent.
+        Images produced by the tool are moved into return_response['display_images'].
+        '''
         # if no tool is used, return the detailed response
-        if not main_agent_response_dict["tool_usage_flag"]:
+        if not main_agent_response_dict.get("tool_usage_flag"):
             # if not switching agent, just return the detailed response
             if not main_agent_response_dict.get("invoke_another_agent_flag"):
-                overall_response_dict = f'[main_agent_response]: {main_agent_response_dict["detailed_response"]}'
+                overall_response_dict = f'[main_agent_response]: {main_agent_response_dict.get("detailed_response")}'
             # if switching agent, return the detailed response, switch flag, and switch name
             else:
-                overall_response_dict = f'[main_agent_response]: {main_agent_response_dict["detailed_response"]}\n \
+                overall_response_dict = f'[main_agent_response]: {main_agent_response_dict.get("detailed_response")}\n \
                                           [switch_agent_flag]: {main_agent_response_dict["invoke_another_agent_flag"]}\n \
-                                          [switch_agent_name]: {main_agent_response_dict["invoke_agent_name"]}\n \
+                                          [switch_agent_name]: {main_agent_response_dict.get("invoke_agent_name")}\n \
                                           [switch_status]: {switch_status}'
         
         # if tool is used, return the detailed response, tool usage flag, tool usage response, tool instruction from tool agent, and tool execution result
-        elif main_agent_response_dict["tool_usage_flag"]:
+        else:
             # handle tool error case - later
             
             if type(tool_execution_result) == dict:
@@ -284,34 +676,38 @@ class MAS_system_1(object):
             else:
                 tool_execution_result_str = tool_execution_result
 
-            overall_response_dict = f'[main_agent_response]: {main_agent_response_dict["detailed_response"]}\n \
+            overall_response_dict = f'[main_agent_response]: {main_agent_response_dict.get("detailed_response")}\n \
                                       [tool_usage]: {main_agent_response_dict["tool_usage_flag"]}\n \
-                                      [tool_input_from_main_agent]: {main_agent_response_dict["tool_usage_response"]}\n \
+                                      [tool_input_from_main_agent]: {main_agent_response_dict.get("tool_usage_response")}\n \
                                       [tool_instruction_from_tool_agent]: {str(tool_response_dict)}\n \
                                       [tool_execution_result]: {tool_execution_result_str}'
         
-
         # 4. add response format to the overall response dict
         overall_response_dict = overall_response_dict + f"\n [response_format]: {response_format}"
 
         #print(f"DEBUG: Overall response dict: {overall_response_dict}")
+        return overall_response_dict
 
-        visualizer_response = self.visualizer_agent.generate_response(overall_response_dict)
-
+    def _finalize_response(self, visualizer_response, return_response: Dict[str, Any]) -> Dict[str, Any]:
+        '''
+        Parse the visualizer response and fill in the return response.
+        '''
         #print(f"DEBUG: Visualizer response: {visualizer_response}")
 
-        visualizer_response_dict = convert_string_to_dict(visualizer_response)
+        visualizer_response_dict = convert_agent_response_to_dict(visualizer_response)
         
         #print(f"DEBUG: Visualizer response: {visualizer_response_dict}")
 
         # Format the visualizer response
 
-        return_response['final_response_to_user'] = visualizer_response_dict["final_response_to_user"]
-        return_response['summarized_response'] = visualizer_response_dict["summarized_response"]
+        return self._fill_return_response(visualizer_response_dict, return_response)
+
+    def _fill_return_response(self, response_dict: Dict[str, Any], return_response: Dict[str, Any]) -> Dict[str, Any]:
+        return_response['final_response_to_user'] = response_dict.get("final_response_to_user") or ""
+        return_response['summarized_response'] = response_dict.get("summarized_response") or ""
         return_response['current_agent_name'] = self.current_agent.agent_name
         return_response['current_agent_type'] = self.current_agent.agent_type
 
         #print(f"DEBUG: Return response: {return_response}")
 
-        return return_response, self.current_agent
-    
+        return return_response
@@ -11,8 +11,8 @@ from typing import Optional, Dict, Callable
 #import torch
 from pathlib import Path
 import sys
-import openai  # Add OpenAI import
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from core_engines.utils.clients import get_openai_client
 
 class AudioInput:
     def __init__(self, config: dict, on_wake_word: Optional[Callable] = None):
@@ -113,7 +113,7 @@ class AudioInput:
                 return
                 
             # Set up the OpenAI client
-            self.client = openai.OpenAI(api_key=api_key)
+            self.client = get_openai_client(api_key)
             self.logger.info("OpenAI API client initialized for Whisper transcription")
             
             # Set model configuration
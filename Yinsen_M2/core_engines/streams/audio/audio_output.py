@@ -1,8 +1,11 @@
 import logging
-from typing import Optional
+from typing import Optional, Iterable, Iterator
 import os
 import platform
+import queue
+import re
 import tempfile
+import threading
 from gtts import gTTS
 
 class AudioOutput:
@@ -90,6 +93,41 @@ class AudioOutput:
         except Exception as e:
             self.logger.error(f"Error in text-to-speech: {str(e)}")
     
+    # sentence boundaries used to chunk streamed text for TTS
+    SENTENCE_END = re.compile(r'(?<=[.!?])\s+|\n+')
+
+    def speak_stream(self, chunks: Iterable[str]) -> Iterator[str]:
+        """
+        Speak streamed text sentence by sentence while passing the chunks through.
+        Sentences are spoken on a worker thread, so the caller keeps consuming the
+        stream (e.g. to display it) while earlier sentences are being played.
+        """
+        sentences = queue.Queue()
+        worker = threading.Thread(target=self._speak_worker, args=(sentences,), daemon=True)
+        worker.start()
+
+        buffer = ""
+        try:
+            for chunk in chunks:
+                buffer += chunk
+                # hand every complete sentence to the worker
+                *complete, buffer = self.SENTENCE_END.split(buffer)
+                for sentence in complete:
+                    sentences.put(sentence)
+                yield chunk
+        finally:
+            sentences.put(buffer)
+            sentences.put(None)
+
+    def _speak_worker(self, sentences: queue.Queue) -> None:
+        """Speak queued sentences in order until a None sentinel is received"""
+        while True:
+            sentence = sentences.get()
+            if sentence is None:
+                break
+            if sentence.strip():
+                self.speak(sentence.strip())
+
     def change_language(self, language_code: str) -> None:
         """Change TTS language"""
         try:
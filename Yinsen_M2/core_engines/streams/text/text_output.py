@@ -1,5 +1,6 @@
 import logging
 from datetime import datetime
+from typing import Iterable
 
 class TextOutput:
     def __init__(self, agent_name, config: dict):
@@ -14,6 +15,20 @@ class TextOutput:
         formatted_text = f"[{timestamp}] {self.agent_name}: {text}"
         print(formatted_text)
         self._log_output(formatted_text)
+
+    def display_stream(self, chunks: Iterable[str], prefix: str = "") -> str:
+        """Display streamed text as it arrives, on a single timestamped line"""
+        timestamp = datetime.now().strftime("%H:%M:%S")
+        header = f"[{timestamp}] {self.agent_name}: {prefix}"
+        print(header, end='', flush=True)
+        parts = []
+        for chunk in chunks:
+            parts.append(chunk)
+            print(chunk, end='', flush=True)
+        print()
+        text = "".join(parts)
+        self._log_output(header + text)
+        return text
         
     def _log_output(self, text: str):
         """Log output to file"""
@@ -0,0 +1,58 @@
+'''
+Process-wide registry of OpenAI API clients.
+
+All agents, the toolbox and the audio input share one sync and one async client
+per API key, so they also share one keep-alive connection pool. Hopping between
+agents then reuses warm TLS connections instead of opening new ones.
+'''
+
+import os
+import threading
+from typing import Dict, Any, Optional
+
+import httpx
+import openai
+
+# Connection pool settings, can be overridden with configure_client_pool()
+_pool_settings = {
+    'max_connections': 100,
+    'max_keepalive_connections': 20,
+    'keepalive_expiry': 120.0,  # seconds an idle connection is kept open
+}
+
+_clients = {}
+_async_clients = {}
+_lock = threading.Lock()
+
+
+def configure_client_pool(settings: Optional[Dict[str, Any]] = None):
+    """Set the connection pool settings; only affects clients created afterwards"""
+    if settings:
+        _pool_settings.update({key: value for key, value in settings.items() if key in _pool_settings})
+
+
+def _pool_limits() -> httpx.Limits:
+    return httpx.Limits(**_pool_settings)
+
+
+def get_openai_client(api_key: Optional[str] = None) -> openai.OpenAI:
+    """Get the shared sync OpenAI client for an API key (defaults to OPENAI_API_KEY)"""
+    api_key = api_key or os.environ.get('OPENAI_API_KEY')
+    with _lock:
+        if api_key not in _clients:
+            _clients[api_key] = openai.OpenAI(api_key=api_key,
+                                              http_client=openai.DefaultHttpxClient(limits=_pool_limits()))
+        return _clients[api_key]
+
+
+def get_async_openai_client(api_key: Optional[str] = None) -> openai.AsyncOpenAI:
+    """
+    Get the shared async OpenAI client for an API key (defaults to OPENAI_API_KEY).
+    Its connections belong to the event loop that first uses them, i.e. the backend's loop.
+    """
+    api_key = api_key or os.environ.get('OPENAI_API_KEY')
+    with _lock:
+        if api_key not in _async_clients:
+            _async_clients[api_key] = openai.AsyncOpenAI(api_key=api_key,
+                                                         http_client=openai.DefaultAsyncHttpxClient(limits=_pool_limits()))
+        return _async_clients[api_key]
@@ -3,6 +3,8 @@ This file contains the parsers for the response from different LLM agents.
 
 '''
 
+import re
+import json
 from typing import Dict, Any
 
 # parser for main LLM agent response
@@ -43,29 +45,148 @@ def convert_string_to_dict(response_string: str) -> dict:
     if not response_string:
         return {}
     
-    result = {}
-    
-    # Find all [key]: value patterns in the string using regex
-    import re
-    pattern = r'\[(.*?)\]:\s*(.*?)(?=\[\w+\]:|$)'
-    matches = re.findall(pattern, response_string, re.DOTALL)
-    
-    for key, value in matches:
-        # Clean up the value (remove extra whitespace)
-        value = value.strip()
-        
-        # Convert boolean strings to actual boolean values
-        if value.lower() == 'true':
-            value = True
-        elif value.lower() == 'false':
-            value = False
-        elif value == '':
-            value = None
-            
-        # Add to the result dictionary
-        result[key] = value
-    
-    return result
+    parser = StreamingResponseParser()
+    parser.feed(response_string)
+    parser.close()
+    return parser.fields
+
+def _convert_field_value(value: str):
+    """Clean up a [key]: value and convert boolean strings to actual boolean values"""
+    value = value.strip()
+    if value.lower() == 'true':
+        return True
+    elif value.lower() == 'false':
+        return False
+    elif value == '':
+        return None
+    return value
+
+class StreamingResponseParser:
+    """
+    Incremental parser for the bracketed [key]: value response format.
+
+    Feed the response chunk by chunk as it is streamed. Each call to feed returns the
+    (key, value) fields that were completed by that chunk, i.e. as soon as the next
+    [key]: header starts. close() completes the last field once the stream has ended.
+    All completed fields are also collected in self.fields.
+
+    If on_delta is given, it is called with (key, text) for every piece of a field
+    value that is safe to emit, so a field can be displayed while it is generated.
+    Text that could still turn out to be the start of the next header is held back.
+
+    Example:
+        parser = StreamingResponseParser()
+        for chunk in chunks:
+            for key, value in parser.feed(chunk):
+                ...  # e.g. act on [tool_usage_response] before the response ends
+        parser.close()
+    """
+
+    HEADER_PATTERN = re.compile(r'\[(\w+)\]:')
+    PARTIAL_HEADER_PATTERN = re.compile(r'\[\w*\]?')
+
+    def __init__(self, on_delta=None):
+        self.on_delta = on_delta
+        self.fields = {}
+        self.buffer = ""
+        self.current_key = None
+        self.current_value = []
+        self.pending_whitespace = ""
+
+    def feed(self, chunk: str) -> list:
+        completed = []
+        if not chunk:
+            return completed
+        self.buffer += chunk
+
+        while True:
+            match = self.HEADER_PATTERN.search(self.buffer)
+            if not match:
+                break
+            if self.current_key is not None:
+                self._append_value(self.buffer[:match.start()])
+                completed.append(self._complete_field())
+            # anything before the first header is not part of a field
+            self.current_key = match.group(1)
+            self.buffer = self.buffer[match.end():]
+
+        # keep a possible partial header at the end of the buffer for the next chunk
+        bracket = self.buffer.rfind('[')
+        if bracket != -1 and self.PARTIAL_HEADER_PATTERN.fullmatch(self.buffer, bracket):
+            safe, self.buffer = self.buffer[:bracket], self.buffer[bracket:]
+        else:
+            safe, self.buffer = self.buffer, ""
+        if self.current_key is not None:
+            self._append_value(safe)
+        return completed
+
+    def close(self) -> list:
+        """Complete the last field once the stream has ended"""
+        completed = []
+        if self.current_key is not None:
+            self._append_value(self.buffer)
+            completed.append(self._complete_field())
+        self.buffer = ""
+        self.current_key = None
+        return completed
+
+    def _append_value(self, text: str):
+        if not text:
+            return
+        # trailing whitespace is only emitted once more text follows it
+        text = self.pending_whitespace + text
+        stripped = text.rstrip()
+        self.pending_whitespace = text[len(stripped):]
+        if not stripped:
+            return
+        if not self.current_value:
+            stripped = stripped.lstrip()
+        self.current_value.append(stripped)
+        if self.on_delta:
+            self.on_delta(self.current_key, stripped)
+
+    def _complete_field(self):
+        key, value = self.current_key, _convert_field_value("".join(self.current_value))
+        self.fields[key] = value
+        self.current_value = []
+        self.pending_whitespace = ""
+        return key, value
+
+class FieldStreamer:
+    """
+    Extract the value of a single [key]: field from a streamed response.
+
+    Each call to feed returns the part of the field value that is safe to emit so far.
+
+    Example:
+        streamer = FieldStreamer("final_response_to_user")
+        for chunk in chunks:
+            print(streamer.feed(chunk), end="")
+        print(streamer.close())
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self.deltas = []
+        self.parser = StreamingResponseParser(on_delta=self._on_delta)
+
+    def feed(self, chunk: str) -> str:
+        self.parser.feed(chunk)
+        return self._take()
+
+    def close(self) -> str:
+        """Flush whatever is left once the stream has ended"""
+        self.parser.close()
+        return self._take()
+
+    def _on_delta(self, key: str, text: str):
+        if key == self.key:
+            self.deltas.append(text)
+
+    def _take(self) -> str:
+        text = "".join(self.deltas)
+        self.deltas = []
+        return text
 
 def convert_tool_response_json_string_to_dict(json_string: str) -> dict:
     """
@@ -84,8 +205,8 @@ def convert_tool_response_json_string_to_dict(json_string: str) -> dict:
         return {}
     
     try:
-        import json
-        dict_result = json.loads(json_string)
+        # schema-enforced responses carry null placeholders for the fields of the other branch
+        dict_result = _drop_null_fields(json.loads(json_string))
         print(f"DEBUG: Dict result: {dict_result}")
         #for key in dict_result['instructions'].keys():
         #    if dict_result['instructions'][key].lower() == 'true':
@@ -96,6 +217,26 @@ def convert_tool_response_json_string_to_dict(json_string: str) -> dict:
     except json.JSONDecodeError as e:
         raise ValueError(f"Invalid JSON string: {e}")
 
+def convert_agent_response_to_dict(response: str) -> dict:
+    """
+    Convert an agent response to a dictionary, whether it is a schema-enforced
+    JSON object (structured output) or the [key]: value text format.
+    """
+    if response and response.lstrip().startswith('{'):
+        try:
+            result = json.loads(response)
+        except json.JSONDecodeError:
+            result = None
+        if isinstance(result, dict):
+            return _drop_null_fields(result)
+    return convert_string_to_dict(response)
+
+def _drop_null_fields(value):
+    """Recursively remove keys with None values from dicts"""
+    if isinstance(value, dict):
+        return {key: _drop_null_fields(item) for key, item in value.items() if item is not None}
+    return value
+
 # Google Calendar Event Parser Function
 def parse_google_calendar_event(event_dict: dict) -> dict:
     """
@@ -143,6 +284,10 @@ def parse_google_calendar_event(event_dict: dict) -> dict:
         """
         from datetime import datetime
         
+        # cancelled events (from incremental syncs) carry no times
+        if not iso_datetime_str:
+            return ''
+        
         # Parse the ISO datetime string
         try:
             # Use fromisoformat for Python 3.7+
@@ -185,6 +330,9 @@ def parse_google_calendar_event(event_dict: dict) -> dict:
             'organizer': event_dict.get('organizer', {}).get('email', ''),
             'start_time': format_iso_datetime(_extract_datetime(event_dict.get('start', {}))),
             'end_time': format_iso_datetime(_extract_datetime(event_dict.get('end', {}))),
+            'start_iso': _extract_datetime(event_dict.get('start', {})),
+            'end_iso': _extract_datetime(event_dict.get('end', {})),
+            'location': event_dict.get('location', ''),
             'timezone': _extract_timezone(event_dict.get('start', {})),
             'html_link': event_dict.get('htmlLink', ''),
             'ical_uid': event_dict.get('iCalUID', ''),
@@ -0,0 +1,158 @@
+import html
+import re
+from typing import Dict, List, Any, Optional
+
+RESPONSE_FORMATS = ("TEXT", "HTML")
+
+BULLET_PATTERN = re.compile(r'^\s*[-*•]\s+(.*)$')
+NUMBERED_PATTERN = re.compile(r'^\s*\d+[.)]\s+(.*)$')
+BOLD_PATTERN = re.compile(r'\*\*(.+?)\*\*')
+SENTENCE_PATTERN = re.compile(r'^(.+?[.!?])(\s|$)', re.DOTALL)
+
+
+def is_tabular_result(tool_execution_result) -> bool:
+    """A successful tool result whose data is a non-empty list of records"""
+    if not isinstance(tool_execution_result, dict) or tool_execution_result.get('status') != 'success':
+        return False
+    data = tool_execution_result.get('data')
+    return isinstance(data, list) and len(data) > 0 and all(isinstance(row, dict) for row in data)
+
+
+def _format_cell(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    return str(value)
+
+
+def _first_sentence(text: str) -> str:
+    match = SENTENCE_PATTERN.match(text.strip())
+    return match.group(1) if match else text.strip()
+
+
+class LocalRenderer:
+    """
+    Deterministic replacement for the visualizer agent in the common cases.
+
+    Plain replies of a main agent (with or without an agent switch) and tabular tool
+    results are formatted locally as TEXT or HTML, so these turns skip the extra LLM
+    round trip. render() returns None for everything else and the caller falls back
+    to the visualizer agent.
+    """
+
+    def render(self,
+               main_agent_response_dict: Dict[str, Any],
+               switch_status,
+               tool_execution_result,
+               response_format: str,
+               current_agent_name: str) -> Optional[Dict[str, str]]:
+        """Return final_response_to_user and summarized_response, or None if the visualizer is needed"""
+        if response_format not in RESPONSE_FORMATS:
+            return None
+
+        detailed_response = main_agent_response_dict.get("detailed_response")
+        summarized_response = main_agent_response_dict.get("summarized_response")
+
+        if not main_agent_response_dict.get("tool_usage_flag"):
+            if not detailed_response:
+                return None
+            if main_agent_response_dict.get("invoke_another_agent_flag"):
+                return self._render_switch(switch_status,
+                                           main_agent_response_dict.get("invoke_agent_name"),
+                                           current_agent_name,
+                                           response_format)
+            return self._render_reply(str(detailed_response), summarized_response, response_format)
+
+        if is_tabular_result(tool_execution_result):
+            return self._render_table(tool_execution_result['data'], detailed_response, summarized_response,
+                                      response_format)
+
+        return None
+
+    def _render_reply(self, detailed_response: str, summarized_response, response_format: str) -> Dict[str, str]:
+        if response_format == "HTML":
+            final_response = self._text_to_html(detailed_response)
+        else:
+            final_response = detailed_response.strip()
+
+        summary = str(summarized_response).strip() if summarized_response else _first_sentence(detailed_response)
+        return {"final_response_to_user": final_response, "summarized_response": summary}
+
+    def _render_switch(self, switch_status, requested_agent_name, current_agent_name: str, response_format: str) -> Dict[str, str]:
+        if switch_status:
+            message = f"Successfully switched to {current_agent_name}."
+        else:
+            message = f"Could not switch to {requested_agent_name}, you are still talking to {current_agent_name}."
+        final_response = f"<p>{html.escape(message)}</p>" if response_format == "HTML" else message
+        return {"final_response_to_user": final_response, "summarized_response": message}
+
+    def _render_table(self, records: List[Dict[str, Any]], detailed_response, summarized_response,
+                      response_format: str) -> Dict[str, str]:
+        columns = []
+        for row in records:
+            for column in row:
+                if column not in columns:
+                    columns.append(column)
+        rows = [[_format_cell(row.get(column)) for column in columns] for row in records]
+
+        # the agent's own answer leads; the canned sentence is only for a bare tool result
+        if detailed_response:
+            intro = str(detailed_response).strip()
+            summary = str(summarized_response).strip() if summarized_response else _first_sentence(intro)
+        else:
+            item_word = "item" if len(records) == 1 else "items"
+            summary = f"Here are the {len(records)} {item_word} you asked for."
+            intro = summary[:-1] + ":"
+
+        if response_format == "HTML":
+            header = "".join(f"<th>{html.escape(str(column))}</th>" for column in columns)
+            body = "".join("<tr>" + "".join(f"<td>{html.escape(cell)}</td>" for cell in row) + "</tr>" for row in rows)
+            final_response = f"{self._text_to_html(intro)}<table><tr>{header}</tr>{body}</table>"
+        else:
+            widths = [max(len(str(column)), *(len(row[i]) for row in rows)) for i, column in enumerate(columns)]
+            lines = [" | ".join(str(column).ljust(widths[i]) for i, column in enumerate(columns)),
+                     "-+-".join("-" * width for width in widths)]
+            lines += [" | ".join(cell.ljust(widths[i]) for i, cell in enumerate(row)) for row in rows]
+            final_response = f"{intro}\n" + "\n".join(line.rstrip() for line in lines)
+
+        return {"final_response_to_user": final_response, "summarized_response": summary}
+
+    def _text_to_html(self, text: str) -> str:
+        """Paragraphs, bullet/numbered lists and **bold** to HTML"""
+        parts = []
+        list_tag, list_items = None, []
+
+        def flush_list():
+            nonlocal list_tag, list_items
+            if list_items:
+                parts.append(f"<{list_tag}>" + "".join(f"<li>{item}</li>" for item in list_items) + f"</{list_tag}>")
+            list_tag, list_items = None, []
+
+        paragraph = []
+
+        def flush_paragraph():
+            if paragraph:
+                parts.append("<p>" + "<br>".join(paragraph) + "</p>")
+                paragraph.clear()
+
+        for line in text.strip().splitlines():
+            escaped = BOLD_PATTERN.sub(r'<b>\1</b>', html.escape(line.strip()))
+            bullet, numbered = BULLET_PATTERN.match(line), NUMBERED_PATTERN.match(line)
+            if bullet or numbered:
+                flush_paragraph()
+                tag = "ul" if bullet else "ol"
+                if list_tag != tag:
+                    flush_list()
+                    list_tag = tag
+                item = (bullet or numbered).group(1)
+                list_items.append(BOLD_PATTERN.sub(r'<b>\1</b>', html.escape(item.strip())))
+            elif not line.strip():
+                flush_list()
+                flush_paragraph()
+            else:
+                flush_list()
+                paragraph.append(escaped)
+        flush_list()
+        flush_paragraph()
+        return "".join(parts)
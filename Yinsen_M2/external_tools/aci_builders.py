@@ -0,0 +1,199 @@
+'''
+Deterministic builders of ACI function arguments from tool instruction dicts.
+
+The toolbox used to ask a reasoning model to map e.g. {'action': 'create', 'start_time': ...}
+onto the GOOGLE_CALENDAR__EVENTS_INSERT arguments. These mappings are mechanical, so they
+are built here in plain Python. Builders raise ValueError when the instructions cannot be
+mapped; the toolbox then falls back to the model.
+'''
+
+import re
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, Tuple
+
+INSTRUCTION_DATETIME_FORMAT = '%d/%m/%Y %H:%M'
+INSTRUCTION_DATE_FORMAT = '%d/%m/%Y'
+
+DEFAULT_EVENT_DURATION = timedelta(hours=1)
+
+DURATION_PATTERN = re.compile(r'(\d+(?:\.\d+)?)\s*(h|hr|hrs|hour|hours|m|min|mins|minute|minutes)?\b', re.IGNORECASE)
+EMAIL_PATTERN = re.compile(r'[\w.+-]+@[\w-]+(?:\.[\w-]+)+')
+GREETING_PATTERN = re.compile(r'^(hi|hello|hey|dear|good (morning|afternoon|evening))\b', re.IGNORECASE)
+
+
+def _local_datetime(value: str, date_format: str = INSTRUCTION_DATETIME_FORMAT) -> datetime:
+    """Parse an instruction date(time) as local time"""
+    return datetime.strptime(value.strip(), date_format).astimezone()
+
+
+def to_rfc3339(value: datetime) -> str:
+    """RFC3339 timestamp with the local UTC offset, e.g. 2025-04-03T17:00:00+02:00"""
+    return value.astimezone().isoformat(timespec='seconds')
+
+
+def parse_duration(duration) -> timedelta:
+    """'2 hours', '1h 30m', '45 minutes', 90 (minutes) -> timedelta"""
+    if isinstance(duration, (int, float)):
+        return timedelta(minutes=duration)
+    total = timedelta()
+    matches = DURATION_PATTERN.findall(str(duration))
+    if not matches:
+        raise ValueError(f"Cannot parse duration: {duration}")
+    for amount, unit in matches:
+        if unit.lower().startswith('h'):
+            total += timedelta(hours=float(amount))
+        else:
+            total += timedelta(minutes=float(amount))
+    return total
+
+
+def _event_title(description: str) -> str:
+    title = description.strip().split('\n')[0]
+    return title[:1].upper() + title[1:]
+
+
+def _email_subject(content: str) -> str:
+    """First sentence of the first line that is not a greeting"""
+    lines = [line.strip() for line in content.split('\n') if line.strip()]
+    for line in lines:
+        if not GREETING_PATTERN.match(line):
+            return re.split(r'(?<=[.!?])\s', line)[0][:78]
+    return lines[0][:78] if lines else ""
+
+
+def event_window(instructions: Dict[str, Any]) -> Tuple[datetime, datetime]:
+    """Local start and end of an event from start_time and end_time or duration (default one hour)"""
+    if not instructions.get('start_time'):
+        raise ValueError("start_time is required")
+    start = _local_datetime(instructions['start_time'])
+    if instructions.get('end_time'):
+        end = _local_datetime(instructions['end_time'])
+    elif instructions.get('duration'):
+        end = start + parse_duration(instructions['duration'])
+    else:
+        end = start + DEFAULT_EVENT_DURATION
+    if end <= start:
+        raise ValueError("end_time must be after start_time")
+    return start, end
+
+
+def build_calendar_events_insert(instructions: Dict[str, Any]) -> Dict[str, Any]:
+    if not instructions.get('start_time') or not instructions.get('description'):
+        raise ValueError("start_time and description are required")
+
+    start, end = event_window(instructions)
+    body = {
+        "summary": _event_title(instructions['description']),
+        "description": instructions['description'],
+        "start": {"dateTime": to_rfc3339(start)},
+        "end": {"dateTime": to_rfc3339(end)},
+    }
+    if instructions.get('location'):
+        body["location"] = instructions['location']
+    attendees = EMAIL_PATTERN.findall(str(instructions.get('participant') or ''))
+    if attendees:
+        body["attendees"] = [{"email": email} for email in attendees]
+
+    return {"path": {"calendarId": "primary"}, "body": body}
+
+
+def build_calendar_events_list(instructions: Dict[str, Any]) -> Dict[str, Any]:
+    if not instructions.get('date'):
+        raise ValueError("date is required")
+    day_start = _local_datetime(instructions['date'], INSTRUCTION_DATE_FORMAT)
+    return {
+        "path": {"calendarId": "primary"},
+        "query": {
+            "timeMin": to_rfc3339(day_start),
+            "timeMax": to_rfc3339(day_start + timedelta(days=1)),
+            "singleEvents": True,
+            "orderBy": "startTime",
+        },
+    }
+
+
+def build_calendar_events_sync(sync_token: Optional[str] = None, page_token: Optional[str] = None,
+                               updated_min: Optional[str] = None) -> Dict[str, Any]:
+    """Arguments of one page of a full or incremental (syncToken / updatedMin) events sync"""
+    query = {"singleEvents": True, "maxResults": 2500}
+    if sync_token:
+        query["syncToken"] = sync_token
+    elif updated_min:
+        query["updatedMin"] = updated_min
+        query["showDeleted"] = True
+    if page_token:
+        query["pageToken"] = page_token
+    return {"path": {"calendarId": "primary"}, "query": query}
+
+
+def build_gmail_send_email(instructions: Dict[str, Any]) -> Dict[str, Any]:
+    recipients = EMAIL_PATTERN.findall(str(instructions.get('to') or ''))
+    if not recipients or not instructions.get('content'):
+        raise ValueError("to and content are required")
+    subject = instructions.get('subject') or _email_subject(instructions['content'])
+    arguments = {
+        "sender": "me",
+        "recipient": recipients[0],
+        "subject": subject,
+        "body": instructions['content'],
+    }
+    if len(recipients) > 1:
+        arguments["cc"] = recipients[1:]
+    return arguments
+
+
+def build_gmail_messages_list(instructions: Dict[str, Any], page_token: Optional[str] = None) -> Dict[str, Any]:
+    query = {"maxResults": int(instructions.get('last_n_emails') or 10)}
+    search = []
+    if instructions.get('until_date'):
+        # Gmail's before: is exclusive, so search up to the day after
+        until = datetime.strptime(instructions['until_date'].strip(), INSTRUCTION_DATE_FORMAT) + timedelta(days=1)
+        search.append(f"before:{until.strftime('%Y/%m/%d')}")
+    if instructions.get('since_date'):
+        since = datetime.strptime(instructions['since_date'].strip(), INSTRUCTION_DATE_FORMAT)
+        search.append(f"after:{since.strftime('%Y/%m/%d')}")
+    if instructions.get('query'):
+        search.append(str(instructions['query']))
+    if search:
+        query["q"] = " ".join(search)
+    if page_token:
+        query["pageToken"] = page_token
+    return {"path": {"userId": "me"}, "query": query}
+
+
+def build_gmail_messages_get(message_id: str, message_format: str = "full") -> Dict[str, Any]:
+    return {"path": {"userId": "me", "id": message_id}, "query": {"format": message_format}}
+
+
+# ACI function name -> builder taking the tool instructions
+ACI_ARGUMENT_BUILDERS = {
+    "GOOGLE_CALENDAR__EVENTS_INSERT": build_calendar_events_insert,
+    "GOOGLE_CALENDAR__EVENTS_LIST": build_calendar_events_list,
+    "GMAIL__SEND_EMAIL": build_gmail_send_email,
+    "GMAIL__MESSAGES_LIST": build_gmail_messages_list,
+}
+
+
+def matches_definition(function_definition: Dict[str, Any], arguments: Dict[str, Any]) -> bool:
+    """
+    Check that every argument (recursively for objects) is declared in the function
+    definition's JSON schema, so a changed ACI schema sends us to the model instead.
+    """
+    if not isinstance(function_definition, dict):
+        return False
+    schema = function_definition.get('function', function_definition).get('parameters')
+    if not isinstance(schema, dict):
+        return False
+    return _matches_schema(schema, arguments)
+
+
+def _matches_schema(schema: Dict[str, Any], value) -> bool:
+    if not isinstance(value, dict):
+        return True
+    properties = schema.get('properties')
+    if properties is None:
+        return True
+    for key, item in value.items():
+        if key not in properties or not _matches_schema(properties[key], item):
+            return False
+    return all(key in value for key in schema.get('required', []))
@@ -0,0 +1,108 @@
+import logging
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, List, Any, Optional
+
+try:
+    from importlib.metadata import version as _package_version
+    ACI_SDK_VERSION = _package_version("aipolabs")
+except Exception:  # not installed as a distribution (e.g. vendored)
+    ACI_SDK_VERSION = "unknown"
+
+# Bump when the layout of the cache file changes
+CACHE_FORMAT_VERSION = 1
+
+
+class AciDefinitionCache:
+    """
+    Cache of ACI function definitions in memory and on disk.
+
+    Definitions almost never change, so they are fetched once and reused for ttl_seconds,
+    also across restarts. The disk cache is discarded when it was written by another cache
+    format or ACI SDK version. If refreshing an expired definition fails, the stale copy is
+    used rather than failing the tool call.
+    """
+
+    def __init__(self, aci, cache_path: Optional[str] = None, ttl_seconds: float = 7 * 24 * 3600):
+        self.logger = logging.getLogger(__name__)
+        self.aci = aci
+        self.cache_path = cache_path
+        self.ttl_seconds = ttl_seconds
+
+        self._entries = {}  # function name -> {"fetched_at": ..., "definition": ...}
+        self._lock = threading.Lock()
+        self._load()
+
+    def get(self, function_name: str) -> Dict[str, Any]:
+        """Definition of an ACI function, fetched only if missing or expired"""
+        entry = self._entries.get(function_name)
+        if entry is not None and not self._expired(entry):
+            return entry["definition"]
+
+        with self._lock:
+            # another thread (e.g. the preload) may have fetched it meanwhile
+            entry = self._entries.get(function_name)
+            if entry is not None and not self._expired(entry):
+                return entry["definition"]
+            try:
+                definition = self.aci.functions.get_definition(function_name)
+            except Exception as e:
+                if entry is not None:
+                    self.logger.warning(f"Could not refresh ACI definition of {function_name}, using the cached one: {e}")
+                    return entry["definition"]
+                raise
+            self._entries[function_name] = {"fetched_at": time.time(), "definition": definition}
+            self._save()
+            return definition
+
+    def preload(self, function_names: List[str], background: bool = True):
+        """Fetch the definitions that are missing or expired, by default in a daemon thread"""
+        missing = [name for name in function_names
+                   if name not in self._entries or self._expired(self._entries[name])]
+        if not missing:
+            return
+        if background:
+            threading.Thread(target=self._preload, args=(missing,), daemon=True).start()
+        else:
+            self._preload(missing)
+
+    def _preload(self, function_names: List[str]):
+        for function_name in function_names:
+            try:
+                self.get(function_name)
+            except Exception as e:
+                self.logger.warning(f"Could not preload ACI definition of {function_name}: {e}")
+
+    def _expired(self, entry: Dict[str, Any]) -> bool:
+        return time.time() - entry["fetched_at"] > self.ttl_seconds
+
+    def _load(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            self.logger.warning(f"Ignoring unreadable ACI definition cache {self.cache_path}: {e}")
+            return
+        if data.get("format_version") != CACHE_FORMAT_VERSION or data.get("sdk_version") != ACI_SDK_VERSION:
+            self.logger.info("ACI definition cache was written by another version, refetching definitions")
+            return
+        self._entries = data.get("entries", {})
+
+    def _save(self):
+        if not self.cache_path:
+            return
+        data = {"format_version": CACHE_FORMAT_VERSION, "sdk_version": ACI_SDK_VERSION, "entries": self._entries}
+        directory = os.path.dirname(self.cache_path) or '.'
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, temp_filename = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(temp_filename, self.cache_path)
+        except Exception as e:
+            self.logger.warning(f"Could not write ACI definition cache: {e}")
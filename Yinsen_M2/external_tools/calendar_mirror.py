@@ -0,0 +1,383 @@
+import logging
+import bisect
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Any, Optional, Tuple
+
+from core_engines.utils.parsers import parse_google_calendar_event
+from external_tools.aci_builders import INSTRUCTION_DATE_FORMAT, build_calendar_events_sync, event_window
+
+# Bump when the layout of the mirror file changes
+MIRROR_FORMAT_VERSION = 1
+
+# Errors of the Calendar API meaning the sync token expired and a full sync is needed
+FULL_SYNC_REQUIRED_MARKERS = ("410", "fullSyncRequired", "Sync token is no longer valid")
+
+
+def _timestamp(iso_value: str) -> float:
+    """Epoch seconds of an event start/end; all-day dates are taken as local midnight"""
+    if len(iso_value) == 10:
+        return datetime.strptime(iso_value, '%Y-%m-%d').astimezone().timestamp()
+    return datetime.fromisoformat(iso_value.replace('Z', '+00:00')).timestamp()
+
+
+def _local_time(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp).strftime('%d/%m/%Y %H:%M')
+
+
+class IntervalIndex:
+    """
+    Interval index over [start, end) intervals: starts are kept sorted, together with
+    the running maximum of the ends. Overlap queries bisect both arrays, so they only scan
+    the intervals that start before the query ends and may still be running at its start.
+    """
+
+    def __init__(self, intervals: List[Tuple[float, float, str]] = ()):
+        intervals = sorted(intervals)
+        self._starts = [interval[0] for interval in intervals]
+        self._ends = [interval[1] for interval in intervals]
+        self._keys = [interval[2] for interval in intervals]
+        self._max_ends = []
+        self._update_max_ends(0)
+
+    def __len__(self):
+        return len(self._starts)
+
+    def _update_max_ends(self, position: int):
+        del self._max_ends[position:]
+        running = self._max_ends[-1] if self._max_ends else float('-inf')
+        for end in self._ends[position:]:
+            running = max(running, end)
+            self._max_ends.append(running)
+
+    def add(self, start: float, end: float, key: str):
+        position = bisect.bisect_right(self._starts, start)
+        self._starts.insert(position, start)
+        self._ends.insert(position, end)
+        self._keys.insert(position, key)
+        self._update_max_ends(position)
+
+    def remove(self, key: str):
+        if key not in self._keys:
+            return
+        position = self._keys.index(key)
+        del self._starts[position], self._ends[position], self._keys[position]
+        self._update_max_ends(position)
+
+    def overlapping(self, start: float, end: float) -> List[str]:
+        """Keys of the intervals overlapping [start, end), by start"""
+        last = bisect.bisect_left(self._starts, end)
+        # the running max of ends is sorted: skip every interval that ended before start
+        first = bisect.bisect_right(self._max_ends, start, 0, last)
+        return [self._keys[i] for i in range(first, last) if self._ends[i] > start]
+
+
+class CalendarMirror:
+    """
+    Local mirror of the user's primary Google Calendar.
+
+    The first sync lists all events; later syncs only fetch changes with the sync token
+    returned by the previous one (or, if the API gave none, the events updated since the
+    last sync). Events are kept on disk and in an IntervalIndex, so day views and
+    availability checks are answered locally, and new events are checked for conflicts
+    before they are created. The mirror syncs on access when it is older than
+    max_staleness_seconds, and can also be kept fresh by a periodic background sync.
+
+    A sync fetches its pages and builds the new event map and index without holding the
+    mirror lock, so views and conflict checks are answered from the current mirror while
+    it runs; the lock is only taken to swap the new state in.
+    """
+
+    def __init__(self, aci, linked_account_owner_id: str, mirror_path: Optional[str] = None,
+                 max_staleness_seconds: float = 300):
+        self.logger = logging.getLogger(__name__)
+        self.aci = aci
+        self.linked_account_owner_id = linked_account_owner_id
+        self.mirror_path = mirror_path
+        self.max_staleness_seconds = max_staleness_seconds
+
+        self.events = {}  # event id -> parsed event (see parse_google_calendar_event) plus start_ts, end_ts, busy
+        self.sync_token = None
+        self.updated_min = None
+        self.last_sync = None
+        self.index = IntervalIndex()
+
+        self._lock = threading.RLock()        # guards the mirror state
+        self._sync_lock = threading.RLock()   # one sync at a time
+        self._save_lock = threading.Lock()    # one writer of the mirror file at a time
+        self._local_items = None  # raw events added with add_event while a sync is fetching
+        self._load()
+
+    # Sync -----------------------------------------------------------------------------------------------
+    def sync(self) -> int:
+        """Bring the mirror up to date, returns the number of changed events"""
+        with self._sync_lock:
+            with self._lock:
+                full = not self.sync_token and not self.updated_min
+                self._local_items = []
+            try:
+                try:
+                    changed = self._sync(full)
+                except RuntimeError as e:
+                    if full or not any(marker in str(e) for marker in FULL_SYNC_REQUIRED_MARKERS):
+                        raise
+                    self.logger.info("Calendar sync token expired, running a full sync")
+                    changed = self._sync(True)
+            finally:
+                with self._lock:
+                    self._local_items = None
+            self._save()
+            return changed
+
+    def _sync(self, full: bool) -> int:
+        started_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+        with self._lock:
+            events = {} if full else dict(self.events)
+            sync_token = None if full else self.sync_token
+            updated_min = None if full or sync_token else self.updated_min
+
+        # fetch and index without the lock, queries keep using the current mirror meanwhile
+        changed, page_token = 0, None
+        while True:
+            data = self._execute(build_calendar_events_sync(sync_token, page_token, updated_min))
+            for item in data.get('items', []) or []:
+                changed += self._apply(events, item)
+            page_token = data.get('nextPageToken')
+            if not page_token:
+                break
+        index = self._build_index(events)
+
+        with self._lock:
+            # events created locally during the fetch may be missing from it
+            for item in self._local_items or []:
+                self._apply_to(events, index, item)
+            self.events = events
+            self.index = index
+            self.sync_token = data.get('nextSyncToken')
+            # without a sync token, the next sync asks for everything updated since this one started
+            self.updated_min = None if self.sync_token else started_at
+            self.last_sync = time.time()
+        self.logger.info(f"Synced calendar mirror ({'full' if full else 'incremental'}): {changed} changed events")
+        return changed
+
+    def _execute(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        result = self.aci.functions.execute("GOOGLE_CALENDAR__EVENTS_LIST", arguments,
+                                            linked_account_owner_id=self.linked_account_owner_id)
+        if not result.success:
+            raise RuntimeError(f"GOOGLE_CALENDAR__EVENTS_LIST failed: {result.error}")
+        return result.data or {}
+
+    def _apply(self, events: Dict[str, Dict[str, Any]], item: Dict[str, Any]) -> int:
+        event_id = item.get('id')
+        if not event_id:
+            return 0
+        if item.get('status') == 'cancelled':
+            return 1 if events.pop(event_id, None) is not None else 0
+        event = parse_google_calendar_event(item)
+        if not event['start_iso'] or not event['end_iso']:
+            return 0
+        event['start_ts'] = _timestamp(event['start_iso'])
+        event['end_ts'] = _timestamp(event['end_iso'])
+        event['busy'] = item.get('transparency') != 'transparent'
+        events[event_id] = event
+        return 1
+
+    def _apply_to(self, events: Dict[str, Dict[str, Any]], index: IntervalIndex, item: Dict[str, Any]) -> int:
+        """_apply, keeping index in step with events"""
+        changed = self._apply(events, item)
+        if changed:
+            index.remove(item['id'])
+            if item['id'] in events:
+                event = events[item['id']]
+                index.add(event['start_ts'], event['end_ts'], item['id'])
+        return changed
+
+    def add_event(self, item: Dict[str, Any]):
+        """Add or update one raw Calendar API event (e.g. the result of an insert)"""
+        with self._lock:
+            changed = self._apply_to(self.events, self.index, item)
+            if self._local_items is not None:
+                self._local_items.append(item)
+        if changed:
+            self._save()
+
+    def start_periodic_sync(self, interval_seconds: float):
+        """Keep the mirror fresh from a daemon thread, so requests rarely wait for a sync"""
+        def _run():
+            while True:
+                try:
+                    self.sync()
+                except Exception as e:
+                    self.logger.warning(f"Periodic calendar sync failed: {e}")
+                time.sleep(interval_seconds)
+        threading.Thread(target=_run, daemon=True, name="calendar-sync").start()
+
+    def _is_fresh(self) -> bool:
+        return self.last_sync is not None and time.time() - self.last_sync <= self.max_staleness_seconds
+
+    def ensure_fresh(self) -> bool:
+        """Sync if the mirror is stale; returns False if there is no usable mirror"""
+        if self._is_fresh():
+            return True
+        # a sync is already running: answer from the current mirror instead of waiting for it
+        if not self._sync_lock.acquire(blocking=self.last_sync is None):
+            return True
+        try:
+            if self._is_fresh():  # synced while we waited
+                return True
+            self.sync()
+            return True
+        except Exception as e:
+            if self.last_sync is None:
+                self.logger.warning(f"Could not sync the calendar mirror: {e}")
+                return False
+            self.logger.warning(f"Could not sync the calendar mirror, using the mirror from {_local_time(self.last_sync)}: {e}")
+            return True
+        finally:
+            self._sync_lock.release()
+
+    def _rebuild_index(self):
+        self.index = self._build_index(self.events)
+
+    @staticmethod
+    def _build_index(events: Dict[str, Dict[str, Any]]) -> IntervalIndex:
+        return IntervalIndex([(event['start_ts'], event['end_ts'], event_id) for event_id, event in events.items()])
+
+    # Queries --------------------------------------------------------------------------------------------
+    def events_between(self, start: datetime, end: datetime, busy_only: bool = False) -> List[Dict[str, Any]]:
+        """Events overlapping [start, end), by start time"""
+        with self._lock:
+            events = [self.events[event_id] for event_id in self.index.overlapping(start.timestamp(), end.timestamp())]
+        return [event for event in events if event['busy'] or not busy_only]
+
+    def free_slots_near(self, start: datetime, end: datetime, count: int = 3,
+                        search_window: timedelta = timedelta(days=1)) -> List[Tuple[datetime, datetime]]:
+        """The count free slots of the same length as [start, end) closest to start, by time"""
+        duration = end - start
+        window_start, window_end = start - search_window, end + search_window
+        busy = []  # merged busy intervals
+        for event in self.events_between(window_start, window_end, busy_only=True):
+            event_start, event_end = datetime.fromtimestamp(event['start_ts']).astimezone(), datetime.fromtimestamp(event['end_ts']).astimezone()
+            if busy and event_start <= busy[-1][1]:
+                busy[-1][1] = max(busy[-1][1], event_end)
+            else:
+                busy.append([event_start, event_end])
+
+        # in every gap, the slot closest to the requested start
+        slots = []
+        gap_start = window_start
+        for busy_start, busy_end in busy + [[window_end, window_end]]:
+            if busy_start - gap_start >= duration:
+                slot_start = min(max(start, gap_start), busy_start - duration)
+                slots.append((slot_start, slot_start + duration))
+            gap_start = max(gap_start, busy_end)
+        slots = sorted(slots, key=lambda slot: abs(slot[0] - start))[:count]
+        return sorted(slots)
+
+    def events_on(self, date: str) -> List[Dict[str, Any]]:
+        """Events on a local day (DD/MM/YYYY)"""
+        day_start = datetime.strptime(date.strip(), INSTRUCTION_DATE_FORMAT).astimezone()
+        return self.events_between(day_start, day_start + timedelta(days=1))
+
+    def _event_row(self, event: Dict[str, Any]) -> Dict[str, str]:
+        return {
+            "start_time": "all day" if event['is_all_day'] else _local_time(event['start_ts']),
+            "end_time": "" if event['is_all_day'] else _local_time(event['end_ts']),
+            "summary": event['summary'],
+            "location": event.get('location', ''),
+        }
+
+    # Tool actions ---------------------------------------------------------------------------------------
+    def view(self, instructions: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Events on instructions['date'], or None if the mirror cannot be used"""
+        if not self.ensure_fresh():
+            return None
+        events = self.events_on(instructions['date'])
+        if not events:
+            return {'status': 'info', 'message': f"No events on {instructions['date']}"}
+        return {'status': 'success', 'data': [self._event_row(event) for event in events]}
+
+    def check_availability(self, instructions: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Whether the user is free between start_time and end_time (or start_time + duration)"""
+        if not self.ensure_fresh():
+            return None
+        start, end = event_window(instructions)
+        conflicts = self.events_between(start, end, busy_only=True)
+        if not conflicts:
+            return {'status': 'success', 'message': f"You are free on {self._window(start, end)}"}
+        return self._conflicts_response(f"You have {len(conflicts)} event(s) on {self._window(start, end)}",
+                                        start, end, conflicts)
+
+    def check_new_event(self, instructions: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Conflict check of a create request: a response listing the conflicting events and the
+        nearest free slots, or None if the event can be created (no conflicts, or no mirror).
+        """
+        if instructions.get('allow_conflicts') or not self.ensure_fresh():
+            return None
+        try:
+            start, end = event_window(instructions)
+        except (KeyError, ValueError):
+            return None
+        conflicts = self.events_between(start, end, busy_only=True)
+        if not conflicts:
+            return None
+        return self._conflicts_response(f"The event on {self._window(start, end)} was not created, "
+                                        f"it conflicts with {len(conflicts)} event(s)", start, end, conflicts)
+
+    def _window(self, start: datetime, end: datetime) -> str:
+        return f"{start.strftime('%d/%m/%Y %H:%M')} - {end.strftime('%H:%M')}"
+
+    def _conflicts_response(self, message: str, start: datetime, end: datetime,
+                            conflicts: List[Dict[str, Any]]) -> Dict[str, Any]:
+        free_slots = [self._window(slot_start, slot_end) for slot_start, slot_end in self.free_slots_near(start, end)]
+        if free_slots:
+            message += f". Nearest free slots: {', '.join(free_slots)}"
+        return {'status': 'info', 'message': message,
+                'data': [self._event_row(event) for event in conflicts],
+                'free_slots': free_slots}
+
+    # Persistence ----------------------------------------------------------------------------------------
+    def _load(self):
+        if not self.mirror_path or not os.path.exists(self.mirror_path):
+            return
+        try:
+            with open(self.mirror_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            self.logger.warning(f"Ignoring unreadable calendar mirror {self.mirror_path}: {e}")
+            return
+        if data.get("format_version") != MIRROR_FORMAT_VERSION:
+            self.logger.info("Calendar mirror was written by another version, running a full sync")
+            return
+        self.events = data.get("events", {})
+        self.sync_token = data.get("sync_token")
+        self.updated_min = data.get("updated_min")
+        self.last_sync = data.get("last_sync")
+        self._rebuild_index()
+
+    def _save(self):
+        if not self.mirror_path:
+            return
+        # snapshot under the save lock, so a later snapshot is never overwritten by an earlier one
+        with self._save_lock:
+            with self._lock:
+                # events are replaced, never mutated, so a shallow copy is a consistent snapshot
+                data = {"format_version": MIRROR_FORMAT_VERSION, "sync_token": self.sync_token, "updated_min": self.updated_min,
+                        "last_sync": self.last_sync, "events": dict(self.events)}
+            self._write(data)
+
+    def _write(self, data: Dict[str, Any]):
+        directory = os.path.dirname(self.mirror_path) or '.'
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, temp_filename = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(temp_filename, self.mirror_path)
+        except Exception as e:
+            self.logger.warning(f"Could not write calendar mirror: {e}")
@@ -0,0 +1,160 @@
+import logging
+import base64
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Dict, List, Any, Callable, Iterator, Optional
+
+from external_tools.aci_builders import build_gmail_messages_list, build_gmail_messages_get
+
+DEFAULT_EMAIL_COUNT = 10
+MAX_EMAIL_COUNT = 100
+
+
+def _decode_body(data: str) -> str:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4)).decode('utf-8', errors='replace')
+
+
+def extract_text_body(payload: Dict[str, Any]) -> str:
+    """The text/plain body of a Gmail message payload (searching multipart parts depth-first)"""
+    if not payload:
+        return ""
+    if payload.get('mimeType') == 'text/plain' and payload.get('body', {}).get('data'):
+        return _decode_body(payload['body']['data'])
+    for part in payload.get('parts', []) or []:
+        text = extract_text_body(part)
+        if text:
+            return text
+    return ""
+
+
+def parse_gmail_message(message: Dict[str, Any]) -> Dict[str, Any]:
+    """Flatten a Gmail message resource into the fields the agents need"""
+    payload = message.get('payload', {}) or {}
+    headers = {header.get('name'): header.get('value') for header in payload.get('headers', []) or []}
+    return {
+        "id": message.get('id'),
+        "thread_id": message.get('threadId'),
+        "internal_date": int(message.get('internalDate') or 0),
+        "date": headers.get("Date", ""),
+        "from": headers.get("From", ""),
+        "to": headers.get("To", ""),
+        "subject": headers.get("Subject", ""),
+        "snippet": message.get('snippet', ""),
+        "body": extract_text_body(payload),
+    }
+
+
+class EmailReader:
+    """
+    Batched Gmail reader on top of the ACI GMAIL__MESSAGES_LIST/GET functions.
+
+    Message ids are listed page by page, following nextPageToken only while more ids are
+    needed, and every id is fetched with MESSAGES_GET on a bounded thread pool as soon as
+    it is listed. Reading the last 20 emails is one list call plus one parallel wave of gets.
+
+    With an EmailStore, only ids that are not stored yet are fetched, and with a summarizer
+    (body -> short summary) every message is summarized once and the summary is stored.
+    """
+
+    def __init__(self, aci, linked_account_owner_id: str, max_workers: int = 8,
+                 store=None, summarizer: Optional[Callable[[Dict[str, Any]], str]] = None):
+        self.logger = logging.getLogger(__name__)
+        self.aci = aci
+        self.linked_account_owner_id = linked_account_owner_id
+        self.store = store
+        self.summarizer = summarizer
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gmail")
+
+    def _execute(self, function_name: str, arguments: Dict[str, Any]):
+        result = self.aci.functions.execute(function_name, arguments, linked_account_owner_id=self.linked_account_owner_id)
+        if not result.success:
+            raise RuntimeError(f"{function_name} failed: {result.error}")
+        return result.data or {}
+
+    def iter_message_refs(self, instructions: Dict[str, Any]) -> Iterator[Dict[str, str]]:
+        """Lazily yield {'id', 'threadId'} of the matching messages, newest first"""
+        page_token = None
+        while True:
+            data = self._execute("GMAIL__MESSAGES_LIST", build_gmail_messages_list(instructions, page_token))
+            for message_ref in data.get('messages', []) or []:
+                yield message_ref
+            page_token = data.get('nextPageToken')
+            if not page_token:
+                return
+
+    def get_message(self, message_id: str) -> Dict[str, Any]:
+        return parse_gmail_message(self._execute("GMAIL__MESSAGES_GET", build_gmail_messages_get(message_id)))
+
+    def get_messages(self, message_ids: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """Fetch messages concurrently, in the given order; failed fetches are None"""
+        futures = [self._executor.submit(self.get_message, message_id) for message_id in message_ids]
+        return [self._result(future) for future in futures]
+
+    def _result(self, future) -> Optional[Any]:
+        try:
+            return future.result()
+        except Exception as e:
+            self.logger.warning(f"Could not fetch email: {e}")
+            return None
+
+    def read(self, instructions: Dict[str, Any]) -> Dict[str, Any]:
+        """Read the emails selected by the 'read' instructions (last_n_emails, until_date, since_date, query)"""
+        count = min(int(instructions.get('last_n_emails') or DEFAULT_EMAIL_COUNT), MAX_EMAIL_COUNT)
+        if self.store is None:
+            return self._read_live(instructions, count)
+
+        try:
+            message_ids = [message_ref['id'] for message_ref in
+                           islice(self.iter_message_refs({**instructions, 'last_n_emails': count}), count)]
+        except Exception as e:
+            return {'status': 'error', 'message': f'Could not list emails: {e}'}
+
+        stored = self.store.headers(message_ids)
+        new_ids = [message_id for message_id in message_ids if message_id not in stored]
+        if new_ids:
+            fetched = [email for email in self.get_messages(new_ids) if email is not None]
+            self.store.put_messages(fetched)
+            stored.update(self.store.headers([email['id'] for email in fetched]))
+            self.logger.info(f"Fetched {len(fetched)} new emails, {len(message_ids) - len(new_ids)} served from the email store")
+
+        emails = [stored[message_id] for message_id in message_ids if message_id in stored]
+        if self.summarizer is not None:
+            self._summarize_missing(emails)
+        if not emails:
+            return {'status': 'info', 'message': 'No emails found'}
+        return {'status': 'success', 'data': [
+            {"date": email['date'], "from": email['sender'], "subject": email['subject'],
+             "summary": email['summary'] or email['snippet']} for email in emails
+        ]}
+
+    def _read_live(self, instructions: Dict[str, Any], count: int) -> Dict[str, Any]:
+        try:
+            # gets are submitted while later pages are still being listed
+            futures = [self._executor.submit(self.get_message, message_ref['id'])
+                       for message_ref in islice(self.iter_message_refs({**instructions, 'last_n_emails': count}), count)]
+        except Exception as e:
+            return {'status': 'error', 'message': f'Could not list emails: {e}'}
+
+        emails = [email for email in (self._result(future) for future in futures) if email is not None]
+        if not emails:
+            return {'status': 'info', 'message': 'No emails found'}
+        return {'status': 'success', 'data': [
+            {key: email[key] for key in ("date", "from", "subject", "snippet")} for email in emails
+        ]}
+
+    def _summarize_missing(self, emails: List[Dict[str, Any]]):
+        """Summarize the emails without a stored summary (concurrently) and store the summaries"""
+        missing = [email for email in emails if not email.get('summary')]
+        if not missing:
+            return
+        futures = [self._executor.submit(self._summarize, email['id']) for email in missing]
+        summaries = {}
+        for email, future in zip(missing, futures):
+            summary = self._result(future)
+            if summary:
+                email['summary'] = summaries[email['id']] = summary
+        self.store.set_summaries(summaries)
+
+    def _summarize(self, message_id: str) -> str:
+        # the body is only read from the store when it is summarized
+        return self.summarizer(self.store.get(message_id))
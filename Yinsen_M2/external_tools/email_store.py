@@ -0,0 +1,100 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Any, Iterable, Optional
+
+# Columns returned by header-only queries (everything but the body)
+HEADER_COLUMNS = ("id", "thread_id", "internal_date", "date", "sender", "recipient", "subject", "snippet", "summary")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id TEXT PRIMARY KEY,
+    thread_id TEXT,
+    internal_date INTEGER,
+    date TEXT,
+    sender TEXT,
+    recipient TEXT,
+    subject TEXT,
+    snippet TEXT,
+    body TEXT,
+    summary TEXT,
+    fetched_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_thread ON messages (thread_id, internal_date);
+CREATE INDEX IF NOT EXISTS idx_messages_internal_date ON messages (internal_date);
+"""
+
+
+class EmailStore:
+    """
+    On-disk store of fetched Gmail messages, keyed by message id and indexed by thread id.
+
+    Gmail messages never change once sent, so a message is fetched (and summarized) once
+    and served from here afterwards. Listing queries only read the header columns.
+    """
+
+    def __init__(self, db_path: str):
+        self.logger = logging.getLogger(__name__)
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.executescript(SCHEMA)
+
+    def _select(self, query: str, params: Iterable = ()) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(query, tuple(params))]
+
+    def headers(self, message_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Header rows (no body) of the stored messages among message_ids, by id"""
+        rows = {}
+        # stay below SQLite's host parameter limit
+        for start in range(0, len(message_ids), 500):
+            chunk = message_ids[start:start + 500]
+            query = f"SELECT {', '.join(HEADER_COLUMNS)} FROM messages WHERE id IN ({', '.join('?' * len(chunk))})"
+            rows.update((row['id'], row) for row in self._select(query, chunk))
+        return rows
+
+    def list_headers(self, limit: int = 10, thread_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Newest stored messages (optionally of one thread), header columns only"""
+        query = f"SELECT {', '.join(HEADER_COLUMNS)} FROM messages"
+        params = []
+        if thread_id is not None:
+            query += " WHERE thread_id = ?"
+            params.append(thread_id)
+        query += " ORDER BY internal_date DESC LIMIT ?"
+        params.append(limit)
+        return self._select(query, params)
+
+    def get(self, message_id: str) -> Optional[Dict[str, Any]]:
+        rows = self._select("SELECT * FROM messages WHERE id = ?", (message_id,))
+        return rows[0] if rows else None
+
+    def put_messages(self, emails: List[Dict[str, Any]]):
+        """Store parsed messages (see email_reader.parse_gmail_message), keeping existing summaries"""
+        now = time.time()
+        rows = [(email['id'], email.get('thread_id'), email.get('internal_date'), email.get('date'), email.get('from'),
+                 email.get('to'), email.get('subject'), email.get('snippet'), email.get('body'), now)
+                for email in emails]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO messages (id, thread_id, internal_date, date, sender, recipient, subject, snippet, body, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET thread_id = excluded.thread_id, internal_date = excluded.internal_date, "
+                "date = excluded.date, sender = excluded.sender, recipient = excluded.recipient, subject = excluded.subject, "
+                "snippet = excluded.snippet, body = excluded.body, fetched_at = excluded.fetched_at",
+                rows)
+
+    def set_summaries(self, summaries: Dict[str, str]):
+        with self._lock, self._conn:
+            self._conn.executemany("UPDATE messages SET summary = ? WHERE id = ?",
+                                   [(summary, message_id) for message_id, summary in summaries.items()])
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,225 @@
+import logging
+import json
+import os
+import shutil
+import tempfile
+import threading
+from datetime import date
+from typing import Dict, List, Any, Optional
+
+import numpy as np
+import pandas as pd
+
+from external_tools.expense_store import ExpenseStore, EXPENSE_COLUMNS
+
+ARCHIVE_FORMAT_VERSION = 1
+
+# on-disk dtype of each column; category and currency are stored as codes into the partition's dictionaries
+COLUMN_DTYPES = {"date": np.int32, "amount": np.float64, "category": np.int32, "currency": np.int32}
+DICTIONARY_COLUMNS = ("category", "currency")
+
+
+def _month_start(month: str) -> date:
+    """YYYY-MM -> first day of the month"""
+    return date(int(month[:4]), int(month[5:7]), 1)
+
+
+def _next_month(day: date) -> date:
+    return date(day.year + 1, 1, 1) if day.month == 12 else date(day.year, day.month + 1, 1)
+
+
+def _days(day: date) -> int:
+    """Days since 1970-01-01, the stored date format"""
+    return int(np.datetime64(day, 'D').astype(np.int64))
+
+
+class ExpenseArchive:
+    """
+    Columnar, memory-mapped archive of closed months of the expense log.
+
+    Every month before the current one is compacted from the ExpenseStore into its own
+    partition directory with one .npy file per column (dates as days, amounts, and
+    category/currency codes), rows in date order. manifest.json lists the partitions with
+    their row count, total and dictionaries; a month whose count or total in the store's
+    monthly rollup no longer matches (e.g. a back-dated expense) is compacted again.
+
+    Queries memory-map only the columns they need from only the partitions overlapping the
+    date range, and cut partial months with a binary search on the sorted date column.
+    The current month is read from the store.
+    """
+
+    def __init__(self, store: ExpenseStore, archive_dir: str):
+        self.logger = logging.getLogger(__name__)
+        self.store = store
+        self.archive_dir = archive_dir
+        self.manifest_path = os.path.join(archive_dir, 'manifest.json')
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.months = {}  # YYYY-MM -> {'dir', 'count', 'total', 'category', 'currency'}
+        self._load()
+
+    # Compaction -----------------------------------------------------------------------------------------
+    def compact(self, today: Optional[date] = None) -> List[str]:
+        """Archive closed months that are missing or out of date, returns the compacted months"""
+        with self._lock:
+            return self._compact(today or date.today())
+
+    def _compact(self, today: date) -> List[str]:
+        current_month = today.strftime('%Y-%m')
+        stale = [row for row in self.store.rollup('month')
+                 if row['bucket'] < current_month and self._entry_key(self.months.get(row['bucket'])) != (row['count'], row['total_amount'])]
+        if not stale:
+            return []
+
+        os.makedirs(self.archive_dir, exist_ok=True)
+        replaced = []
+        for row in stale:
+            month = row['bucket']
+            start = _month_start(month)
+            df = self.store.typed_frame(start, _next_month(start))
+            self.generation += 1
+            entry = self._write_partition(month, df)
+            # the rollup's figures, so the next check compares like with like
+            entry.update(count=row['count'], total=row['total_amount'])
+            if month in self.months:
+                replaced.append(self.months[month]['dir'])
+            self.months[month] = entry
+        self._save()
+        # old partitions only after the manifest no longer points at them
+        for directory in replaced:
+            shutil.rmtree(os.path.join(self.archive_dir, directory), ignore_errors=True)
+        self.logger.info(f"Compacted {len(stale)} expense months into {self.archive_dir}")
+        return [row['bucket'] for row in stale]
+
+    @staticmethod
+    def _entry_key(entry: Optional[Dict[str, Any]]):
+        return (entry['count'], entry['total']) if entry else None
+
+    def _write_partition(self, month: str, df: pd.DataFrame) -> Dict[str, Any]:
+        directory = f"{month}.{self.generation}"
+        columns = {
+            "date": df['date'].to_numpy().astype('datetime64[D]').astype(COLUMN_DTYPES['date']),
+            "amount": df['amount'].to_numpy(dtype=COLUMN_DTYPES['amount']),
+        }
+        entry = {"dir": directory}
+        for column in DICTIONARY_COLUMNS:
+            columns[column] = df[column].cat.codes.to_numpy().astype(COLUMN_DTYPES[column])
+            entry[column] = [str(value) for value in df[column].cat.categories]
+
+        temp_dir = tempfile.mkdtemp(dir=self.archive_dir, prefix='.tmp-')
+        try:
+            for column, values in columns.items():
+                np.save(os.path.join(temp_dir, f"{column}.npy"), values)
+            target = os.path.join(self.archive_dir, directory)
+            if os.path.exists(target):  # left over from a manifest that was not kept
+                shutil.rmtree(target)
+            os.replace(temp_dir, target)
+        except Exception:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            raise
+        return entry
+
+    # Queries --------------------------------------------------------------------------------------------
+    def frame(self, columns: Optional[List[str]] = None, start: Optional[date] = None, end: Optional[date] = None,
+              today: Optional[date] = None) -> pd.DataFrame:
+        """
+        Expenses with start <= date < end (either bound optional), by date, in the layout of
+        ExpenseStore.typed_frame restricted to columns (a subset of EXPENSE_COLUMNS)
+        """
+        columns = [column for column in EXPENSE_COLUMNS if columns is None or column in columns]
+        today = today or date.today()
+        with self._lock:
+            try:
+                self._compact(today)
+            except Exception as e:
+                self.logger.warning(f"Could not compact expense archive, reading from the database: {e}")
+                return self.store.typed_frame(start, end, columns)
+
+            open_from = _month_start(today.strftime('%Y-%m'))
+            pieces = [self._read_partition(month, columns, start, end) for month in sorted(self.months)
+                      if month < today.strftime('%Y-%m') and self._overlaps(month, start, end)]
+            if end is None or end > open_from:
+                recent = self.store.typed_frame(max(start, open_from) if start else open_from, end, columns)
+                pieces.append(self._frame_piece(recent, columns))
+        return self._combine(pieces, columns)
+
+    @staticmethod
+    def _overlaps(month: str, start: Optional[date], end: Optional[date]) -> bool:
+        month_start = _month_start(month)
+        return (start is None or _next_month(month_start) > start) and (end is None or month_start < end)
+
+    def _read_partition(self, month: str, columns: List[str], start: Optional[date], end: Optional[date]) -> Dict[str, Any]:
+        entry = self.months[month]
+        directory = os.path.join(self.archive_dir, entry['dir'])
+        dates = np.load(os.path.join(directory, "date.npy"), mmap_mode='r')
+        # rows are in date order: the range is a slice, found by binary search
+        first = 0 if start is None else int(np.searchsorted(dates, _days(start), side='left'))
+        last = len(dates) if end is None else int(np.searchsorted(dates, _days(end), side='left'))
+        piece = {}
+        for column in columns:
+            values = dates if column == "date" else np.load(os.path.join(directory, f"{column}.npy"), mmap_mode='r')
+            piece[column] = values[first:last]
+        for column in DICTIONARY_COLUMNS:
+            if column in columns:
+                piece[column] = (piece[column], entry[column])
+        return piece
+
+    @staticmethod
+    def _frame_piece(df: pd.DataFrame, columns: List[str]) -> Dict[str, Any]:
+        """A typed_frame in the partition layout"""
+        piece = {}
+        if "date" in columns:
+            piece["date"] = df['date'].to_numpy().astype('datetime64[D]').astype(COLUMN_DTYPES['date'])
+        if "amount" in columns:
+            piece["amount"] = df['amount'].to_numpy(dtype=COLUMN_DTYPES['amount'])
+        for column in DICTIONARY_COLUMNS:
+            if column in columns:
+                piece[column] = (df[column].cat.codes.to_numpy().astype(COLUMN_DTYPES[column]),
+                                 [str(value) for value in df[column].cat.categories])
+        return piece
+
+    @staticmethod
+    def _combine(pieces: List[Dict[str, Any]], columns: List[str]) -> pd.DataFrame:
+        data = {}
+        if "date" in columns:
+            days = np.concatenate([piece["date"] for piece in pieces] or [np.empty(0, COLUMN_DTYPES['date'])])
+            data["date"] = days.astype('datetime64[D]').astype('datetime64[ns]')
+        if "amount" in columns:
+            data["amount"] = np.concatenate([piece["amount"] for piece in pieces] or [np.empty(0, COLUMN_DTYPES['amount'])])
+        for column in DICTIONARY_COLUMNS:
+            if column not in columns:
+                continue
+            # each partition has its own dictionary: remap the codes onto the union of them
+            categories = sorted(set().union(*(piece[column][1] for piece in pieces)))
+            position = {value: index for index, value in enumerate(categories)}
+            codes = []
+            for piece in pieces:
+                piece_codes, piece_categories = piece[column]
+                lookup = np.array([position[value] for value in piece_categories] + [-1], dtype=COLUMN_DTYPES[column])
+                codes.append(lookup[piece_codes])  # code -1 (missing) maps to the trailing -1
+            codes = np.concatenate(codes) if codes else np.empty(0, COLUMN_DTYPES[column])
+            data[column] = pd.Categorical.from_codes(codes, categories=categories)
+        return pd.DataFrame(data, columns=columns)
+
+    # Persistence ----------------------------------------------------------------------------------------
+    def _load(self):
+        if not os.path.exists(self.manifest_path):
+            return
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            self.logger.warning(f"Ignoring unreadable expense archive manifest {self.manifest_path}: {e}")
+            return
+        if data.get("format_version") != ARCHIVE_FORMAT_VERSION:
+            self.logger.info("Expense archive was written by another version, compacting again")
+            return
+        self.generation = data.get("generation", 0)
+        self.months = data.get("months", {})
+
+    def _save(self):
+        data = {"format_version": ARCHIVE_FORMAT_VERSION, "generation": self.generation, "months": self.months}
+        fd, temp_filename = tempfile.mkstemp(dir=self.archive_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(temp_filename, self.manifest_path)
@@ -0,0 +1,246 @@
+'''
+Bulk import of bank statement exports (CSV, OFX/QFX) into the ExpenseStore.
+
+Files are read in chunks (pandas chunks for CSV, a streaming block reader for OFX), each
+chunk is validated and normalized with vectorized string/date operations, and all chunks
+are inserted in one transaction: an import either lands completely or not at all.
+
+Every row carries a fingerprint of its date, amount, description and how many identical
+rows came before it in the file, and the store skips fingerprints it has imported before:
+importing the same statement twice, or two overlapping ones, adds each expense once.
+
+Statements list outflows as negative amounts (or in a debit column); those are the
+expenses. Credits are skipped, unless debits_positive says the file lists expenses as
+positive amounts (e.g. some credit card exports).
+'''
+
+import hashlib
+import logging
+import os
+import re
+from collections import Counter
+from typing import Dict, List, Any, Iterator
+
+import numpy as np
+import pandas as pd
+import yaml
+
+from external_tools.expense_store import ExpenseStore
+
+DEFAULT_CHUNK_ROWS = 10000
+
+# header names (lower case) recognised in CSV exports
+CSV_COLUMN_ALIASES = {
+    "date": ["date", "transaction date", "posted date", "posting date", "booking date", "value date", "trans date"],
+    "amount": ["amount", "transaction amount", "value", "amount (eur)", "amount (usd)"],
+    "debit": ["debit", "debit amount", "withdrawal", "withdrawals", "money out", "paid out"],
+    "description": ["description", "details", "memo", "payee", "name", "narrative", "merchant", "transaction description"],
+    "currency": ["currency", "ccy", "currency code"],
+    "category": ["category"],
+}
+
+# tried in order on the first chunk, the one parsing the most dates wins (ties go to DD/MM/YYYY, the tool format)
+CSV_DATE_FORMATS = ['%d/%m/%Y', '%Y-%m-%d', '%m/%d/%Y', '%d-%m-%Y', '%d.%m.%Y', '%Y/%m/%d', '%Y%m%d', '%d/%m/%y', '%m/%d/%y']
+
+# description keywords per category, checked in this order; categories missing from the categories file are skipped
+CATEGORY_KEYWORDS = {
+    "food": ["restaurant", "cafe", "coffee", "starbucks", "mcdonald", "burger", "pizza", "bakery", "grocery", "groceries",
+             "supermarket", "uber eats", "doordash", "deliveroo", "grubhub", "just eat", "kfc", "subway", "dining", "food"],
+    "travel": ["airline", "airways", "flight", "hotel", "airbnb", "booking.com", "expedia", "uber", "lyft", "taxi", "cab",
+               "train", "rail", "metro", "bus", "fuel", "petrol", "gas station", "parking", "toll", "car rental"],
+    "entertainment": ["netflix", "spotify", "disney", "hulu", "prime video", "youtube", "cinema", "movie", "theatre",
+                      "theater", "concert", "ticketmaster", "steam", "playstation", "xbox", "nintendo"],
+    "shopping": ["amazon", "ebay", "walmart", "target", "ikea", "costco", "best buy", "zara", "h&m", "store", "shop", "shopping",
+                 "mall", "clothing", "apparel", "electronics"],
+}
+FALLBACK_CATEGORY = "other"
+
+OFX_TRANSACTION = re.compile(r'<STMTTRN>(.*?)</STMTTRN>', re.IGNORECASE | re.DOTALL)
+OFX_FIELD = re.compile(r'<(\w+)>([^<\r\n]*)')
+OFX_CURRENCY = re.compile(r'<CURDEF>\s*([A-Za-z]{3})', re.IGNORECASE)
+
+
+def load_expense_categories(path: str) -> List[str]:
+    """Categories listed in config/finance_expense_categories.txt (YAML: categories: [...])"""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = yaml.safe_load(f) or {}
+    return [str(category).strip().lower() for category in data.get("categories", []) if str(category).strip()]
+
+
+def _parse_amounts(values: pd.Series) -> pd.Series:
+    """Amount strings (currency symbols, thousands separators, (12.50) negatives, 12,50 decimal commas) -> floats, NaN if invalid"""
+    text = values.astype(str).str.strip()
+    negative = text.str.startswith('(') & text.str.endswith(')')
+    text = text.str.replace(r'[^\d,.\-]', '', regex=True)
+    decimal_comma = text.str.fullmatch(r'-?[\d.]*,\d{1,2}')
+    text = text.where(~decimal_comma, text.str.replace('.', '', regex=False).str.replace(',', '.', regex=False))
+    text = text.where(decimal_comma, text.str.replace(',', '', regex=False))
+    amounts = pd.to_numeric(text, errors='coerce')
+    return amounts.where(~negative, -amounts.abs())
+
+
+def _detect_date_format(values: pd.Series) -> str:
+    sample = values.dropna().astype(str).str.strip().str.split(' ').str[0].head(500)
+    parsed = [pd.to_datetime(sample, format=date_format, errors='coerce').notna().sum() for date_format in CSV_DATE_FORMATS]
+    return CSV_DATE_FORMATS[int(np.argmax(parsed))]
+
+
+def _keyword_pattern(keywords: List[str]) -> str:
+    """Whole words (or their plural) only, so 'bus' does not match 'business'"""
+    return r'\b(?:' + '|'.join(re.escape(keyword) for keyword in keywords) + r')s?\b'
+
+
+class StatementImporter:
+    """Streams a statement file into normalized (iso date, amount, category, currency, fingerprint) rows"""
+
+    def __init__(self, categories: List[str], default_currency: str = "USD", chunk_rows: int = DEFAULT_CHUNK_ROWS,
+                 debits_positive: bool = False):
+        self.logger = logging.getLogger(__name__)
+        self.categories = categories
+        self.default_currency = default_currency.upper()
+        self.chunk_rows = chunk_rows
+        self.debits_positive = debits_positive
+        self.fallback_category = FALLBACK_CATEGORY if FALLBACK_CATEGORY in categories else (categories[-1] if categories else FALLBACK_CATEGORY)
+        self.keyword_patterns = [(category, _keyword_pattern(keywords))
+                                 for category, keywords in CATEGORY_KEYWORDS.items() if category in categories]
+        self.stats = {"imported": 0, "skipped_invalid": 0, "skipped_credits": 0, "skipped_duplicates": 0}
+        self._occurrences = Counter()  # (date, amount, description) -> rows seen so far in this file
+
+    # Readers --------------------------------------------------------------------------------------------
+    def chunks(self, file_path: str) -> Iterator[List[tuple]]:
+        """Rows to insert, chunk by chunk; raises ValueError for unsupported or unreadable files"""
+        extension = os.path.splitext(file_path)[1].lower()
+        if extension in ('.ofx', '.qfx'):
+            raw_chunks = self._ofx_chunks(file_path)
+        elif extension in ('.csv', '.txt'):
+            raw_chunks = self._csv_chunks(file_path)
+        else:
+            raise ValueError(f"Unsupported statement format: {extension or file_path} (use a CSV or OFX/QFX export)")
+        for raw in raw_chunks:
+            rows = self._normalize(raw)
+            if rows:
+                yield rows
+
+    def _csv_chunks(self, file_path: str) -> Iterator[pd.DataFrame]:
+        reader = pd.read_csv(file_path, dtype=str, chunksize=self.chunk_rows, skipinitialspace=True,
+                             encoding='utf-8-sig', keep_default_na=False)
+        columns, date_format = None, None
+        for chunk in reader:
+            if columns is None:
+                columns = self._map_csv_columns(chunk.columns)
+                date_format = _detect_date_format(chunk[columns["date"]])
+                self.logger.info(f"Importing {file_path}: columns {columns}, dates as {date_format}")
+            raw = pd.DataFrame({"date": pd.to_datetime(chunk[columns["date"]].str.strip().str.split(' ').str[0],
+                                                       format=date_format, errors='coerce')})
+            if "debit" in columns:
+                # a debit column holds the expenses, signed the way _normalize expects them; rows without a debit are credits
+                debits = _parse_amounts(chunk[columns["debit"]]).abs()
+                raw["amount"] = debits if self.debits_positive else -debits
+                raw.loc[chunk[columns["debit"]].str.strip() == '', "amount"] = 0.0
+            else:
+                raw["amount"] = _parse_amounts(chunk[columns["amount"]])
+            for column in ("description", "currency", "category"):
+                raw[column] = chunk[columns[column]].to_numpy() if column in columns else ''
+            yield raw
+
+    @staticmethod
+    def _map_csv_columns(headers) -> Dict[str, str]:
+        by_name = {str(header).strip().lower(): header for header in headers}
+        columns = {}
+        for field, aliases in CSV_COLUMN_ALIASES.items():
+            match = next((by_name[alias] for alias in aliases if alias in by_name), None)
+            if match is not None:
+                columns[field] = match
+        if "date" not in columns or ("amount" not in columns and "debit" not in columns):
+            raise ValueError(f"Could not find a date and an amount (or debit) column in: {list(headers)}")
+        if "debit" in columns:
+            columns.pop("amount", None)
+        return columns
+
+    def _ofx_chunks(self, file_path: str) -> Iterator[pd.DataFrame]:
+        currency, currency_found = self.default_currency, False
+        records, buffer = [], ''
+        with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+            while True:
+                block = f.read(1 << 16)
+                buffer += block
+                if not currency_found:
+                    found = OFX_CURRENCY.search(buffer)
+                    if found:
+                        currency, currency_found = found.group(1).upper(), True
+                last_end = 0
+                for transaction in OFX_TRANSACTION.finditer(buffer):
+                    fields = {name.upper(): value.strip() for name, value in OFX_FIELD.findall(transaction.group(1))}
+                    records.append({"date": fields.get("DTPOSTED", "")[:8], "amount": fields.get("TRNAMT", ""),
+                                    "description": f"{fields.get('NAME', '')} {fields.get('MEMO', '')}".strip(),
+                                    "currency": fields.get("CURRENCY", currency), "category": ''})
+                    last_end = transaction.end()
+                buffer = buffer[last_end:]
+                if len(records) >= self.chunk_rows or (not block and records):
+                    yield self._ofx_frame(records)
+                    records = []
+                if not block:
+                    break
+
+    @staticmethod
+    def _ofx_frame(records: List[Dict[str, str]]) -> pd.DataFrame:
+        raw = pd.DataFrame(records)
+        raw["date"] = pd.to_datetime(raw["date"], format='%Y%m%d', errors='coerce')
+        raw["amount"] = _parse_amounts(raw["amount"])
+        return raw
+
+    # Normalization --------------------------------------------------------------------------------------
+    def _normalize(self, raw: pd.DataFrame) -> List[tuple]:
+        """Validate, drop credits, map categories and currencies; all column-wise"""
+        valid = raw["date"].notna() & raw["amount"].notna()
+        self.stats["skipped_invalid"] += int((~valid).sum())
+        raw = raw[valid]
+
+        expense = raw["amount"] > 0 if self.debits_positive else raw["amount"] < 0
+        self.stats["skipped_credits"] += int((~expense).sum())
+        raw = raw[expense]
+        if raw.empty:
+            return []
+
+        category = self._categories(raw)
+        currency = raw["currency"].astype(str).str.strip().str.upper()
+        currency = currency.where(currency.str.fullmatch(r'[A-Z]{3}'), self.default_currency)
+        dates, amounts = raw["date"].dt.strftime('%Y-%m-%d'), raw["amount"].abs().round(2).astype(float)
+        descriptions = raw["description"].astype(str).str.split().str.join(' ').str.lower()
+        rows = list(zip(dates, amounts, category, currency, self._fingerprints(dates, amounts, descriptions)))
+        self.stats["imported"] += len(rows)
+        return rows
+
+    def _fingerprints(self, dates: pd.Series, amounts: pd.Series, descriptions: pd.Series) -> List[str]:
+        """Identical rows within a file (two coffees on the same day) get different fingerprints, a re-import the same ones"""
+        fingerprints = []
+        for key in zip(dates, amounts, descriptions):
+            occurrence = self._occurrences[key]
+            self._occurrences[key] += 1
+            fingerprints.append(hashlib.sha1(f"{key[0]}|{key[1]:.2f}|{key[2]}|{occurrence}".encode('utf-8')).hexdigest())
+        return fingerprints
+
+    def _categories(self, raw: pd.DataFrame) -> np.ndarray:
+        """A known category from the file, else the first category whose keywords appear in the description, else the fallback"""
+        given = raw["category"].astype(str).str.strip().str.lower()
+        category = given.where(given.isin(self.categories), '')
+        # a bank's own category (e.g. "Groceries") is matched like the description
+        description = raw["description"].astype(str) + ' ' + raw["category"].astype(str)
+        for name, pattern in self.keyword_patterns:
+            unassigned = category == ''
+            if not unassigned.any():
+                break
+            category = category.mask(unassigned & description.str.contains(pattern, case=False, regex=True), name)
+        return category.mask(category == '', self.fallback_category).to_numpy()
+
+
+def import_statement(store: ExpenseStore, file_path: str, categories: List[str], default_currency: str = "USD",
+                     chunk_rows: int = DEFAULT_CHUNK_ROWS, debits_positive: bool = False) -> Dict[str, Any]:
+    """Import a statement file into the store in one transaction, returns the import stats"""
+    if not os.path.isfile(file_path):
+        raise FileNotFoundError(f"Statement file not found: {file_path}")
+    importer = StatementImporter(categories, default_currency, chunk_rows, debits_positive)
+    inserted = store.add_imported(importer.chunks(file_path))
+    importer.stats["skipped_duplicates"] = importer.stats["imported"] - inserted
+    importer.stats["imported"] = inserted
+    return importer.stats
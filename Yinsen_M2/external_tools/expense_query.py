@@ -0,0 +1,200 @@
+'''
+Declarative, vectorized queries over the typed expense frame (see expense_store.ExpenseFrameCache).
+
+A query spec is a small dict, e.g. "food spend per week in March 2025":
+
+    {
+        "filters": [{"field": "category", "op": "eq", "value": "food"},
+                    {"field": "date", "op": "between", "value": "01/03/2025", "value_to": "31/03/2025"}],
+        "group_by": ["week"],
+        "aggregations": ["sum", "count"],
+        "sort_by": "week", "sort_order": "asc", "limit": None
+    }
+
+Filters are combined with AND into one boolean mask, so every query is a single pass over the
+frame. Without group_by (and without aggregations) the matching expenses are returned.
+'''
+
+from datetime import datetime, date, timedelta
+from typing import Dict, List, Any, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from external_tools.expense_store import TOOL_DATE_FORMAT, EXPENSE_COLUMNS, frame_records
+
+FILTER_FIELDS = ("date", "amount", "category", "currency")
+FILTER_OPS = ("eq", "ne", "in", "gt", "gte", "lt", "lte", "between")
+GROUP_KEYS = ("day", "week", "month", "year", "weekday", "category", "currency")
+
+# aggregation -> (pandas function over amount, output column)
+AGGREGATIONS = {
+    "sum": ("sum", "total_amount"),
+    "count": ("count", "count"),
+    "mean": ("mean", "average_amount"),
+    "min": ("min", "min_amount"),
+    "max": ("max", "max_amount"),
+}
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+def _filter_value(field: str, value):
+    if field == "date":
+        return np.datetime64(datetime.strptime(str(value).strip(), TOOL_DATE_FORMAT).date())
+    if field == "amount":
+        return float(value)
+    return str(value).strip().lower()
+
+
+def _categorical_mask(column: pd.Series, op: str, wanted: List[str]) -> np.ndarray:
+    """Case-insensitive eq/ne/in on a categorical column, evaluated on the (few) categories and mapped through the codes"""
+    if op not in ("eq", "ne", "in"):
+        raise ValueError(f"Operator {op} is not supported for text fields")
+    category_match = np.append(np.isin(column.cat.categories.str.lower(), wanted), False)  # code -1 (missing) -> False
+    mask = category_match[column.cat.codes.to_numpy()]
+    return ~mask if op == "ne" else mask
+
+
+def _filter_mask(df: pd.DataFrame, expense_filter: Dict[str, Any]) -> np.ndarray:
+    if not isinstance(expense_filter, dict):
+        raise ValueError(f"A filter must be an object with field, op and value, got: {expense_filter}")
+    field, op = expense_filter.get("field"), expense_filter.get("op", "eq")
+    if field not in FILTER_FIELDS:
+        raise ValueError(f"Unknown filter field: {field}")
+    if op not in FILTER_OPS:
+        raise ValueError(f"Unknown filter operator: {op}")
+
+    if op == "in":
+        values = expense_filter.get("values") or []
+        wanted = [_filter_value(field, value) for value in values]
+    else:
+        if expense_filter.get("value") is None:
+            raise ValueError(f"Filter on {field} needs a value")
+        wanted = [_filter_value(field, expense_filter["value"])]
+
+    if field in ("category", "currency"):
+        return _categorical_mask(df[field], op, wanted)
+
+    column = df[field].to_numpy()
+    if field == "date":
+        # whole days: a date filter matches every expense on that day
+        column = column.astype('datetime64[D]')
+    if op == "eq":
+        return column == wanted[0]
+    if op == "ne":
+        return column != wanted[0]
+    if op == "in":
+        return np.isin(column, np.array(wanted, dtype=column.dtype))
+    if op == "gt":
+        return column > wanted[0]
+    if op == "gte":
+        return column >= wanted[0]
+    if op == "lt":
+        return column < wanted[0]
+    if op == "lte":
+        return column <= wanted[0]
+    if expense_filter.get("value_to") is None:
+        raise ValueError(f"Filter between on {field} needs value and value_to")
+    return (column >= wanted[0]) & (column <= _filter_value(field, expense_filter["value_to"]))
+
+
+def _group_key(df: pd.DataFrame, key: str) -> pd.Series:
+    """Sortable grouping column; formatted for display after aggregation"""
+    if key == "day":
+        return df["date"].dt.normalize()
+    if key == "week":
+        iso = df["date"].dt.isocalendar()
+        return iso["year"].astype(str) + "-W" + iso["week"].astype(str).str.zfill(2)
+    if key == "month":
+        return df["date"].dt.strftime('%Y-%m')
+    if key == "year":
+        return df["date"].dt.year
+    if key == "weekday":
+        return df["date"].dt.dayofweek
+    return df[key]
+
+
+def query_columns(spec: Dict[str, Any]) -> List[str]:
+    """Columns of the expense frame a query spec reads"""
+    if not spec.get("group_by") and not spec.get("aggregations"):
+        return list(EXPENSE_COLUMNS)
+    needed = {"amount"}
+    needed.update(expense_filter.get("field") for expense_filter in spec.get("filters") or [] if isinstance(expense_filter, dict))
+    needed.update("date" if key in ("day", "week", "month", "year", "weekday") else key for key in spec.get("group_by") or [])
+    return [column for column in EXPENSE_COLUMNS if column in needed]
+
+
+def query_date_bounds(spec: Dict[str, Any]) -> Tuple[Optional[date], Optional[date]]:
+    """(start, end) with start <= date < end implied by the date filters of a query spec, None where unbounded"""
+    start, end = None, None
+    for expense_filter in spec.get("filters") or []:
+        if not isinstance(expense_filter, dict) or expense_filter.get("field") != "date":
+            continue
+        op = expense_filter.get("op", "eq")
+        values = list(expense_filter.get("values") or []) if op == "in" else [expense_filter.get("value")]
+        if op == "between":
+            values.append(expense_filter.get("value_to"))
+        if not values or any(value is None for value in values):
+            continue  # reported by the filter itself
+        days = sorted(datetime.strptime(str(value).strip(), TOOL_DATE_FORMAT).date() for value in values)
+        lower = {"eq": days[0], "in": days[0], "between": days[0], "gte": days[0], "gt": days[0] + timedelta(days=1)}.get(op)
+        upper = {"eq": days[-1], "in": days[-1], "between": days[-1], "lte": days[-1], "lt": days[-1] - timedelta(days=1)}.get(op)
+        if lower is not None:
+            start = lower if start is None else max(start, lower)
+        if upper is not None:
+            upper += timedelta(days=1)
+            end = upper if end is None else min(end, upper)
+    return start, end
+
+
+def run_expense_query(df: pd.DataFrame, spec: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Run a query spec over a typed expense frame, returns records; raises ValueError for invalid specs"""
+    mask = np.ones(len(df), dtype=bool)
+    for expense_filter in spec.get("filters") or []:
+        mask &= _filter_mask(df, expense_filter)
+    selected = df[mask]
+    if selected.empty:
+        return []
+
+    group_by = list(spec.get("group_by") or [])
+    aggregations = list(spec.get("aggregations") or [])
+    unknown = [key for key in group_by if key not in GROUP_KEYS] + [agg for agg in aggregations if agg not in AGGREGATIONS]
+    if unknown:
+        raise ValueError(f"Unknown group_by keys or aggregations: {unknown}")
+
+    if not group_by and not aggregations:
+        result = selected[EXPENSE_COLUMNS]
+        default_sort = "date"
+    else:
+        aggregations = aggregations or ["sum", "count"]
+        named = {AGGREGATIONS[agg][1]: ("amount", AGGREGATIONS[agg][0]) for agg in aggregations}
+        if group_by:
+            keys = [_group_key(selected, key).rename(key) for key in group_by]
+            result = selected.groupby(keys, observed=True, sort=True).agg(**named).reset_index()
+        else:
+            result = pd.DataFrame([{column: selected["amount"].agg(function) for column, (_, function) in named.items()}])
+        default_sort = group_by[0] if group_by else None
+
+    sort_by = spec.get("sort_by") or default_sort
+    if sort_by is not None:
+        if sort_by not in result.columns:
+            raise ValueError(f"Cannot sort by {sort_by}, columns are: {list(result.columns)}")
+        result = result.sort_values(by=sort_by, ascending=spec.get("sort_order", "asc") != "desc", kind="stable")
+    if spec.get("limit"):
+        result = result.head(int(spec["limit"]))
+
+    if not group_by and not aggregations:
+        return frame_records(result)
+    # display formats of the group keys
+    if "day" in result.columns:
+        result["day"] = result["day"].dt.strftime(TOOL_DATE_FORMAT)
+    if "weekday" in result.columns:
+        result["weekday"] = [WEEKDAYS[day] for day in result["weekday"]]
+    for column in ("category", "currency"):
+        if column in result.columns:
+            result[column] = result[column].astype(object)
+    for column in ("total_amount", "average_amount", "min_amount", "max_amount"):
+        if column in result.columns:
+            result[column] = result[column].round(2)
+    return result.to_dict('records')
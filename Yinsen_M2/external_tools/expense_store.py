@@ -0,0 +1,291 @@
+import logging
+import csv
+import os
+import sqlite3
+import threading
+from datetime import datetime, date
+from typing import Dict, List, Any, Iterable, Optional
+
+import pandas as pd
+
+# Dates are stored as ISO YYYY-MM-DD, so date ranges are index range scans; the tools use DD/MM/YYYY
+TOOL_DATE_FORMAT = '%d/%m/%Y'
+
+# Columns of an expense record, in the order of the old expense_log.csv
+EXPENSE_COLUMNS = ["date", "amount", "category", "currency"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS expenses (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    date TEXT NOT NULL,
+    amount REAL NOT NULL,
+    category TEXT NOT NULL,
+    currency TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses (date);
+CREATE INDEX IF NOT EXISTS idx_expenses_category ON expenses (category COLLATE NOCASE, date);
+CREATE INDEX IF NOT EXISTS idx_expenses_currency ON expenses (currency, date);
+CREATE TABLE IF NOT EXISTS expense_rollups (
+    period TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    total REAL NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (period, bucket)
+);
+CREATE TABLE IF NOT EXISTS imported_rows (
+    fingerprint TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+# Rollup periods and the bucket of an expense in each of them
+ROLLUP_PERIODS = ("day", "week", "month", "year", "category")
+
+
+def rollup_buckets(iso_date: str, category: str) -> Dict[str, str]:
+    """Bucket keys of an expense: YYYY-MM-DD, ISO YYYY-Www, YYYY-MM, YYYY and the category"""
+    iso_year, iso_week, _ = date.fromisoformat(iso_date).isocalendar()
+    return {"day": iso_date, "week": f"{iso_year}-W{iso_week:02d}", "month": iso_date[:7],
+            "year": iso_date[:4], "category": category}
+
+
+def to_iso_date(value: str) -> str:
+    """DD/MM/YYYY -> YYYY-MM-DD"""
+    return datetime.strptime(value.strip(), TOOL_DATE_FORMAT).strftime('%Y-%m-%d')
+
+
+def _tool_date(iso_value: str) -> str:
+    return f"{iso_value[8:10]}/{iso_value[5:7]}/{iso_value[0:4]}"
+
+
+class ExpenseStore:
+    """
+    Expense log in an embedded SQLite database (WAL mode), indexed by date, category and currency.
+
+    Logging an expense is a single indexed insert, and filtered views are index scans instead
+    of reading, parsing and sorting the whole CSV. On first use, an existing expense_log.csv
+    is imported once; the CSV file itself is left untouched.
+
+    Totals and counts per day, ISO week, month, year and category are kept in the
+    expense_rollups table, updated in the same transaction as every insert, so summary
+    views read one row per bucket instead of aggregating every expense.
+    """
+
+    def __init__(self, db_path: str, legacy_csv_path: Optional[str] = None):
+        self.logger = logging.getLogger(__name__)
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+
+        self._lock = threading.Lock()
+        self.write_generation = 0  # bumped on every write through this store
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._lock, self._conn:
+            self._conn.executescript(SCHEMA)
+        self._ensure_rollups()
+
+        if legacy_csv_path:
+            self._migrate_csv(legacy_csv_path)
+
+    # Migration ------------------------------------------------------------------------------------------
+    def _migrate_csv(self, csv_path: str):
+        with self._lock:
+            done = self._conn.execute("SELECT value FROM meta WHERE key = 'csv_migrated'").fetchone()
+        if done or not os.path.exists(csv_path):
+            return
+        with open(csv_path, 'r', newline='', encoding='utf-8') as f:
+            rows = [(to_iso_date(row['date']), float(row['amount']), row['category'], row['currency'])
+                    for row in csv.DictReader(f) if row.get('date')]
+        # date order first, the order the CSV was kept in
+        rows.sort(key=lambda row: row[0])
+        with self._lock, self._conn:
+            self._insert(rows)
+            self._conn.execute("INSERT INTO meta (key, value) VALUES ('csv_migrated', ?)", (csv_path,))
+        self.logger.info(f"Migrated {len(rows)} expenses from {csv_path} to {self.db_path}")
+
+    def _ensure_rollups(self):
+        """Build the rollups from the stored expenses once (e.g. for a database from before the rollups)"""
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM meta WHERE key = 'rollups_built'").fetchone():
+                return
+            rows = self._conn.execute("SELECT date, amount, category FROM expenses").fetchall()
+            with self._conn:
+                self._conn.execute("DELETE FROM expense_rollups")
+                self._update_rollups([(row['date'], row['amount'], row['category']) for row in rows])
+                self._conn.execute("INSERT INTO meta (key, value) VALUES ('rollups_built', '1')")
+
+    # Writes ---------------------------------------------------------------------------------------------
+    def add(self, expense_date: str, amount: float, category: str, currency: str) -> int:
+        """Log one expense (date DD/MM/YYYY), returns its id"""
+        with self._lock, self._conn:
+            return self._insert([(to_iso_date(expense_date), float(amount), category, currency)])
+
+    def add_many(self, chunks: Iterable[List[tuple]]) -> int:
+        """Insert chunks of (iso date, amount, category, currency) rows in one transaction, returns the number inserted"""
+        count = 0
+        with self._lock, self._conn:
+            for rows in chunks:
+                self._insert(rows)
+                count += len(rows)
+        return count
+
+    def add_imported(self, chunks: Iterable[List[tuple]]) -> int:
+        """
+        Like add_many for statement rows (iso date, amount, category, currency, fingerprint): rows whose
+        fingerprint was imported before are skipped. Returns the number inserted.
+        """
+        count = 0
+        with self._lock, self._conn:
+            for rows in chunks:
+                new_rows = [row[:4] for row in rows
+                            if self._conn.execute("INSERT OR IGNORE INTO imported_rows (fingerprint) VALUES (?)",
+                                                  (row[4],)).rowcount]
+                if new_rows:
+                    self._insert(new_rows)
+                    count += len(new_rows)
+        return count
+
+    def signature(self) -> tuple:
+        """Changes whenever the expenses may have changed: internal writes, or the database or its WAL file changing on disk"""
+        files = []
+        for path in (self.db_path, self.db_path + '-wal'):
+            try:
+                stat = os.stat(path)
+                files.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                files.append(None)
+        return (self.write_generation, *files)
+
+    def _insert(self, rows: List[tuple]) -> int:
+        """Insert (iso date, amount, category, currency) rows and update the rollups, returns the last id; call inside a transaction"""
+        self._conn.executemany("INSERT INTO expenses (date, amount, category, currency) VALUES (?, ?, ?, ?)", rows)
+        self._update_rollups([(row[0], row[1], row[2]) for row in rows])
+        self.write_generation += 1
+        return self._conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+
+    def _update_rollups(self, rows: List[tuple]):
+        deltas = {}  # (period, bucket) -> [total, count]
+        for iso_date, amount, category in rows:
+            for period, bucket in rollup_buckets(iso_date, category).items():
+                delta = deltas.setdefault((period, bucket), [0.0, 0])
+                delta[0] += amount
+                delta[1] += 1
+        self._conn.executemany(
+            "INSERT INTO expense_rollups (period, bucket, total, count) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(period, bucket) DO UPDATE SET total = total + excluded.total, count = count + excluded.count",
+            [(period, bucket, total, count) for (period, bucket), (total, count) in deltas.items()])
+
+    # Reads ----------------------------------------------------------------------------------------------
+    def _records(self, where: str = "", params: Iterable = (), order: str = "date, id", limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        query = f"SELECT date, amount, category, currency FROM expenses {where} ORDER BY {order}"
+        params = list(params)
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [{"date": _tool_date(row['date']), "amount": row['amount'],
+                 "category": row['category'], "currency": row['currency']} for row in rows]
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT NOT EXISTS (SELECT 1 FROM expenses)").fetchone()[0] == 1
+
+    def all(self) -> List[Dict[str, Any]]:
+        return self._records()
+
+    def last_n(self, n: int) -> List[Dict[str, Any]]:
+        return self._records(order="date DESC, id DESC", limit=n)
+
+    def by_category(self, category: str) -> List[Dict[str, Any]]:
+        return self._records("WHERE category = ? COLLATE NOCASE", (category,))
+
+    def between(self, start: date, end: date) -> List[Dict[str, Any]]:
+        """Expenses with start <= date < end"""
+        return self._records("WHERE date >= ? AND date < ?", (start.isoformat(), end.isoformat()))
+
+    def rollup(self, period: str) -> List[Dict[str, Any]]:
+        """[{'bucket', 'total_amount', 'count'}] of a rollup period, by bucket"""
+        if period not in ROLLUP_PERIODS:
+            raise ValueError(f"Unknown rollup period: {period}")
+        with self._lock:
+            rows = self._conn.execute("SELECT bucket, total, count FROM expense_rollups WHERE period = ? ORDER BY bucket",
+                                      (period,)).fetchall()
+        # running sums pick up float noise, amounts are money
+        return [{"bucket": row['bucket'], "total_amount": round(row['total'], 2), "count": row['count']} for row in rows]
+
+    def typed_frame(self, start: Optional[date] = None, end: Optional[date] = None,
+                    columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Expenses (all, or with start <= date < end) by date with a datetime64 date column and
+        categorical category/currency columns; columns selects a subset of EXPENSE_COLUMNS
+        """
+        columns = [column for column in EXPENSE_COLUMNS if columns is None or column in columns]
+        conditions, params = [], []
+        if start is not None:
+            conditions.append("date >= ?")
+            params.append(start.isoformat())
+        if end is not None:
+            conditions.append("date < ?")
+            params.append(end.isoformat())
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._lock:
+            df = pd.read_sql_query(f"SELECT {', '.join(columns)} FROM expenses {where} ORDER BY date, id",
+                                   self._conn, params=params)
+        if 'date' in df:
+            # nanoseconds, as ExpenseArchive returns them (pandas 3 would parse the strings to microseconds)
+            df['date'] = pd.to_datetime(df['date'], format='%Y-%m-%d').astype('datetime64[ns]')
+        if 'amount' in df:
+            df['amount'] = df['amount'].astype('float64')
+        for column in ('category', 'currency'):
+            if column in df:
+                df[column] = df[column].astype('category')
+        return df
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def frame_records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Records of a typed expense frame in the tool format (dates as DD/MM/YYYY)"""
+    records = df.astype({'category': 'object', 'currency': 'object'})
+    records['date'] = records['date'].dt.strftime(TOOL_DATE_FORMAT)
+    return records[EXPENSE_COLUMNS].to_dict('records')
+
+
+class ExpenseFrameCache:
+    """
+    Process-wide typed expense DataFrame (see ExpenseStore.typed_frame).
+
+    The frame is reloaded only when the store's signature changes, i.e. after a write through
+    the store or when the database files change on disk, so back-to-back finance queries
+    share one parsed frame. Callers must treat the returned frame as read-only.
+    """
+
+    def __init__(self, store: ExpenseStore):
+        self.logger = logging.getLogger(__name__)
+        self.store = store
+        self._frame = None
+        self._signature = None
+        self._lock = threading.Lock()
+
+    def get(self) -> pd.DataFrame:
+        with self._lock:
+            signature = self.store.signature()
+            if self._frame is None or signature != self._signature:
+                self._frame = self.store.typed_frame()
+                # the signature from before the load: a write during the load forces another one
+                self._signature = signature
+                self.logger.debug(f"Loaded expense frame with {len(self._frame)} rows")
+            return self._frame
+
+    def invalidate(self):
+        with self._lock:
+            self._frame = None
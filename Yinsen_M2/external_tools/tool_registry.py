@@ -0,0 +1,188 @@
+import logging
+import json
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Tuple
+from core_engines.utils.utils import get_formatted_datetime
+
+# tool -> action -> parameter -> (type, required)
+# Types: string, number, integer, boolean, list (JSON array), date (DD/MM/YYYY), datetime (DD/MM/YYYY HH:MM)
+TOOL_ACTIONS = {
+    "calendar": {
+        "create": {
+            "start_time": ("datetime", True),
+            "end_time": ("datetime", False),
+            "duration": ("string", False),
+            "description": ("string", True),
+            "participant": ("string", False),
+            "location": ("string", False),
+            "allow_conflicts": ("boolean", False),
+        },
+        "view": {
+            "date": ("date", True),
+        },
+        "check_availability": {
+            "start_time": ("datetime", True),
+            "end_time": ("datetime", False),
+            "duration": ("string", False),
+        },
+    },
+    "email": {
+        "send": {
+            "to": ("string", True),
+            "from": ("string", True),
+            "subject": ("string", False),
+            "content": ("string", True),
+        },
+        "read": {
+            "last_n_emails": ("integer", False),
+            "since_date": ("date", False),
+            "until_date": ("date", False),
+            "query": ("string", False),
+        },
+    },
+    "expense_manager": {
+        "log_expense": {
+            "amount": ("number", True),
+            "currency": ("string", False),
+            "category": ("string", True),
+            "date": ("date", False),
+        },
+        "view_all_expenses": {},
+        "view_last_N_expenses": {
+            "N": ("integer", True),
+        },
+        "view_expenses_by_category": {
+            "category": ("string", True),
+        },
+        "view_expenses_category_wise": {},
+        "view_expenses_by_date": {
+            "date": ("date", True),
+        },
+        "view_daywise_expenses": {},
+        "view_weekwise_expenses": {},
+        "view_expenses_by_week": {
+            "week": ("integer", True),
+            "year": ("integer", True),
+        },
+        "view_monthwise_expenses": {},
+        "view_expenses_by_month": {
+            "month": ("integer", True),
+            "year": ("integer", True),
+        },
+        "view_yearwise_expenses": {},
+        "view_expenses_by_year": {
+            "year": ("integer", True),
+        },
+        "import_expenses": {
+            "file_path": ("string", True),
+            "currency": ("string", False),
+            "debits_positive": ("boolean", False),
+        },
+        "query_expenses": {
+            "filters": ("list", False),
+            "group_by": ("list", False),
+            "aggregations": ("list", False),
+            "sort_by": ("string", False),
+            "sort_order": ("string", False),
+            "limit": ("integer", False),
+        },
+    },
+}
+
+# Values filled in for missing optional parameters that the toolbox still reads
+ACTION_DEFAULTS = {
+    ("expense_manager", "log_expense"): {
+        "currency": lambda: "USD",
+        "date": lambda: get_formatted_datetime(date_only=True),
+    },
+}
+
+DATE_FORMATS = {
+    "date": "%d/%m/%Y",
+    "datetime": "%d/%m/%Y %H:%M",
+}
+
+
+class ToolRegistry:
+    """
+    Typed registry of the toolbox actions.
+
+    Validates tool calls emitted directly by main agents ([tool_call] field) against the
+    declared parameters, so valid calls can go straight to Toolbox.execute_tool without a
+    tool_handler_agent round trip. Invalid calls are rejected with the list of problems,
+    and the caller falls back to the tool handler agent.
+    """
+
+    def __init__(self, tool_actions: Dict[str, Dict[str, Dict[str, Tuple[str, bool]]]] = None):
+        self.logger = logging.getLogger(__name__)
+        self.tool_actions = tool_actions or TOOL_ACTIONS
+
+    def validate(self, tool_call) -> Tuple[Optional[Dict[str, Any]], List[str]]:
+        """
+        Validate a tool call (dict or JSON string) of the form {"tool": ..., "instructions": {"action": ..., ...}}.
+        Returns the normalized tool call (values coerced to their declared types, defaults filled in,
+        unknown and empty optional parameters dropped) and an empty error list, or None and the errors.
+        """
+        if isinstance(tool_call, str):
+            try:
+                tool_call = json.loads(tool_call)
+            except json.JSONDecodeError as e:
+                return None, [f"tool call is not valid JSON: {e}"]
+        if not isinstance(tool_call, dict):
+            return None, ["tool call must be a JSON object"]
+
+        tool = tool_call.get("tool")
+        if tool not in self.tool_actions:
+            return None, [f"unknown tool: {tool}"]
+        instructions = tool_call.get("instructions")
+        if not isinstance(instructions, dict):
+            return None, ["instructions must be a JSON object"]
+        action = instructions.get("action")
+        if action not in self.tool_actions[tool]:
+            return None, [f"unknown action for {tool}: {action}"]
+
+        errors = []
+        normalized = {"action": action}
+        defaults = ACTION_DEFAULTS.get((tool, action), {})
+        for name, (param_type, required) in self.tool_actions[tool][action].items():
+            value = instructions.get(name)
+            if (value is None or value == "") and name in defaults:
+                value = defaults[name]()
+            if value is None or value == "":
+                if required:
+                    errors.append(f"missing required parameter: {name}")
+                continue
+            try:
+                normalized[name] = self._coerce(value, param_type)
+            except (TypeError, ValueError):
+                errors.append(f"invalid {param_type} for {name}: {value!r}")
+
+        if errors:
+            return None, errors
+        return {"tool": tool, "instructions": normalized}, []
+
+    def _coerce(self, value, param_type: str):
+        if param_type == "number":
+            if isinstance(value, bool):
+                raise TypeError(value)
+            return float(value) if not isinstance(value, int) else value
+        if param_type == "list":
+            if isinstance(value, str):
+                value = json.loads(value)
+            if not isinstance(value, list):
+                raise TypeError(value)
+            return value
+        if param_type == "boolean":
+            if isinstance(value, str) and value.strip().lower() in ("true", "false"):
+                return value.strip().lower() == "true"
+            if not isinstance(value, bool):
+                raise TypeError(value)
+            return value
+        if param_type == "integer":
+            if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+                raise TypeError(value)
+            return int(value)
+        value = str(value).strip()
+        if param_type in DATE_FORMATS:
+            datetime.strptime(value, DATE_FORMATS[param_type])
+        return value
@@ -1,34 +1,174 @@
 from aipolabs import ACI
 from aipolabs.types.functions import FunctionDefinitionFormat
-from openai import OpenAI
 import os
 import json
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, date, timedelta
 import matplotlib.pyplot as plt
 import plotly.express as px
 import plotly.io as pio
 from external_tools.utils import update_calender_logs, update_notification_logs
 from core_engines.utils.utils import get_formatted_datetime
+from core_engines.utils.clients import get_openai_client
+from external_tools.aci_builders import ACI_ARGUMENT_BUILDERS, matches_definition
+from external_tools.aci_definitions import AciDefinitionCache
+from external_tools.email_reader import EmailReader
+from external_tools.email_store import EmailStore
+from external_tools.calendar_mirror import CalendarMirror
+from external_tools.expense_store import ExpenseStore, ExpenseFrameCache, frame_records
+from external_tools.expense_query import run_expense_query, query_columns, query_date_bounds
+from external_tools.expense_archive import ExpenseArchive
+from external_tools.expense_import import import_statement, load_expense_categories, DEFAULT_CHUNK_ROWS
+from external_tools.tool_registry import TOOL_ACTIONS
+
+# ACI functions used by the toolbox, their definitions are preloaded at startup
+ACI_FUNCTION_NAMES = [
+    "GOOGLE_CALENDAR__EVENTS_INSERT",
+    "GOOGLE_CALENDAR__EVENTS_LIST",
+    "GMAIL__SEND_EMAIL",
+    "GMAIL__MESSAGES_LIST",
+    "GMAIL__MESSAGES_GET",
+]
 
 class Toolbox:
     def __init__(self, config):
         self.aci = ACI()
-        self.openai = OpenAI()
+        self.openai = get_openai_client()
+
+        # ACI function definitions, cached in memory and on disk
+        aci_config = config.get('tools', {}).get('aci', {})
+        self.aci_definitions = AciDefinitionCache(self.aci,
+                                                  cache_path=aci_config.get('definition_cache_path', 'data/cache/aci_definitions.json'),
+                                                  ttl_seconds=aci_config.get('definition_ttl_seconds', 7 * 24 * 3600))
+        if aci_config.get('preload_definitions', True):
+            self.aci_definitions.preload(ACI_FUNCTION_NAMES)
 
         self.LINKED_ACCOUNT_OWNER_ID = os.getenv("LINKED_ACCOUNT_OWNER_ID", "")
 
+        # batched Gmail reads, MESSAGES_GET calls run on a bounded thread pool
+        # fetched messages and their summaries are kept in a local store, so each message is fetched and summarized once
+        email_config = config.get('tools', {}).get('email', {})
+        self.email_summary_model = email_config.get('summary_model', 'gpt-4o-mini')
+        self.email_store = EmailStore(email_config.get('store_path', 'data/email/emails.db'))
+        self.email_reader = EmailReader(self.aci, self.LINKED_ACCOUNT_OWNER_ID,
+                                        max_workers=email_config.get('read_workers', 8),
+                                        store=self.email_store,
+                                        summarizer=self._summarize_email if email_config.get('summarize', True) else None)
+
+        # local calendar mirror, synced incrementally, answers views and availability checks
+        calendar_config = config.get('tools', {}).get('calendar', {})
+        self.calendar_mirror = None
+        if calendar_config.get('mirror_enabled', True):
+            self.calendar_mirror = CalendarMirror(self.aci, self.LINKED_ACCOUNT_OWNER_ID,
+                                                  mirror_path=calendar_config.get('mirror_path', 'data/calendar/mirror.json'),
+                                                  max_staleness_seconds=calendar_config.get('max_staleness_seconds', 300))
+            if calendar_config.get('sync_interval_seconds'):
+                self.calendar_mirror.start_periodic_sync(calendar_config['sync_interval_seconds'])
+
+        # expense log in SQLite; an old expense_log.csv is imported once
+        finance_config = config.get('tools', {}).get('expense_manager', {})
+        self.expense_store = ExpenseStore(finance_config.get('database_path', 'data/finance/expenses.db'),
+                                          legacy_csv_path=finance_config.get('legacy_csv_path', './data/finance/expense_log.csv'))
+        # typed DataFrame of all expenses, parsed once and reused until the store changes
+        self.expense_frame = ExpenseFrameCache(self.expense_store)
+        # closed months compacted into memory-mapped column files, queries read only the months and columns they need
+        self.expense_categories_path = finance_config.get('categories_path', 'config/finance_expense_categories.txt')
+        self.expense_import_chunk_rows = finance_config.get('import_chunk_rows', DEFAULT_CHUNK_ROWS)
+        self.expense_archive = None
+        if finance_config.get('archive_enabled', True):
+            self.expense_archive = ExpenseArchive(self.expense_store, finance_config.get('archive_path', 'data/finance/archive'))
+
         self.calender_logs_path = config['calender_and_logs']['calender_logs_path']
         self.notification_logs_path = config['calender_and_logs']['notification_logs_path']
 
+    def _execute_aci_function(self, function_name: str, instructions: dict, llm_messages: list):
+        """
+        Execute an ACI function. The arguments are built deterministically from the tool
+        instructions when possible; o3-mini builds them only if that fails before anything
+        is executed. A call that was executed is never repeated (it may have sent an email
+        or created an event), its failure is returned as it is.
+        """
+        function_definition = self.aci_definitions.get(function_name)
+
+        arguments = self._build_aci_arguments(function_name, instructions, function_definition)
+        if arguments is not None:
+            print(f"DEBUG: Built arguments inside toolbox.py: {arguments}")
+            result = self.aci.functions.execute(
+                function_name,
+                arguments,
+                linked_account_owner_id=self.LINKED_ACCOUNT_OWNER_ID,
+            )
+            if not result.success:
+                print(f"DEBUG: {function_name} failed with built arguments: {result.error}")
+            return result
+
+        response = self.openai.chat.completions.create(model="o3-mini",
+                                                       messages=llm_messages,
+                                                       tools=[function_definition],
+                                                       tool_choice="required",  # force the model to generate a tool call for demo purposes
+                                                       )
+        tool_call = (
+            response.choices[0].message.tool_calls[0]
+            if response.choices[0].message.tool_calls
+            else None
+        )
+        print(f"DEBUG: Tool call inside toolbox.py: {tool_call}")
+        return self.aci.functions.execute(
+            function_name,
+            json.loads(tool_call.function.arguments),
+            linked_account_owner_id=self.LINKED_ACCOUNT_OWNER_ID,
+        )
+
+    def _build_aci_arguments(self, function_name: str, instructions: dict, function_definition: dict):
+        """Deterministic ACI arguments, or None if there is no builder or they don't fit the definition"""
+        builder = ACI_ARGUMENT_BUILDERS.get(function_name)
+        if builder is None:
+            return None
+        try:
+            arguments = builder(instructions)
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"DEBUG: Could not build {function_name} arguments: {e}")
+            return None
+        if not matches_definition(function_definition, arguments):
+            print(f"DEBUG: Built {function_name} arguments do not match the function definition")
+            return None
+        return arguments
+
+    def _summarize_email(self, email: dict) -> str:
+        """One or two sentence summary of a stored email"""
+        response = self.openai.chat.completions.create(
+            model=self.email_summary_model,
+            messages=[
+                {"role": "system", "content": "Summarize the email below in one or two short sentences for its recipient. \
+                    Mention any request, deadline or action item. Return only the summary."},
+                {"role": "user", "content": f"From: {email['sender']}\nSubject: {email['subject']}\n\n{(email['body'] or email['snippet'])[:4000]}"},
+            ],
+            max_tokens=120,
+            temperature=0.2
+        )
+        return response.choices[0].message.content.strip()
+
     def execute_tool(self, tool_response_dict: dict) -> dict:
         
+        # actions outside the registry have no handler below, report them instead of returning None
+        tool = tool_response_dict.get("tool")
+        action = (tool_response_dict.get("instructions") or {}).get("action")
+        if action not in TOOL_ACTIONS.get(tool, {}):
+            return {'status': 'error', 'message': f'Unknown tool or action: {tool} / {action}'}
+
         if tool_response_dict["tool"] == "calendar":
             if tool_response_dict['instructions']["action"] == "create":
+                # check the known events for overlaps before creating anything
+                if self.calendar_mirror is not None:
+                    conflicts = self.calendar_mirror.check_new_event(tool_response_dict['instructions'])
+                    if conflicts is not None:
+                        return conflicts
+
                 # use calender api to create a new event
-                function_definition = self.aci.functions.get_definition("GOOGLE_CALENDAR__EVENTS_INSERT")
-                response = self.openai.chat.completions.create(model="o3-mini",
-                                                               messages=[
+                # arguments are built in Python; o3-mini is only asked if that fails
+                result = self._execute_aci_function("GOOGLE_CALENDAR__EVENTS_INSERT",
+                                                    tool_response_dict['instructions'],
+                                                    llm_messages=[
                                                                     {
                                                                         "role": "system",
                                                                         "content": "You are a helpful assistant that can use the calender tool to create a new event. \
@@ -50,27 +190,14 @@ class Toolbox:
                                                                         "role": "user",
                                                                         "content": f"use the calender tool to schedule an event using the following information: {tool_response_dict['instructions']}",
                                                                     },
-                                                                ],
-                                                                tools=[function_definition],
-                                                                tool_choice="required",  # force the model to generate a tool call for demo purposes
-                                                                )
-                #print(f"DEBUG: Response inside toolbox.py: {response}")
-                tool_call = (
-                    response.choices[0].message.tool_calls[0]
-                    if response.choices[0].message.tool_calls
-                    else None
-                )
-                print(f"DEBUG: Tool call inside toolbox.py: {tool_call}")
-                result = self.aci.functions.execute(
-                    "GOOGLE_CALENDAR__EVENTS_INSERT",
-                    json.loads(tool_call.function.arguments),
-                    linked_account_owner_id=self.LINKED_ACCOUNT_OWNER_ID,
-                )
+                                                    ])
                 #print(f"DEBUG: Tool execution result inside toolbox.py: {result}")
                 #print(result.success, result.data['summary'], tool_response_dict['instructions']['start_time'])
                 
                 # Update calender logs if the event is created successfully for TODAY
                 if result.success:
+                    if self.calendar_mirror is not None:
+                        self.calendar_mirror.add_event(result.data)
                     if get_formatted_datetime(date_only=True) == tool_response_dict['instructions']['start_time'].split(' ')[0]:
                         update_calender_logs(tool_response_dict['instructions']['start_time'].split(' ')[1], \
                                              result.data['summary'], \
@@ -84,9 +211,16 @@ class Toolbox:
                 return result
 
             elif tool_response_dict['instructions']["action"] == "view":
-                function_definition = self.aci.functions.get_definition("GOOGLE_CALENDAR__EVENTS_LIST")
-                response = self.openai.chat.completions.create(model="o3-mini",
-                                                               messages=[
+                # answered from the local mirror; the live API is only used if there is no mirror
+                if self.calendar_mirror is not None:
+                    result = self.calendar_mirror.view(tool_response_dict['instructions'])
+                    if result is not None:
+                        return result
+
+                # arguments are built in Python; o3-mini is only asked if that fails
+                result = self._execute_aci_function("GOOGLE_CALENDAR__EVENTS_LIST",
+                                                    tool_response_dict['instructions'],
+                                                    llm_messages=[
                                                                     {
                                                                         "role": "system",
                                                                         "content": "You are a helpful assistant that can use the calender tool to fetch events from the user's calendar. \
@@ -105,33 +239,26 @@ class Toolbox:
                                                                         "role": "user",
                                                                         "content": f"use the calender tool to fetch events from the user's calendar using the following information: {tool_response_dict['instructions']}",
                                                                     },
-                                                                ],
-                                                                tools=[function_definition],
-                                                                tool_choice="required",  # force the model to generate a tool call for demo purposes
-                                                                )
-                #print(f"DEBUG: Response inside toolbox.py: {response}")
-                tool_call = (
-                    response.choices[0].message.tool_calls[0]
-                    if response.choices[0].message.tool_calls
-                    else None
-                )
-                print(f"DEBUG: Tool call inside toolbox.py: {tool_call}")
-                result = self.aci.functions.execute(
-                    "GOOGLE_CALENDAR__EVENTS_LIST",
-                    json.loads(tool_call.function.arguments),
-                    linked_account_owner_id=self.LINKED_ACCOUNT_OWNER_ID,
-                )
+                                                    ])
                 #print(f"DEBUG: Tool execution result inside toolbox.py: {result}")
                 return result
+
+            elif tool_response_dict['instructions']["action"] == "check_availability":
+                result = self.calendar_mirror.check_availability(tool_response_dict['instructions']) \
+                    if self.calendar_mirror is not None else None
+                if result is None:
+                    return {'status': 'error', 'message': 'Calendar is not available right now'}
+                return result
         
         elif tool_response_dict["tool"] == "email":
 
             if tool_response_dict['instructions']["action"] == "send":
 
                 # use email api to send an email
-                function_definition = self.aci.functions.get_definition("GMAIL__SEND_EMAIL")
-                response = self.openai.chat.completions.create(model="o3-mini",
-                                                               messages=[
+                # arguments are built in Python; o3-mini is only asked if that fails
+                result = self._execute_aci_function("GMAIL__SEND_EMAIL",
+                                                    tool_response_dict['instructions'],
+                                                    llm_messages=[
                                                                     {
                                                                         "role": "system",
                                                                         "content": "You are a helpful assistant that can use gmail send email function to send an email on behalf of the user. \
@@ -151,22 +278,7 @@ class Toolbox:
                                                                         "role": "user",
                                                                         "content": f"use the email tool to send an email using the following information: {tool_response_dict['instructions']}",
                                                                     },
-                                                                ],
-                                                                tools=[function_definition],
-                                                                tool_choice="required",  # force the model to generate a tool call for demo purposes
-                                                                )
-                #print(f"DEBUG: Response inside toolbox.py: {response}")
-                tool_call = (
-                    response.choices[0].message.tool_calls[0]
-                    if response.choices[0].message.tool_calls
-                    else None
-                )
-                print(f"DEBUG: Tool call inside toolbox.py: {tool_call}")
-                result = self.aci.functions.execute(
-                    "GMAIL__SEND_EMAIL",
-                    json.loads(tool_call.function.arguments),
-                    linked_account_owner_id=self.LINKED_ACCOUNT_OWNER_ID,
-                )
+                                                    ])
                 print(f"DEBUG: Tool execution result inside toolbox.py: {result}")
                 
                 #Update notification logs if the email is sent successfully for TODAY
@@ -176,135 +288,24 @@ class Toolbox:
                                             )
                 
                 return result
-            '''
             elif tool_response_dict['instructions']["action"] == "read":
-                # use email api to read emails
-                # 1. retrieve list of emails - in the form of IDs
-                function_definition = self.aci.functions.get_definition("GMAIL__MESSAGES_LIST")
-                print(f"DEBUG: Email view i inside toolbox.py: {tool_response_dict['instructions']}")
-                response = self.openai.chat.completions.create(model="o3-mini",
-                                                               messages=[
-                                                                    {
-                                                                        "role": "system",
-                                                                        "content": "You are a helpful assistant that can use gmail message list function to view emails on behalf of the user. \
-                                                                            You will be given a set of instructions regarding how to view the emails, in the form of a JSON. \
-                                                                            The JSON can either be like:\
-                                                                                { \
-                                                                            'action': 'read', \
-                                                                            'until_date': '29/03/2025' \
-                                                                                }. \
-                                                                            or like:\
-                                                                                { \
-                                                                            'action': 'read', \
-                                                                            'last_n_emails': 10 \
-                                                                                }. \
-                                                                            Use this information to view the emails. \
-                                                                            Follow the function definition and the tool call format to view the emails. \
-                                                                            Any provided date format is DD/MM/YYYY."
-                                                                    },
-                                                                    {
-                                                                        "role": "user",
-                                                                        "content": f"use the email tool to view emails using the following information: {tool_response_dict['instructions']}",
-                                                                    },
-                                                                ],
-                                                                tools=[function_definition],
-                                                                tool_choice="required",  # force the model to generate a tool call for demo purposes
-                                                                )
-                #print(f"DEBUG: Response inside toolbox.py: {response}")
-                tool_call = (
-                    response.choices[0].message.tool_calls[0]
-                    if response.choices[0].message.tool_calls
-                    else None
-                )
-                print(f"DEBUG: Tool call inside toolbox.py: {tool_call}")
-                result = self.aci.functions.execute(
-                    "GMAIL__MESSAGES_LIST",
-                    json.loads(tool_call.function.arguments),
-                    linked_account_owner_id=self.LINKED_ACCOUNT_OWNER_ID,
-                )
-                print(f"DEBUG: Tool execution result inside toolbox.py: {result}")
-
-                # here we get a list of email IDs like the following:
-
-                #DEBUG: Tool execution result inside toolbox.py: success=True data={'messages': [{'id': '1960dfae71df3aa5', 'threadId': '1960dfae71df3aa5'}, {'id': '1960ddb5bf95d60e', 'threadId': '1960ddb5bf95d60e'}, {'id': '1960dcb8b8996882', 'threadId': '1960dcb8b8996882'}, {'id': '1960da14f79ddfbf', 'threadId': '1960da14f79ddfbf'}, {'id': '1960cc30a2a03694', 'threadId': '1960cc238ce2fa68'}, {'id': '1960cc238ce2fa68', 'threadId': '1960cc238ce2fa68'}, {'id': '19603f4130e0009c', 'threadId': '19603f4130e0009c'}, {'id': '19601a8d15b3ec9b', 'threadId': '19601a8d15b3ec9b'}, {'id': '196006191c98762f', 'threadId': '196006191c98762f'}, {'id': '195fc314e169ae21', 'threadId': '195fc314e169ae21'}], 'nextPageToken': '12565313761980251534', 'resultSizeEstimate': 201} error=None
-            
-                # 2. retrieve the email content
-                function_definition = self.aci.functions.get_definition("GMAIL__MESSAGES_GET")
-                response = self.openai.chat.completions.create(model="o3-mini",
-                                                               messages=[
-                                                                    {
-                                                                        "role": "system",
-                                                                        "content": "You are a helpful assistant that can use gmail message get function to view emails' content on behalf of the user. \
-                                                                            You will be given a set of id and threadId of the emails, in the form of a JSON like the following: \
-                                                                                {'messages': [{'id': '1960dfae71df3aa5', 'threadId': '1960dfae71df3aa5'}, {'id': '1960ddb5bf95d60e', 'threadId': '1960ddb5bf95d60e'}, {'id': '1960dcb8b8996882', 'threadId': '1960dcb8b8996882'}, {'id': '1960da14f79ddfbf', 'threadId': '1960da14f79ddfbf'}, {'id': '1960cc30a2a03694', 'threadId': '1960cc238ce2fa68'}, {'id': '1960cc238ce2fa68', 'threadId': '1960cc238ce2fa68'}, {'id': '19603f4130e0009c', 'threadId': '19603f4130e0009c'}, {'id': '19601a8d15b3ec9b', 'threadId': '19601a8d15b3ec9b'}, {'id': '196006191c98762f', 'threadId': '196006191c98762f'}, {'id': '195fc314e169ae21', 'threadId': '195fc314e169ae21'}], 'nextPageToken': '12565313761980251534', 'resultSizeEstimate': 201}\
-                                                                            Use this information to view the content of the all the emails in the list. \
-                                                                            Follow the function definition and the tool call format to view the emails. \
-                                                                            Any provided date format is DD/MM/YYYY."
-                                                                    },
-                                                                    {
-                                                                        "role": "user",
-                                                                        "content": f"use the email tool to view the content of the emails using the following information: {result.data}",
-                                                                    },
-                                                                ],
-                                                                tools=[function_definition],
-                                                                tool_choice="required",  # force the model to generate a tool call for demo purposes
-                                                                )
-                #print(f"DEBUG: Response inside toolbox.py: {response}")
-                tool_call = (
-                    response.choices[0].message.tool_calls[0]
-                    if response.choices[0].message.tool_calls
-                    else None
-                )
-                print(f"DEBUG: Tool call inside toolbox.py: {tool_call}")
-                result = self.aci.functions.execute(
-                    "GMAIL__MESSAGES_GET",
-                    json.loads(tool_call.function.arguments),
-                    linked_account_owner_id=self.LINKED_ACCOUNT_OWNER_ID,
-                )
-                print(f"DEBUG: Tool execution result inside toolbox.py: {result}")
-
-
-
+                # list the matching message ids and fetch them all concurrently
+                result = self.email_reader.read(tool_response_dict['instructions'])
+                print(f"DEBUG: Read {len(result.get('data', []))} emails inside toolbox.py")
                 return result
-            '''
 
         elif tool_response_dict["tool"] == "expense_manager":
             
+            # nothing to show for any of the views
+            if tool_response_dict['instructions']["action"] not in ("log_expense", "import_expenses") and self.expense_store.is_empty():
+                return {'status': 'info', 'message': 'No expenses logged yet'}
+
             if tool_response_dict['instructions']["action"] == "log_expense":
-                # use expense manager tool to log an expense
-                
-                # check if we expense_log.csv file exists
-                if not os.path.exists('./data/finance/expense_log.csv'):
-                    # create the file and directory if needed
-                    os.makedirs('./data/finance', exist_ok=True)
-                    with open('./data/finance/expense_log.csv', 'w') as f:
-                        f.write('date,amount,category,currency\n')
-
-                # read the expense_log.csv file using pandas
-                df = pd.read_csv('./data/finance/expense_log.csv')
-                #print(df)
-                    
-                # append the new expense to the expense_log.csv file
-                # create a new row as a dictionary
-                new_expense = {
-                    'date': datetime.strptime(tool_response_dict['instructions']['date'], '%d/%m/%Y').strftime('%d/%m/%Y'),
-                    'amount': tool_response_dict['instructions']['amount'],
-                    'category': tool_response_dict['instructions']['category'],
-                    'currency': tool_response_dict['instructions']['currency']
-                }
-                
-                # use concat instead of append (which is deprecated)
-                df = pd.concat([df, pd.DataFrame([new_expense])], ignore_index=True)
-                
-                # Convert date strings to datetime objects for proper sorting
-                df['date_obj'] = pd.to_datetime(df['date'], format='%d/%m/%Y')
-                # sort the dataframe by date
-                df = df.sort_values(by='date_obj', ascending=True)
-                # Remove the temporary column used for sorting
-                df = df.drop('date_obj', axis=1)
-                
-                df.to_csv('./data/finance/expense_log.csv', index=False)
-                #print(df)
+                # use expense manager tool to log an expense: a single indexed insert
+                self.expense_store.add(tool_response_dict['instructions']['date'],
+                                       tool_response_dict['instructions']['amount'],
+                                       tool_response_dict['instructions']['category'],
+                                       tool_response_dict['instructions']['currency'])
 
                 #Update notification logs if the expense is logged successfully for TODAY
                 update_notification_logs('<b>+ Expense logged successfully!</b>', \
@@ -312,92 +313,58 @@ class Toolbox:
                                             )
                 return {'status': 'success', 'message': 'Expense logged successfully'}
 
+            elif tool_response_dict['instructions']["action"] == "import_expenses":
+                # bulk import of a bank statement export (CSV/OFX): streamed in chunks, committed in one transaction
+                instructions = tool_response_dict['instructions']
+                try:
+                    stats = import_statement(self.expense_store, instructions['file_path'],
+                                             load_expense_categories(self.expense_categories_path),
+                                             default_currency=instructions.get('currency') or 'USD',
+                                             chunk_rows=self.expense_import_chunk_rows,
+                                             debits_positive=bool(instructions.get('debits_positive', False)))
+                except (OSError, ValueError) as e:
+                    return {'status': 'error', 'message': f'Could not import expenses: {e}'}
+                print(f"DEBUG: Imported statement {instructions['file_path']} inside toolbox.py: {stats}")
+
+                if not stats['imported']:
+                    message = 'All expenses in the statement were already imported' if stats['skipped_duplicates'] \
+                        else 'No expenses found in the statement'
+                    return {'status': 'info', 'message': message, 'data': stats}
+
+                update_notification_logs(f"<b>+ {stats['imported']} expenses imported successfully!</b>", \
+                                             self.notification_logs_path
+                                            )
+                return {'status': 'success', 'message': f"Imported {stats['imported']} expenses", 'data': stats}
+
             elif tool_response_dict['instructions']["action"] == "view_all_expenses":
-                #print(f"DEBUG: Viewing all expenses inside toolbox.py")
-                # Check if expense_log.csv exists
-                if not os.path.exists('./data/finance/expense_log.csv'):
-                    return {'status': 'error', 'message': 'No expense log found'}
-                
-                # Read the expense log
-                df = pd.read_csv('./data/finance/expense_log.csv')
-                #print(f"DEBUG: Expense log dataframe: {df}")
-                # Check if there are any expenses
-                if df.empty:
-                    return {'status': 'info', 'message': 'No expenses logged yet'}
-                #print(f"DEBUG: Returning all expenses inside toolbox.py")
-                # Return all expenses
-                return {'status': 'success', 'data': df.to_dict('records')}
+                # Return all expenses from the cached frame
+                return {'status': 'success', 'data': frame_records(self.expense_frame.get())}
                 
             elif tool_response_dict['instructions']["action"] == "view_last_N_expenses":
-                # Check if expense_log.csv exists
-                if not os.path.exists('./data/finance/expense_log.csv'):
-                    return {'status': 'error', 'message': 'No expense log found'}
-                
-                # Read the expense log
-                df = pd.read_csv('./data/finance/expense_log.csv')
-                
-                # Check if there are any expenses
-                if df.empty:
-                    return {'status': 'info', 'message': 'No expenses logged yet'}
-                
                 # Get the number of expenses to return
-                n = int(tool_response_dict['instructions'].get('n', 5))
-                
-                # Convert date strings to datetime objects for proper sorting
-                df['date_obj'] = pd.to_datetime(df['date'], format='%d/%m/%Y')
-                # Sort by date, most recent first
-                df = df.sort_values(by='date_obj', ascending=False)
-                # Remove the temporary column used for sorting
-                df = df.drop('date_obj', axis=1)
-                
-                # Get the last N expenses
-                last_n_expenses = df.head(n).to_dict('records')
+                n = int(tool_response_dict['instructions'].get('N', tool_response_dict['instructions'].get('n', 5)))
                 
-                return {'status': 'success', 'data': last_n_expenses}
+                # Get the last N expenses, most recent first
+                return {'status': 'success', 'data': self.expense_store.last_n(n)}
                 
             elif tool_response_dict['instructions']["action"] == "view_expenses_by_category":
-                # Check if expense_log.csv exists
-                if not os.path.exists('./data/finance/expense_log.csv'):
-                    return {'status': 'error', 'message': 'No expense log found'}
-                
-                # Read the expense log
-                df = pd.read_csv('./data/finance/expense_log.csv')
-                
-                # Check if there are any expenses
-                if df.empty:
-                    return {'status': 'info', 'message': 'No expenses logged yet'}
-                
                 # Get the category to filter by
                 category = tool_response_dict['instructions'].get('category', '')
                 
                 if not category:
                     return {'status': 'error', 'message': 'No category specified for view_expenses_by_category'}
                 
-                # Filter expenses by category
-                filtered_df = df[df['category'].str.lower() == category.lower()]
+                # Filter expenses by category (case-insensitive index scan)
+                expenses = self.expense_store.by_category(category)
                 
-                if filtered_df.empty:
+                if not expenses:
                     return {'status': 'info', 'message': f'No expenses found for category: {category}'}
                 
-                return {'status': 'success', 'data': filtered_df.to_dict('records')}
+                return {'status': 'success', 'data': expenses}
                 
             elif tool_response_dict['instructions']["action"] == "view_expenses_category_wise":
-                # Check if expense_log.csv exists
-                if not os.path.exists('./data/finance/expense_log.csv'):
-                    return {'status': 'error', 'message': 'No expense log found'}
-                
-                # Read the expense log
-                df = pd.read_csv('./data/finance/expense_log.csv')
-                
-                # Check if there are any expenses
-                if df.empty:
-                    return {'status': 'info', 'message': 'No expenses logged yet'}
-                
-                # Group by category and return summary
-                category_summary = df.groupby('category').agg({
-                    'amount': ['sum', 'count']
-                }).reset_index()
-                category_summary.columns = ['category', 'total_amount', 'count']
+                # Category totals from the rollups maintained on every log_expense
+                category_summary = pd.DataFrame(self.expense_store.rollup('category')).rename(columns={'bucket': 'category'})
                 
                 # Sort by total amount in descending order
                 category_summary = category_summary.sort_values(by='total_amount', ascending=False)
@@ -441,17 +408,6 @@ class Toolbox:
                 return {'status': 'success', 'data': category_summary.to_dict('records'), 'image_path': ['./data/finance/category_wise_expenses.png']}
 
             elif tool_response_dict['instructions']["action"] == "view_expenses_by_date":
-                # Check if expense_log.csv exists
-                if not os.path.exists('./data/finance/expense_log.csv'):
-                    return {'status': 'error', 'message': 'No expense log found'}
-                
-                # Read the expense log
-                df = pd.read_csv('./data/finance/expense_log.csv')
-                
-                # Check if there are any expenses
-                if df.empty:
-                    return {'status': 'info', 'message': 'No expenses logged yet'}
-                
                 # Get the date to filter by
                 date_str = tool_response_dict['instructions'].get('date', '')
                 
@@ -460,42 +416,22 @@ class Toolbox:
                 
                 # Parse the date
                 try:
-                    filter_date = datetime.strptime(date_str, '%d/%m/%Y').strftime('%d/%m/%Y')
+                    filter_date = datetime.strptime(date_str, '%d/%m/%Y').date()
                 except ValueError:
                     return {'status': 'error', 'message': 'Invalid date format. Use DD/MM/YYYY'}
                 
                 # Filter expenses by date
-                filtered_df = df[df['date'] == filter_date]
+                expenses = self.expense_store.between(filter_date, filter_date + timedelta(days=1))
                 
-                if filtered_df.empty:
+                if not expenses:
                     return {'status': 'info', 'message': f'No expenses found for date: {date_str}'}
                 
-                return {'status': 'success', 'data': filtered_df.to_dict('records')}
+                return {'status': 'success', 'data': expenses}
                 
             elif tool_response_dict['instructions']["action"] == "view_daywise_expenses":
-                # Check if expense_log.csv exists
-                if not os.path.exists('./data/finance/expense_log.csv'):
-                    return {'status': 'error', 'message': 'No expense log found'}
-                
-                # Read the expense log
-                df = pd.read_csv('./data/finance/expense_log.csv')
-                
-                # Check if there are any expenses
-                if df.empty:
-                    return {'status': 'info', 'message': 'No expenses logged yet'}
-                
-                # Group by date and return summary
-                date_summary = df.groupby('date').agg({
-                    'amount': ['sum', 'count']
-                }).reset_index()
-                date_summary.columns = ['date', 'total_amount', 'count']
-                
-                # Convert date strings to datetime objects for proper sorting
-                date_summary['date_obj'] = pd.to_datetime(date_summary['date'], format='%d/%m/%Y')
-                # Sort by date
-                date_summary = date_summary.sort_values(by='date_obj', ascending=True)
-                # Remove the temporary column used for sorting
-                date_summary = date_summary.drop('date_obj', axis=1)
+                # Day totals from the rollups maintained on every log_expense, already in date order
+                date_summary = pd.DataFrame(self.expense_store.rollup('day'))
+                date_summary.insert(0, 'date', pd.to_datetime(date_summary.pop('bucket'), format='%Y-%m-%d').dt.strftime('%d/%m/%Y'))
                 
                 # Create interactive bar chart with plotly
                 fig = px.bar(
@@ -536,73 +472,36 @@ class Toolbox:
             
             # NA for now --------------------
             elif tool_response_dict['instructions']["action"] == "view_expenses_by_week":
-                # Check if expense_log.csv exists
-                if not os.path.exists('./data/finance/expense_log.csv'):
-                    return {'status': 'error', 'message': 'No expense log found'}
-                
-                # Read the expense log
-                df = pd.read_csv('./data/finance/expense_log.csv')
-                
-                # Check if there are any expenses
-                if df.empty:
-                    return {'status': 'info', 'message': 'No expenses logged yet'}
-                
-                # Get the week to filter by (format: YYYY-WW)
-                week_str = tool_response_dict['instructions'].get('week', '')
+                # Get the ISO week and year to filter by (or a single YYYY-WW string)
+                week_str = str(tool_response_dict['instructions'].get('week', ''))
+                year_str = str(tool_response_dict['instructions'].get('year', ''))
                 
                 if not week_str:
                     return {'status': 'error', 'message': 'No week specified for view_expenses_by_week'}
                 
                 try:
-                    # Parse the week string (format: YYYY-WW)
-                    year, week = map(int, week_str.split('-'))
-                    
-                    # Convert date strings to datetime objects
-                    df['date_obj'] = pd.to_datetime(df['date'], format='%d/%m/%Y')
+                    if '-' in week_str:
+                        year, week = map(int, week_str.split('-'))
+                    else:
+                        year, week = int(year_str), int(week_str)
                     
-                    # Extract year and week from date
-                    df['year'] = df['date_obj'].dt.isocalendar().year
-                    df['week'] = df['date_obj'].dt.isocalendar().week
-                    
-                    # Filter expenses by year and week
-                    filtered_df = df[(df['year'] == year) & (df['week'] == week)]
-                    
-                    # Drop temporary columns
-                    filtered_df = filtered_df.drop(['date_obj', 'year', 'week'], axis=1)
+                    # Filter expenses by the dates of the ISO week
+                    week_start = date.fromisocalendar(year, week, 1)
+                    expenses = self.expense_store.between(week_start, week_start + timedelta(days=7))
                     
                 except (ValueError, TypeError):
-                    return {'status': 'error', 'message': 'Invalid week format. Use YYYY-WW (e.g., 2023-01)'}
+                    return {'status': 'error', 'message': 'Invalid week format. Give the week and year as numbers (e.g., week 1 of 2023)'}
                 
-                if filtered_df.empty:
-                    return {'status': 'info', 'message': f'No expenses found for week: {week_str}'}
+                if not expenses:
+                    return {'status': 'info', 'message': f'No expenses found for week: {week} of {year}'}
                 
-                return {'status': 'success', 'data': filtered_df.to_dict('records')}
+                return {'status': 'success', 'data': expenses}
             # NA for now
             elif tool_response_dict['instructions']["action"] == "view_weekwise_expenses":
-                # Check if expense_log.csv exists
-                if not os.path.exists('./data/finance/expense_log.csv'):
-                    return {'status': 'error', 'message': 'No expense log found'}
-                
-                # Read the expense log
-                df = pd.read_csv('./data/finance/expense_log.csv')
-                
-                # Check if there are any expenses
-                if df.empty:
-                    return {'status': 'info', 'message': 'No expenses logged yet'}
-                
-                # Convert date strings to datetime objects
-                df['date_obj'] = pd.to_datetime(df['date'], format='%d/%m/%Y')
-                
-                # Extract year and week from date
-                df['year'] = df['date_obj'].dt.isocalendar().year
-                df['week'] = df['date_obj'].dt.isocalendar().week
-                df['year_week'] = df['year'].astype(str) + '-W' + df['week'].astype(str).str.zfill(2)
-                
-                # Group by year-week and return summary
-                weekly_summary = df.groupby(['year_week', 'week', 'year']).agg({
-                    'amount': ['sum', 'count']
-                }).reset_index()
-                weekly_summary.columns = ['year_week', 'week', 'year', 'total_amount', 'count']
+                # ISO week totals (buckets YYYY-Www) from the rollups maintained on every log_expense
+                weekly_summary = pd.DataFrame(self.expense_store.rollup('week')).rename(columns={'bucket': 'year_week'})
+                weekly_summary.insert(1, 'week', weekly_summary['year_week'].str[6:].astype(int))
+                weekly_summary.insert(2, 'year', weekly_summary['year_week'].str[:4].astype(int))
                 
                 # Sort by year and week
                 weekly_summary = weekly_summary.sort_values(by=['year', 'week'], ascending=[False, False])
@@ -648,17 +547,6 @@ class Toolbox:
             #--------------------------------
 
             elif tool_response_dict['instructions']["action"] == "view_expenses_by_month":
-                # Check if expense_log.csv exists
-                if not os.path.exists('./data/finance/expense_log.csv'):
-                    return {'status': 'error', 'message': 'No expense log found'}
-                
-                # Read the expense log
-                df = pd.read_csv('./data/finance/expense_log.csv')
-                
-                # Check if there are any expenses
-                if df.empty:
-                    return {'status': 'info', 'message': 'No expenses logged yet'}
-                
                 # Get the month and year to filter by
                 month = tool_response_dict['instructions'].get('month', '')
                 year = tool_response_dict['instructions'].get('year', '')
@@ -675,46 +563,22 @@ class Toolbox:
                     if month < 1 or month > 12:
                         return {'status': 'error', 'message': 'Month must be between 1 and 12'}
                     
-                    # Convert date strings to datetime objects
-                    df['date_obj'] = pd.to_datetime(df['date'], format='%d/%m/%Y')
-                    
-                    # Filter expenses by year and month
-                    filtered_df = df[(df['date_obj'].dt.year == year) & (df['date_obj'].dt.month == month)]
-                    
-                    # Drop temporary column
-                    filtered_df = filtered_df.drop('date_obj', axis=1)
+                    # Filter expenses by the dates of the month
+                    month_start = date(year, month, 1)
+                    month_end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+                    expenses = self.expense_store.between(month_start, month_end)
                     
                 except (ValueError, TypeError):
                     return {'status': 'error', 'message': 'Invalid month or year format. Month and year must be numbers.'}
                 
-                if filtered_df.empty:
+                if not expenses:
                     return {'status': 'info', 'message': f'No expenses found for month: {month}/{year}'}
                 
-                return {'status': 'success', 'data': filtered_df.to_dict('records')}
+                return {'status': 'success', 'data': expenses}
                 
             elif tool_response_dict['instructions']["action"] == "view_monthwise_expenses":
-                # Check if expense_log.csv exists
-                if not os.path.exists('./data/finance/expense_log.csv'):
-                    return {'status': 'error', 'message': 'No expense log found'}
-                
-                # Read the expense log
-                df = pd.read_csv('./data/finance/expense_log.csv')
-                
-                # Check if there are any expenses
-                if df.empty:
-                    return {'status': 'info', 'message': 'No expenses logged yet'}
-                
-                # Convert date strings to datetime objects
-                df['date_obj'] = pd.to_datetime(df['date'], format='%d/%m/%Y')
-                
-                # Extract year and month from date
-                df['year_month'] = df['date_obj'].dt.strftime('%Y-%m')
-                
-                # Group by year-month and return summary
-                monthly_summary = df.groupby('year_month').agg({
-                    'amount': ['sum', 'count']
-                }).reset_index()
-                monthly_summary.columns = ['month', 'total_amount', 'count']
+                # Month totals (buckets YYYY-MM) from the rollups maintained on every log_expense
+                monthly_summary = pd.DataFrame(self.expense_store.rollup('month')).rename(columns={'bucket': 'month'})
                 
                 # Sort by month
                 monthly_summary = monthly_summary.sort_values(by='month', ascending=False)
@@ -757,28 +621,9 @@ class Toolbox:
                 return {'status': 'success', 'data': monthly_summary.to_dict('records'), 'image_path': ['./data/finance/monthwise_expenses.png']}
                 
             elif tool_response_dict['instructions']["action"] == "view_yearwise_expenses":
-                # Check if expense_log.csv exists
-                if not os.path.exists('./data/finance/expense_log.csv'):
-                    return {'status': 'error', 'message': 'No expense log found'}
-                
-                # Read the expense log
-                df = pd.read_csv('./data/finance/expense_log.csv')
-                
-                # Check if there are any expenses
-                if df.empty:
-                    return {'status': 'info', 'message': 'No expenses logged yet'}
-                
-                # Convert date strings to datetime objects
-                df['date_obj'] = pd.to_datetime(df['date'], format='%d/%m/%Y')
-                
-                # Extract year from date
-                df['year'] = df['date_obj'].dt.year
-                
-                # Group by year and return summary
-                yearly_summary = df.groupby('year').agg({
-                    'amount': ['sum', 'count']
-                }).reset_index()
-                yearly_summary.columns = ['year', 'total_amount', 'count']
+                # Year totals from the rollups maintained on every log_expense
+                yearly_summary = pd.DataFrame(self.expense_store.rollup('year')).rename(columns={'bucket': 'year'})
+                yearly_summary['year'] = yearly_summary['year'].astype(int)
                 
                 # Sort by year
                 yearly_summary = yearly_summary.sort_values(by='year', ascending=False)
@@ -820,17 +665,6 @@ class Toolbox:
                 return {'status': 'success', 'data': yearly_summary.to_dict('records'), 'image_path': ['./data/finance/yearwise_expenses.png']}
 
             elif tool_response_dict['instructions']["action"] == "view_expenses_by_year":
-                # Check if expense_log.csv exists
-                if not os.path.exists('./data/finance/expense_log.csv'):
-                    return {'status': 'error', 'message': 'No expense log found'}
-                
-                # Read the expense log
-                df = pd.read_csv('./data/finance/expense_log.csv')
-                
-                # Check if there are any expenses
-                if df.empty:
-                    return {'status': 'info', 'message': 'No expenses logged yet'}
-                
                 # Get the year to filter by
                 year_str = tool_response_dict['instructions'].get('year', '')
                 
@@ -841,22 +675,36 @@ class Toolbox:
                     # Parse the year
                     year = int(year_str)
                     
-                    # Convert date strings to datetime objects
-                    df['date_obj'] = pd.to_datetime(df['date'], format='%d/%m/%Y')
-                    
-                    # Filter expenses by year
-                    filtered_df = df[df['date_obj'].dt.year == year]
-                    
-                    # Drop temporary column
-                    filtered_df = filtered_df.drop('date_obj', axis=1)
+                    # Filter expenses by the dates of the year
+                    expenses = self.expense_store.between(date(year, 1, 1), date(year + 1, 1, 1))
                     
                 except (ValueError, TypeError):
                     return {'status': 'error', 'message': 'Invalid year format. Use YYYY (e.g., 2023)'}
                 
-                if filtered_df.empty:
+                if not expenses:
                     return {'status': 'info', 'message': f'No expenses found for year: {year_str}'}
                 
-                return {'status': 'success', 'data': filtered_df.to_dict('records')}
+                return {'status': 'success', 'data': expenses}
+                
+            elif tool_response_dict['instructions']["action"] == "query_expenses":
+                # declarative query (filters, group_by, aggregations, sort, limit), one vectorized pass over the expenses;
+                # a date range is read from the archive (only the columns and months it touches), queries over the
+                # whole log share the cached frame like the other finance actions
+                query = tool_response_dict['instructions']
+                try:
+                    start, end = query_date_bounds(query) if self.expense_archive else (None, None)
+                    if start is not None or end is not None:
+                        expenses_frame = self.expense_archive.frame(query_columns(query), start, end)
+                    else:
+                        expenses_frame = self.expense_frame.get()
+                    expenses = run_expense_query(expenses_frame, query)
+                except (KeyError, TypeError, ValueError) as e:
+                    return {'status': 'error', 'message': f'Invalid expense query: {e}'}
+                
+                if not expenses:
+                    return {'status': 'info', 'message': 'No expenses match the query'}
+                
+                return {'status': 'success', 'data': expenses}
                 
         elif tool_response_dict["tool"] == "diary":
             if tool_response_dict['instructions']["action"] == "create_entry":
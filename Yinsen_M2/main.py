@@ -15,6 +15,7 @@ from core_engines.streams.audio.audio_input import AudioInput
 from core_engines.streams.audio.audio_output import AudioOutput
 
 from core_engines.multi_agent_model.MAS_system_1 import MAS_system_1
+from core_engines.utils.clients import configure_client_pool
 
 import logging
 import yaml
@@ -23,6 +24,7 @@ from pathlib import Path
 import time
 import re
 import json
+import asyncio
 
 class JARVIS:
     """
@@ -38,6 +40,7 @@ class JARVIS:
         
         # Initialize logging and components
         self._init_logging()
+        configure_client_pool(self.config.get('openai_client'))
         self._init_components()
         
         # init data dir
@@ -213,12 +216,12 @@ class JARVIS:
                 
                 # Process text input if available
                 if text_input:
-                    _ = self._handle_user_input(text_input, response_format='HTML')
+                    _ = self._dispatch_user_input(text_input, response_format='HTML')
                 
                 # Process voice input if available
                 if voice_input:
                     self.text_output.display(f"You said: {voice_input}")
-                    _ = self._handle_user_input(voice_input, response_format='TEXT')
+                    _ = self._dispatch_user_input(voice_input, response_format='TEXT')
                     
             except KeyboardInterrupt:
                 self.text_output.display("Received shutdown signal. Shutting down")
@@ -228,13 +231,19 @@ class JARVIS:
             except Exception as e:
                 self.logger.error(f"Error in main loop: {e}")
                 
+    def _dispatch_user_input(self, user_input: str, response_format: str = 'TEXT'):
+        """Handle user input, streaming the response if enabled in the config"""
+        if self.config['sensors']['text'].get('stream_output', False):
+            return self._stream_user_input(user_input, response_format=response_format)
+        return self._handle_user_input(user_input, response_format=response_format)
+
     def _handle_user_input(self, 
                            user_input: str, 
                            response_format: str = 'TEXT' # 'TEXT' or 'HTML'
                            ):
         """Handle user input from any source"""
         # Process shutdown commands
-        if any(keyword in user_input.lower() for keyword in ['exit', 'quit', 'shutdown']):
+        if self._is_shutdown_command(user_input):
             self.text_output.display("Shutting down")
             self.stop()
             return
@@ -246,9 +255,7 @@ class JARVIS:
 
         # Display the response to the user in terminal and "local" audio output (if enabled) -------------------------------------------------------------
         if response['final_response_to_user']:
-            display_msg = f"{self.current_agent.agent_name}: {response['final_response_to_user']}"
-            #print(f"DEBUG: Display message: {display_msg}")
-            self.text_output.display(display_msg)
+            self._display_response(response)
             
             # Speak the response if audio output is enabled
             if self.audio_output:
@@ -258,6 +265,89 @@ class JARVIS:
         print(f"DEBUG: Response: {response}")
         return response
 
+    async def _ahandle_user_input(self,
+                                  user_input: str,
+                                  response_format: str = 'TEXT' # 'TEXT' or 'HTML'
+                                  ):
+        """Async version of _handle_user_input, used by the backend"""
+        if self._is_shutdown_command(user_input):
+            self.text_output.display("Shutting down")
+            self.stop()
+            return
+
+        response = await self.aget_response_from_MAS_system(user_input, response_format=response_format)
+
+        if isinstance(response, dict) and response['final_response_to_user']:
+            self._display_response(response)
+
+            # gTTS + playback is blocking, keep it off the event loop
+            if self.audio_output:
+                await asyncio.to_thread(self.audio_output.speak, response['final_response_to_user'])
+
+        print(f"DEBUG: Response: {response}")
+        return response
+
+    def _stream_user_input(self,
+                           user_input: str,
+                           response_format: str = 'TEXT' # 'TEXT' or 'HTML'
+                           ):
+        """Handle user input, displaying and speaking the response as it is generated"""
+        if self._is_shutdown_command(user_input):
+            self.text_output.display("Shutting down")
+            self.stop()
+            return
+
+        final = {}
+        try:
+            events = self.mas.stream_response_from_mas_system(user_input, self.current_agent, response_format=response_format)
+            # run until the visualizer starts streaming; the agent may have switched by then
+            start = next(event for event in events if event['type'] == 'start')
+            tokens = self._collect_stream_events(events, final)
+            if self.audio_output:
+                tokens = self.audio_output.speak_stream(tokens)
+            self.text_output.display_stream(tokens, prefix=f"{start['current_agent_name']}: ")
+        except Exception as e:
+            self.logger.error(f"Error processing input: {e}")
+            return f"Error: {str(e)}"
+
+        self.current_agent = self.mas.get_current_agent()
+        response = final.get('response')
+        print(f"DEBUG: Response: {response}")
+        return response
+
+    async def astream_user_input(self,
+                                 user_input: str,
+                                 response_format: str = 'TEXT' # 'TEXT' or 'HTML'
+                                 ):
+        """Async generator over the MAS stream events, used by the streaming endpoint"""
+        if self._is_shutdown_command(user_input):
+            self.text_output.display("Shutting down")
+            self.stop()
+            return
+
+        async for event in self.mas.astream_response_from_mas_system(user_input, self.current_agent, response_format=response_format):
+            if event['type'] == 'final':
+                self.current_agent = self.mas.get_current_agent()
+                if event['response']['final_response_to_user']:
+                    self._display_response(event['response'])
+            yield event
+
+    def _collect_stream_events(self, events, final: Dict[str, Any]):
+        """Yield the token texts of a MAS event stream, keeping the final response in `final`"""
+        for event in events:
+            if event['type'] == 'token':
+                yield event['text']
+            elif event['type'] == 'final':
+                final['response'] = event['response']
+
+    def _is_shutdown_command(self, user_input: str) -> bool:
+        return any(keyword in user_input.lower() for keyword in ['exit', 'quit', 'shutdown'])
+
+    def _display_response(self, response: Dict[str, Any]):
+        display_msg = f"{self.current_agent.agent_name}: {response['final_response_to_user']}"
+        #print(f"DEBUG: Display message: {display_msg}")
+        self.text_output.display(display_msg)
+
     def get_response_from_MAS_system(self, user_input: str, response_format: str) -> Dict[str, Any]:
         """Process user input and return response dictionary"""
         try:
@@ -270,6 +360,17 @@ class JARVIS:
             self.logger.error(f"Error processing input: {e}")            
             return f"Error: {str(e)}"
 
+    async def aget_response_from_MAS_system(self, user_input: str, response_format: str) -> Dict[str, Any]:
+        """Async version of get_response_from_MAS_system"""
+        try:
+            response_dict, current_agent = await self.mas.aget_response_from_mas_system(user_input, self.current_agent, response_format=response_format)
+            self.current_agent = current_agent
+            return response_dict
+
+        except Exception as e:
+            self.logger.error(f"Error processing input: {e}")
+            return f"Error: {str(e)}"
+
 
 def main():
     """Main entry point"""
@@ -0,0 +1,56 @@
+import logging
+import os
+import sys
+import threading
+
+import pytest
+
+# modules are imported from the project root (e.g. external_tools.expense_store), as when running main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def agent_config(tmp_path, monkeypatch):
+    """Agent config of a small MAS (two main agents and the helpers) with instructions and histories under tmp_path"""
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    instructions = tmp_path / "instructions"
+    instructions.mkdir()
+    for name in ("general_main", "general_helper", "orchestrator", "finance_manager", "visualizer_agent", "tool_handler_agent"):
+        (instructions / f"{name}.txt").write_text(f"You are the {name}.")
+
+    def agent(name, agent_type):
+        return {"name": name, "type": "openai", "model": "gpt-4o-mini", "instructions": str(instructions / f"{agent_type}.txt"),
+                "history_file": str(tmp_path / "history" / f"{agent_type}.json.gz")}
+
+    return {
+        "general_main_instructions": str(instructions / "general_main.txt"),
+        "general_helper_instructions": str(instructions / "general_helper.txt"),
+        "orchestrator": agent("Mia", "orchestrator"),
+        "finance_manager": agent("Flock", "finance_manager"),
+        "helper_agents": {
+            "visualizer_agent": agent("Viz", "visualizer_agent"),
+            "tool_handler_agent": agent("Tooly", "tool_handler_agent"),
+        },
+    }
+
+
+class FakeToolbox:
+    def __init__(self, config=None):
+        self.calls = []
+
+    def execute_tool(self, tool_response_dict):
+        self.calls.append((threading.current_thread().name, tool_response_dict))
+        return {"status": "success", "message": "Expense logged successfully"}
+
+
+@pytest.fixture
+def make_mas(agent_config, monkeypatch):
+    """Build a MAS_system_1 over agent_config with a fake toolbox"""
+    from core_engines.multi_agent_model import MAS_system_1 as mas_module
+    monkeypatch.setattr(mas_module, "Toolbox", FakeToolbox)
+
+    def make_mas():
+        return mas_module.MAS_system_1({"agent": agent_config, "intent_router": {"enabled": False}},
+                                       logging.getLogger("test"), text_output=None)
+
+    return make_mas
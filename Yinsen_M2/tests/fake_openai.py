@@ -0,0 +1,91 @@
+"""Scripted stand-ins for the OpenAI chat completions API, shared by the agent and MAS tests"""
+
+import asyncio
+import json
+import threading
+from types import SimpleNamespace
+
+
+class ScriptedCompletions:
+    """
+    chat.completions of a fake OpenAI client (sync and async) answering with scripted
+    responses in order. Streams are cut into chunk_size pieces. An async call waits for
+    `gate` (an asyncio.Event) if one is set, and on_stream_end runs before a sync stream ends.
+    """
+
+    def __init__(self, responses, chunk_size=5, name="", events=None):
+        self.responses = list(responses)
+        self.chunk_size = chunk_size
+        self.name = name
+        self.requests = []
+        self.events = [] if events is None else events  # ("start" | "end", name, user input) of every call
+        self.gate = None
+        self.on_stream_end = None
+        self._lock = threading.Lock()
+
+    def _next(self, params):
+        with self._lock:
+            self.requests.append(params)
+            self.events.append(("start", self.name, params["messages"][-2]["content"]))
+            return self.responses.pop(0)
+
+    def _chunks(self, text):
+        for start in range(0, len(text), self.chunk_size):
+            delta = SimpleNamespace(content=text[start:start + self.chunk_size])
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+    def _end(self, params):
+        self.events.append(("end", self.name, params["messages"][-2]["content"]))
+
+    def create(self, stream=False, **params):
+        text = self._next(params)
+        if not stream:
+            self._end(params)
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+        return self._stream(text, params)
+
+    def _stream(self, text, params):
+        yield from self._chunks(text)
+        if self.on_stream_end is not None:
+            self.on_stream_end()
+        self._end(params)
+
+    async def acreate(self, stream=False, **params):
+        text = self._next(params)
+        await asyncio.sleep(0.01)
+        if self.gate is not None:
+            await self.gate.wait()
+        if not stream:
+            self._end(params)
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+        return self._astream(text, params)
+
+    async def _astream(self, text, params):
+        for chunk in self._chunks(text):
+            await asyncio.sleep(0)
+            yield chunk
+        self._end(params)
+
+
+def script(agent, *responses, chunk_size=5, events=None):
+    """Answer the agent's next calls (sync, async, streamed or not) with responses, in order; events can be shared"""
+    completions = ScriptedCompletions(responses, chunk_size, agent.agent_name, events)
+    agent.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    agent.async_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=completions.acreate)))
+    return completions
+
+
+def main_reply(detailed_response, tool_usage_response=None, invoke_agent_name=None, tool_call=None):
+    """A main agent response in the [key]: value format"""
+    return (f"[detailed_response]: {detailed_response}\n"
+            f"[summarized_response]: {detailed_response.split('.')[0]}.\n"
+            f"[tool_usage_flag]: {tool_usage_response is not None}\n"
+            f"[tool_call]: {json.dumps(tool_call) if tool_call else ''}\n"
+            f"[tool_usage_response]: {tool_usage_response or ''}\n"
+            f"[ask_for_agent_switch_confirmation_flag]: False\n"
+            f"[invoke_another_agent_flag]: {invoke_agent_name is not None}\n"
+            f"[invoke_agent_name]: {invoke_agent_name or ''}\n")
+
+
+def visualizer_reply(final_response):
+    return f"[final_response_to_user]: {final_response}\n[summarized_response]: {final_response[:10]}\n"
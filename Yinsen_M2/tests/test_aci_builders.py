@@ -0,0 +1,148 @@
+import os
+import time
+from datetime import timedelta
+
+import pytest
+
+from external_tools.aci_builders import (ACI_ARGUMENT_BUILDERS, build_calendar_events_insert, build_calendar_events_list,
+                                         build_calendar_events_sync, build_gmail_messages_get, build_gmail_messages_list,
+                                         build_gmail_send_email, matches_definition, parse_duration)
+
+
+@pytest.fixture(autouse=True)
+def local_timezone():
+    # a fixed UTC+02:00 local time (POSIX offsets are inverted), independent of the machine
+    previous = os.environ.get("TZ")
+    os.environ["TZ"] = "UTC-02:00"
+    time.tzset()
+    yield
+    if previous is None:
+        os.environ.pop("TZ")
+    else:
+        os.environ["TZ"] = previous
+    time.tzset()
+
+
+@pytest.mark.parametrize("duration, expected", [
+    ("2 hours", timedelta(hours=2)),
+    ("1h 30m", timedelta(minutes=90)),
+    ("45 minutes", timedelta(minutes=45)),
+    ("1.5 hrs", timedelta(minutes=90)),
+    (90, timedelta(minutes=90)),
+    ("30", timedelta(minutes=30)),
+])
+def test_parse_duration(duration, expected):
+    assert parse_duration(duration) == expected
+
+
+def test_parse_duration_rejects_text():
+    with pytest.raises(ValueError):
+        parse_duration("a while")
+
+
+def test_calendar_events_insert():
+    arguments = build_calendar_events_insert({
+        "action": "create", "start_time": "03/04/2025 17:00", "duration": "1h 30m",
+        "description": "dentist appointment\nbring the insurance card", "location": "Main St 1",
+        "participant": "Anna <anna@example.com>, bob@example.org"})
+    assert arguments == {
+        "path": {"calendarId": "primary"},
+        "body": {
+            "summary": "Dentist appointment",
+            "description": "dentist appointment\nbring the insurance card",
+            "start": {"dateTime": "2025-04-03T17:00:00+02:00"},
+            "end": {"dateTime": "2025-04-03T18:30:00+02:00"},
+            "location": "Main St 1",
+            "attendees": [{"email": "anna@example.com"}, {"email": "bob@example.org"}],
+        },
+    }
+
+
+def test_calendar_events_insert_end_time_and_default_duration():
+    body = build_calendar_events_insert({"start_time": "03/04/2025 23:30", "end_time": "04/04/2025 00:15",
+                                         "description": "call", "participant": "Mum"})["body"]
+    assert body["end"] == {"dateTime": "2025-04-04T00:15:00+02:00"}
+    assert "attendees" not in body and "location" not in body
+
+    body = build_calendar_events_insert({"start_time": "03/04/2025 09:00", "description": "gym"})["body"]
+    assert body["end"] == {"dateTime": "2025-04-03T10:00:00+02:00"}
+
+
+@pytest.mark.parametrize("instructions", [
+    {"description": "no start"},
+    {"start_time": "03/04/2025 17:00"},
+    {"start_time": "tomorrow at 5", "description": "call"},
+    {"start_time": "03/04/2025 17:00", "end_time": "03/04/2025 16:00", "description": "call"},
+])
+def test_calendar_events_insert_rejects(instructions):
+    with pytest.raises(ValueError):
+        build_calendar_events_insert(instructions)
+
+
+def test_calendar_events_list_covers_the_local_day():
+    assert build_calendar_events_list({"action": "view", "date": "03/04/2025"}) == {
+        "path": {"calendarId": "primary"},
+        "query": {"timeMin": "2025-04-03T00:00:00+02:00", "timeMax": "2025-04-04T00:00:00+02:00",
+                  "singleEvents": True, "orderBy": "startTime"},
+    }
+    with pytest.raises(ValueError):
+        build_calendar_events_list({"action": "view"})
+
+
+def test_calendar_events_sync():
+    assert build_calendar_events_sync()["query"] == {"singleEvents": True, "maxResults": 2500}
+    assert build_calendar_events_sync(sync_token="s", updated_min="u", page_token="p")["query"] == \
+        {"singleEvents": True, "maxResults": 2500, "syncToken": "s", "pageToken": "p"}
+    assert build_calendar_events_sync(updated_min="2025-04-03T00:00:00Z")["query"] == \
+        {"singleEvents": True, "maxResults": 2500, "updatedMin": "2025-04-03T00:00:00Z", "showDeleted": True}
+
+
+def test_gmail_send_email():
+    arguments = build_gmail_send_email({"to": "Bob <bob@example.com>; carol@example.com",
+                                        "content": "Hi Bob,\nThe report is attached. Let me know what you think!"})
+    assert arguments == {"sender": "me", "recipient": "bob@example.com", "subject": "The report is attached.",
+                         "body": "Hi Bob,\nThe report is attached. Let me know what you think!",
+                         "cc": ["carol@example.com"]}
+    assert build_gmail_send_email({"to": "bob@example.com", "subject": "Budget", "content": "Hello"})["subject"] == "Budget"
+    assert build_gmail_send_email({"to": "bob@example.com", "content": "Hello"})["subject"] == "Hello"
+
+    with pytest.raises(ValueError):
+        build_gmail_send_email({"to": "Bob", "content": "Hello"})
+    with pytest.raises(ValueError):
+        build_gmail_send_email({"to": "bob@example.com", "content": ""})
+
+
+def test_gmail_messages_list():
+    assert build_gmail_messages_list({"action": "read"}) == {"path": {"userId": "me"}, "query": {"maxResults": 10}}
+    arguments = build_gmail_messages_list({"last_n_emails": "5", "since_date": "01/04/2025", "until_date": "03/04/2025",
+                                           "query": "from:bank"}, page_token="next")
+    assert arguments["query"] == {"maxResults": 5, "q": "before:2025/04/04 after:2025/04/01 from:bank", "pageToken": "next"}
+    assert build_gmail_messages_get("id1") == {"path": {"userId": "me", "id": "id1"}, "query": {"format": "full"}}
+
+
+def definition(properties, required=()):
+    return {"type": "function", "function": {"name": "F", "parameters": {
+        "type": "object", "properties": properties, "required": list(required)}}}
+
+
+EVENTS_LIST = definition({
+    "path": {"type": "object", "properties": {"calendarId": {"type": "string"}}, "required": ["calendarId"]},
+    "query": {"type": "object", "properties": {name: {} for name in ("timeMin", "timeMax", "singleEvents", "orderBy")}},
+}, required=["path"])
+
+
+def test_built_arguments_match_the_definition():
+    arguments = ACI_ARGUMENT_BUILDERS["GOOGLE_CALENDAR__EVENTS_LIST"]({"date": "03/04/2025"})
+    assert matches_definition(EVENTS_LIST, arguments)
+    assert matches_definition(EVENTS_LIST["function"], arguments)
+
+
+def test_changed_definition_is_not_matched():
+    arguments = build_calendar_events_list({"date": "03/04/2025"})
+    renamed = definition({"path": EVENTS_LIST["function"]["parameters"]["properties"]["path"],
+                          "params": {"type": "object", "properties": {}}})
+    assert not matches_definition(renamed, arguments)
+    assert not matches_definition(definition(EVENTS_LIST["function"]["parameters"]["properties"], required=["body"]), arguments)
+    assert not matches_definition(definition({"path": {"type": "object", "properties": {"id": {}}}, "query": {}}), arguments)
+    assert not matches_definition(None, arguments)
+    assert not matches_definition({"function": {"name": "F"}}, arguments)
@@ -0,0 +1,86 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from core_engines.agents import agent_registry
+from core_engines.agents.agent_registry import AgentRegistry
+
+AGENT_CONFIG = {
+    "orchestrator": {"name": "Mia", "model": "gpt-4o"},
+    "finance_manager": {"name": "Flock", "model": "gpt-4o"},
+    "context_token_budget": 3000,
+    "helper_agents": {
+        "visualizer_agent": {"name": "Viz", "model": "gpt-4o-mini"},
+        "tool_handler_agent": {"name": "Tooly", "model": "gpt-4o-mini"},
+        "notes": "not an agent",
+    },
+}
+
+
+class FakeAgent:
+    constructed = []
+
+    def __init__(self, agent_name, config, agent_type, agent_category, agent_type_to_name_map):
+        time.sleep(0.01)  # reading instructions and history takes a while
+        self.agent_name, self.config, self.agent_type, self.agent_category = agent_name, config, agent_type, agent_category
+        self.agent_type_to_name_map = agent_type_to_name_map
+        FakeAgent.constructed.append(agent_type)
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    FakeAgent.constructed = []
+    monkeypatch.setattr(agent_registry, "LLMAgent", FakeAgent)
+    return AgentRegistry(AGENT_CONFIG, "{'orchestrator': 'Mia'}")
+
+
+def test_agent_types(registry):
+    assert registry.agent_types() == ["orchestrator", "finance_manager", "visualizer_agent", "tool_handler_agent"]
+    assert registry.agent_types("main") == ["orchestrator", "finance_manager"]
+    assert registry.agent_types("helper") == ["visualizer_agent", "tool_handler_agent"]
+
+
+def test_nothing_is_constructed_up_front(registry):
+    assert registry.agent_name("finance_manager") == "Flock"
+    assert registry.agent_name("tool_handler_agent") == "Tooly"
+    assert not registry.is_loaded("finance_manager")
+    assert FakeAgent.constructed == []
+
+
+def test_agents_are_constructed_once_on_first_use(registry):
+    finance = registry.get("finance_manager")
+    assert registry.get("finance_manager") is finance
+    assert registry.is_loaded("finance_manager") and not registry.is_loaded("orchestrator")
+    assert (finance.agent_name, finance.agent_category, finance.config) == ("Flock", "main", AGENT_CONFIG)
+    assert finance.agent_type_to_name_map == "{'orchestrator': 'Mia'}"
+
+    helper = registry.get("visualizer_agent")
+    assert (helper.agent_category, helper.config) == ("helper", AGENT_CONFIG["helper_agents"])
+    assert FakeAgent.constructed == ["finance_manager", "visualizer_agent"]
+
+
+def test_unknown_agent_type(registry):
+    with pytest.raises(KeyError):
+        registry.get("diary_manager")
+
+
+def test_concurrent_first_use_constructs_one_agent(registry):
+    agents = []
+    threads = [threading.Thread(target=lambda: agents.append(registry.get("tool_handler_agent"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert FakeAgent.constructed == ["tool_handler_agent"]
+    assert all(agent is agents[0] for agent in agents)
+
+
+def test_aget(registry):
+    async def main():
+        return await asyncio.gather(*(registry.aget("orchestrator") for _ in range(4)))
+
+    agents = asyncio.run(main())
+    assert FakeAgent.constructed == ["orchestrator"]
+    assert all(agent is registry.get("orchestrator") for agent in agents)
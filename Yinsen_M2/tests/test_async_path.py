@@ -0,0 +1,121 @@
+import asyncio
+import json
+
+import pytest
+
+from core_engines.agents.llm_agent import LLMAgent
+from fake_openai import main_reply, script, visualizer_reply
+
+
+@pytest.fixture
+def make_agent(agent_config):
+    def make_agent():
+        return LLMAgent("Mia", agent_config, agent_type="orchestrator", agent_category="main", agent_type_to_name_map="{}")
+    return make_agent
+
+
+def turn(user_input, response):
+    return [{"role": "user", "content": user_input}, {"role": "assistant", "content": response}]
+
+
+def test_async_turn_is_recorded_and_saved(make_agent):
+    agent = make_agent()
+    completions = script(agent, "Hello!")
+    assert asyncio.run(agent.agenerate_response("hi")) == "Hello!"
+    assert agent.conversation_history == turn("hi", "Hello!")
+    assert make_agent().conversation_history == turn("hi", "Hello!")
+    assert completions.requests[0]["messages"][-2] == {"role": "user", "content": "hi"}
+
+
+def test_async_stream_is_recorded_once_consumed(make_agent):
+    agent = make_agent()
+    script(agent, "Hello there!", chunk_size=3)
+
+    async def main():
+        stream = await agent.agenerate_response("hi", stream=True)
+        deltas = []
+        async for delta in stream:
+            deltas.append(delta)
+            assert agent.conversation_history == [{"role": "user", "content": "hi"}]
+        return deltas
+
+    assert asyncio.run(main()) == ["Hel", "lo ", "the", "re!"]
+    assert make_agent().conversation_history == turn("hi", "Hello there!")
+
+
+def test_cancelled_call_rolls_back_the_user_turn(make_agent):
+    agent = make_agent()
+    script(agent, "first", "Hello!")
+    asyncio.run(agent.agenerate_response("earlier"))
+    completions = script(agent, "never sent")
+
+    async def main():
+        completions.gate = asyncio.Event()
+        task = asyncio.create_task(agent.agenerate_response("hi"))
+        await asyncio.sleep(0.05)
+        assert agent.conversation_history[-1] == {"role": "user", "content": "hi"}
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert agent.conversation_history == turn("earlier", "first")
+    assert make_agent().conversation_history == turn("earlier", "first")
+
+
+def test_abandoned_stream_rolls_back_the_user_turn(make_agent):
+    agent = make_agent()
+    script(agent, "Hello there!", chunk_size=3)
+
+    async def main():
+        stream = await agent.agenerate_response("hi", stream=True)
+        assert await stream.__anext__() == "Hel"
+        await stream.aclose()
+
+    asyncio.run(main())
+    assert agent.conversation_history == []
+
+
+def test_async_mas_turn_with_a_tool(make_mas):
+    mas = make_mas()
+    events = []
+    script(mas.orchestrator_agent, main_reply("Logging it.", tool_usage_response="log 10 USD for food"),
+           chunk_size=3, events=events)
+    tool_call = {"tool": "expense_manager", "instructions": {"action": "log_expense", "amount": 10, "category": "food"}}
+    script(mas.tool_handler_agent, json.dumps(tool_call), events=events)
+    script(mas.visualizer_agent, visualizer_reply("<p>Logged 10 USD.</p>"), events=events)
+
+    response, agent = asyncio.run(mas.aget_response_from_mas_system("log 10 USD for food", mas.current_agent, "HTML"))
+    assert response["final_response_to_user"] == "<p>Logged 10 USD.</p>"
+    assert (response["current_agent_name"], agent) == ("Mia", mas.orchestrator_agent)
+
+    # the tool handler was started while the main agent was still streaming
+    names = [(kind, name) for kind, name, _ in events]
+    assert names.index(("start", "Tooly")) < names.index(("end", "Mia"))
+    # the toolbox runs in a worker thread, not on the event loop
+    (thread_name, executed), = mas.toolbox.calls
+    assert executed == tool_call and thread_name != "MainThread"
+
+
+def test_concurrent_async_turns_are_serialized(make_mas):
+    mas = make_mas()
+    events = []
+    script(mas.orchestrator_agent, main_reply("Switching to Flock.", invoke_agent_name="Flock"), events=events)
+    script(mas.finance_manager_agent, main_reply("Your budget is fine."), events=events)
+    script(mas.visualizer_agent, visualizer_reply("Switched to Flock."), visualizer_reply("Budget is fine."), events=events)
+    orchestrator = mas.current_agent
+
+    async def main():
+        return await asyncio.gather(mas.aget_response_from_mas_system("switch to flock", orchestrator, "TEXT"),
+                                    mas.aget_response_from_mas_system("how is my budget", orchestrator, "TEXT"))
+
+    (first, _), (second, agent) = asyncio.run(main())
+    # one call at a time, and the queued turn goes to the agent switched to
+    assert [(kind, name) for kind, name, _ in events] == [
+        ("start", "Mia"), ("end", "Mia"), ("start", "Viz"), ("end", "Viz"),
+        ("start", "Flock"), ("end", "Flock"), ("start", "Viz"), ("end", "Viz")]
+    assert first["final_response_to_user"] == "Switched to Flock."
+    assert (second["final_response_to_user"], second["current_agent_name"]) == ("Budget is fine.", "Flock")
+    assert agent is mas.finance_manager_agent
+    assert orchestrator.conversation_history[0]["content"] == "switch to flock"
+    assert mas.finance_manager_agent.conversation_history[0]["content"] == "how is my budget"
@@ -0,0 +1,78 @@
+import random
+from datetime import datetime, timezone
+
+import pytest
+
+from external_tools.calendar_mirror import CalendarMirror, IntervalIndex
+
+
+def brute_force_overlapping(intervals, start, end):
+    return sorted(key for interval_start, interval_end, key in intervals if interval_start < end and interval_end > start)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_interval_index_matches_brute_force(seed):
+    rng = random.Random(seed)
+    intervals = []
+    for i in range(200):
+        start = rng.uniform(0, 1000)
+        intervals.append((start, start + rng.choice([0.5, 5, 50, 400]), f"e{i}"))
+    index = IntervalIndex(intervals[:100])
+    for interval in intervals[100:]:
+        index.add(*interval)
+    for interval in rng.sample(intervals, 40):
+        index.remove(interval[2])
+        intervals.remove(interval)
+
+    assert len(index) == len(intervals)
+    for _ in range(300):
+        start = rng.uniform(-50, 1050)
+        end = start + rng.uniform(0.1, 100)
+        assert sorted(index.overlapping(start, end)) == brute_force_overlapping(intervals, start, end)
+
+
+def test_interval_index_is_half_open():
+    index = IntervalIndex([(10, 20, "a"), (20, 30, "b")])
+    assert index.overlapping(20, 25) == ["b"]
+    assert index.overlapping(5, 10) == []
+    assert index.overlapping(19.5, 20.5) == ["a", "b"]
+    index.remove("missing")
+    assert len(index) == 2
+
+
+def utc(hour, minute=0):
+    return datetime(2025, 4, 4, hour, minute, tzinfo=timezone.utc)
+
+
+def event(event_id, start, end, **fields):
+    return {'id': event_id, 'summary': event_id, 'start': {'dateTime': start.isoformat()},
+            'end': {'dateTime': end.isoformat()}, **fields}
+
+
+@pytest.fixture
+def mirror():
+    mirror = CalendarMirror(aci=None, linked_account_owner_id="me", mirror_path=None)
+    for item in [event('a', utc(9), utc(10)), event('b', utc(10), utc(11, 30)), event('c', utc(12), utc(13)),
+                 event('t', utc(14), utc(15), transparency='transparent')]:
+        mirror.add_event(item)
+    return mirror
+
+
+def test_events_between_uses_busy_flag(mirror):
+    assert [e['summary'] for e in mirror.events_between(utc(10, 30), utc(14, 30))] == ['b', 'c', 't']
+    assert [e['summary'] for e in mirror.events_between(utc(10, 30), utc(14, 30), busy_only=True)] == ['b', 'c']
+
+
+def test_free_slots_near_skip_busy_time(mirror):
+    # one slot per gap, closest to the request; 11:30-12:00 is too short and the transparent event does not block
+    assert mirror.free_slots_near(utc(10, 30), utc(11, 30)) == [(utc(8), utc(9)), (utc(13), utc(14))]
+
+
+def test_free_slots_near_fit_short_gap(mirror):
+    assert mirror.free_slots_near(utc(11), utc(11, 30)) == [(utc(8, 30), utc(9)), (utc(11, 30), utc(12)), (utc(13), utc(13, 30))]
+
+
+def test_cancelled_event_frees_its_slot(mirror):
+    mirror.add_event({'id': 'c', 'status': 'cancelled'})
+    assert mirror.index.overlapping(utc(12).timestamp(), utc(13).timestamp()) == []
+    assert (utc(11, 30), utc(12, 30)) in mirror.free_slots_near(utc(11, 30), utc(12, 30))
@@ -0,0 +1,66 @@
+import pytest
+
+from core_engines.agents import context_builder
+from core_engines.agents.context_builder import MESSAGE_OVERHEAD_TOKENS, ContextBuilder, TokenCounter, get_token_counter
+from core_engines.agents.history_compactor import SUMMARY_PREFIX
+
+
+@pytest.fixture(autouse=True)
+def estimated_counts(monkeypatch):
+    # 4 characters per token, whether or not tiktoken is installed
+    monkeypatch.setattr(context_builder, "tiktoken", None)
+    monkeypatch.setattr(context_builder, "_token_counters", {})
+
+
+def message(tokens, role="user", tag=""):
+    """A message counting exactly `tokens` tokens (with the 4 character role name)"""
+    content_tokens = tokens - MESSAGE_OVERHEAD_TOKENS - 1
+    return {"role": role, "content": (tag + "x" * (4 * content_tokens))[:4 * content_tokens]}
+
+
+def test_estimated_token_counts():
+    counter = TokenCounter("gpt-4o-mini")
+    assert counter.encoding is None
+    assert counter.count_text("") == 0
+    assert counter.count_text("abcde") == 2
+    assert counter.count({"role": "user", "content": "abcd" * 10}) == 1 + 10 + MESSAGE_OVERHEAD_TOKENS
+    assert counter.count({"role": "user", "content": None}) == 1 + MESSAGE_OVERHEAD_TOKENS
+
+
+def test_message_counts_are_cached():
+    counter = TokenCounter("gpt-4o-mini")
+    counter.count({"role": "user", "content": "hello"})
+    counter.count({"role": "user", "content": "hello"})
+    assert counter.count_message.cache_info().hits == 1
+
+
+def test_token_counter_shared_per_model():
+    assert get_token_counter("gpt-4o") is get_token_counter("gpt-4o")
+    assert get_token_counter("gpt-4o") is not get_token_counter("gpt-4o-mini")
+
+
+def test_newest_messages_within_budget():
+    history = [message(10, tag=str(i)) for i in range(10)]
+    assert ContextBuilder("m", token_budget=35).select(history) == history[-3:]
+    assert ContextBuilder("m", token_budget=1000).select(history) == history
+    assert ContextBuilder("m", token_budget=1000, max_messages=4).select(history) == history[-4:]
+    assert ContextBuilder("m", token_budget=1000).select([]) == []
+
+
+def test_large_message_ends_the_selection():
+    history = [message(10, tag="old"), message(500, role="tool"), message(10, tag="new")]
+    assert ContextBuilder("m", token_budget=100).select(history) == history[-1:]
+    # a newest message over the budget on its own sends no history
+    assert ContextBuilder("m", token_budget=5).select(history) == []
+
+
+def test_summary_is_pinned():
+    summary = {"role": "system", "content": SUMMARY_PREFIX + "the user likes tea"}
+    history = [summary] + [message(10, tag=str(i)) for i in range(10)]
+    summary_tokens = TokenCounter("m").count(summary)
+    selected = ContextBuilder("m", token_budget=summary_tokens + 25).select(history)
+    assert selected == [summary] + history[-2:]
+
+    # too large to fit: dropped, the budget goes to the newest messages
+    assert summary_tokens > 15
+    assert ContextBuilder("m", token_budget=15).select(history) == history[-1:]
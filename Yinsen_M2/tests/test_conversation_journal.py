@@ -0,0 +1,119 @@
+import gzip
+import json
+
+import pytest
+
+from core_engines.agents.conversation_journal import ConversationJournal
+
+
+def message(i, role="user"):
+    return {"role": role, "content": f"message {i}"}
+
+
+@pytest.fixture
+def history_file(tmp_path):
+    return str(tmp_path / "history.json.gz")
+
+
+def journal_lines(journal):
+    with open(journal.journal_file, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_sync_appends_only_new_messages(history_file):
+    journal = ConversationJournal(history_file)
+    history = [message(0), message(1, "assistant")]
+    journal.sync(history)
+    history.append(message(2))
+    journal.sync(history)
+    journal.sync(history)  # nothing new
+
+    assert [entry['seq'] for entry in journal_lines(journal)] == [0, 1, 2]
+    assert journal.persisted_length == 3
+    assert ConversationJournal(history_file).load() == history
+
+
+def test_load_replays_journal_on_top_of_snapshot(history_file):
+    journal = ConversationJournal(history_file)
+    history = [message(i) for i in range(3)]
+    journal.sync(history)
+    journal.compact(history)
+    history += [message(3), message(4)]
+    journal.sync(history)
+
+    reloaded = ConversationJournal(history_file)
+    assert reloaded.load() == history
+    assert reloaded.persisted_length == 5
+    assert reloaded.journal_entries == 2
+
+
+def test_entries_out_of_sequence_are_ignored(history_file):
+    journal = ConversationJournal(history_file)
+    journal.sync([message(0)])
+    with open(journal.journal_file, 'a', encoding='utf-8') as f:
+        # a duplicate of seq 0, a gap, and a torn last line
+        f.write(json.dumps({'gen': 0, 'seq': 0, 'message': message(99)}) + '\n')
+        f.write(json.dumps({'gen': 0, 'seq': 5, 'message': message(5)}) + '\n')
+        f.write(json.dumps({'gen': 0, 'seq': 1, 'message': message(1)}) + '\n')
+        f.write('{"gen": 0, "seq": 2, "mess')
+
+    assert ConversationJournal(history_file).load() == [message(0), message(1)]
+
+
+def test_compaction_when_journal_is_long(history_file):
+    journal = ConversationJournal(history_file, compaction_interval=4)
+    history = []
+    for i in range(5):
+        history.append(message(i))
+        journal.sync(history)
+
+    # compacted after the 4th entry, the 5th is in the new journal
+    assert [entry['seq'] for entry in journal_lines(journal)] == [4]
+    with gzip.open(history_file, 'rt', encoding='utf-8') as f:
+        assert json.load(f)['history'] == history[:4]
+    assert ConversationJournal(history_file).load() == history
+
+
+def test_replace_prefix_rewrites_snapshot(history_file):
+    journal = ConversationJournal(history_file)
+    history = [message(i) for i in range(6)]
+    journal.sync(history)
+    summary = {"role": "system", "content": "summary"}
+    journal.replace_prefix(history, 4, [summary])
+
+    assert history == [summary, message(4), message(5)]
+    assert journal_lines(journal) == []
+    assert ConversationJournal(history_file).load() == history
+
+
+def test_crash_between_snapshot_and_journal_truncation(history_file):
+    journal = ConversationJournal(history_file)
+    history = [message(i) for i in range(6)]
+    journal.sync(history)
+    stale_journal = open(journal.journal_file, 'r', encoding='utf-8').read()
+
+    summary = {"role": "system", "content": "summary"}
+    journal.replace_prefix(history, 3, [summary])
+    # as if the process died after the snapshot was replaced but before the journal was truncated;
+    # the old entries 3.. line up with the shorter history and would otherwise be replayed
+    with open(journal.journal_file, 'w', encoding='utf-8') as f:
+        f.write(stale_journal)
+
+    reloaded = ConversationJournal(history_file)
+    assert reloaded.load() == [summary, message(3), message(4), message(5)]
+
+    # the journal written after the restart is read back normally
+    history = reloaded.load() + [message(6)]
+    reloaded.sync(history)
+    assert ConversationJournal(history_file).load() == history
+
+
+def test_plain_list_snapshot_is_still_read(history_file):
+    with gzip.open(history_file, 'wt', encoding='utf-8') as f:
+        json.dump([message(0)], f)
+    journal = ConversationJournal(history_file)
+    with open(journal.journal_file, 'w', encoding='utf-8') as f:
+        f.write(json.dumps({'seq': 1, 'message': message(1)}) + '\n')
+
+    assert journal.load() == [message(0), message(1)]
+    assert journal.generation == 0
@@ -0,0 +1,110 @@
+import base64
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from external_tools.email_reader import EmailReader, extract_text_body, parse_gmail_message
+
+
+def encoded(text):
+    return base64.urlsafe_b64encode(text.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def gmail_message(message_id, subject=None, body=None):
+    return {"id": message_id, "threadId": f"t-{message_id}", "internalDate": "1743692400000",
+            "snippet": f"snippet {message_id}",
+            "payload": {"mimeType": "multipart/alternative",
+                        "headers": [{"name": "Date", "value": "Thu, 3 Apr 2025 17:00:00 +0200"},
+                                    {"name": "From", "value": "Bob <bob@example.com>"},
+                                    {"name": "To", "value": "me@example.com"},
+                                    {"name": "Subject", "value": subject or f"subject {message_id}"}],
+                        "parts": [{"mimeType": "text/html", "body": {"data": encoded("<p>html</p>")}},
+                                  {"mimeType": "text/plain", "body": {"data": encoded(body or f"body {message_id}")}}]}}
+
+
+class FakeFunctions:
+    """ACI functions serving GMAIL__MESSAGES_LIST pages and GMAIL__MESSAGES_GET messages"""
+
+    def __init__(self, pages, failing_ids=(), list_error=None):
+        self.pages = pages
+        self.failing_ids = set(failing_ids)
+        self.list_error = list_error
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def execute(self, function_name, arguments, linked_account_owner_id=None):
+        with self._lock:
+            self.calls.append((function_name, arguments))
+        if function_name == "GMAIL__MESSAGES_LIST":
+            if self.list_error:
+                return SimpleNamespace(success=False, data=None, error=self.list_error)
+            page = int(arguments["query"].get("pageToken") or 0)
+            data = {"messages": [{"id": message_id, "threadId": f"t-{message_id}"} for message_id in self.pages[page]]}
+            if page + 1 < len(self.pages):
+                data["nextPageToken"] = str(page + 1)
+            return SimpleNamespace(success=True, data=data, error=None)
+        message_id = arguments["path"]["id"]
+        if message_id in self.failing_ids:
+            return SimpleNamespace(success=False, data=None, error="not found")
+        return SimpleNamespace(success=True, data=gmail_message(message_id), error=None)
+
+    def count(self, function_name):
+        return sum(1 for name, _ in self.calls if name == function_name)
+
+
+def reader(functions, **kwargs):
+    return EmailReader(SimpleNamespace(functions=functions), "owner", max_workers=4, **kwargs)
+
+
+def test_parse_gmail_message():
+    assert parse_gmail_message(gmail_message("m1", body="Hello ✓")) == {
+        "id": "m1", "thread_id": "t-m1", "internal_date": 1743692400000, "date": "Thu, 3 Apr 2025 17:00:00 +0200",
+        "from": "Bob <bob@example.com>", "to": "me@example.com", "subject": "subject m1", "snippet": "snippet m1",
+        "body": "Hello ✓"}
+
+
+def test_extract_text_body_from_nested_parts():
+    payload = {"mimeType": "multipart/mixed", "parts": [
+        {"mimeType": "multipart/alternative", "parts": [{"mimeType": "text/plain", "body": {"data": encoded("deep")}}]}]}
+    assert extract_text_body(payload) == "deep"
+    assert extract_text_body({"mimeType": "text/html", "body": {"data": encoded("<p>x</p>")}}) == ""
+    assert extract_text_body({}) == ""
+
+
+def test_read_last_emails_in_order():
+    functions = FakeFunctions([["m1", "m2", "m3"]])
+    result = reader(functions).read({"action": "read", "last_n_emails": 3})
+    assert result["status"] == "success"
+    assert [email["subject"] for email in result["data"]] == ["subject m1", "subject m2", "subject m3"]
+    assert set(result["data"][0]) == {"date", "from", "subject", "snippet"}
+    assert functions.count("GMAIL__MESSAGES_LIST") == 1 and functions.count("GMAIL__MESSAGES_GET") == 3
+
+
+def test_pages_are_only_listed_while_more_ids_are_needed():
+    functions = FakeFunctions([["m1", "m2"], ["m3", "m4"], ["m5", "m6"]])
+    result = reader(functions).read({"last_n_emails": 3})
+    assert [email["subject"] for email in result["data"]] == ["subject m1", "subject m2", "subject m3"]
+    assert functions.count("GMAIL__MESSAGES_LIST") == 2
+    assert functions.count("GMAIL__MESSAGES_GET") == 3
+
+
+def test_failed_fetches_are_left_out():
+    result = reader(FakeFunctions([["m1", "m2"]], failing_ids={"m1"})).read({"last_n_emails": 2})
+    assert [email["subject"] for email in result["data"]] == ["subject m2"]
+
+    result = reader(FakeFunctions([["m1"]], failing_ids={"m1"})).read({})
+    assert result == {"status": "info", "message": "No emails found"}
+
+
+def test_list_error():
+    result = reader(FakeFunctions([[]], list_error="token expired")).read({})
+    assert result["status"] == "error"
+    assert "token expired" in result["message"]
+
+
+@pytest.mark.parametrize("last_n_emails, max_results", [(None, 10), ("", 10), (500, 100)])
+def test_email_count_defaults_and_cap(last_n_emails, max_results):
+    functions = FakeFunctions([[]])
+    reader(functions).read({"last_n_emails": last_n_emails})
+    assert functions.calls[0][1]["query"]["maxResults"] == max_results
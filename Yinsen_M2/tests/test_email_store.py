@@ -0,0 +1,90 @@
+import pytest
+
+from external_tools.email_reader import parse_gmail_message
+from external_tools.email_store import EmailStore
+from test_email_reader import FakeFunctions, gmail_message, reader
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = EmailStore(str(tmp_path / "emails" / "emails.db"))
+    yield store
+    store.close()
+
+
+def email(message_id, internal_date, thread_id=None):
+    parsed = parse_gmail_message(gmail_message(message_id))
+    parsed.update(internal_date=internal_date, thread_id=thread_id or parsed["thread_id"])
+    return parsed
+
+
+def test_headers_leave_out_the_body(store):
+    store.put_messages([email("m1", 1), email("m2", 2)])
+    headers = store.headers(["m2", "missing", "m1"])
+    assert set(headers) == {"m1", "m2"}
+    assert "body" not in headers["m1"]
+    assert headers["m1"]["sender"] == "Bob <bob@example.com>" and headers["m1"]["recipient"] == "me@example.com"
+    assert store.get("m1")["body"] == "body m1"
+    assert store.get("missing") is None
+
+
+def test_headers_of_many_ids(store):
+    store.put_messages([email(f"m{i}", i) for i in range(1200)])
+    assert len(store.headers([f"m{i}" for i in range(1300)])) == 1200
+
+
+def test_list_headers_newest_first(store):
+    store.put_messages([email("a", 1, "t1"), email("b", 3, "t2"), email("c", 2, "t1")])
+    assert [row["id"] for row in store.list_headers(limit=2)] == ["b", "c"]
+    assert [row["id"] for row in store.list_headers(thread_id="t1")] == ["c", "a"]
+
+
+def test_summaries_survive_a_refetch(store):
+    store.put_messages([email("m1", 1)])
+    store.set_summaries({"m1": "Bob sent the report."})
+    store.put_messages([email("m1", 1)])
+    assert store.get("m1")["summary"] == "Bob sent the report."
+
+
+def test_store_persists(tmp_path):
+    path = str(tmp_path / "emails.db")
+    store = EmailStore(path)
+    store.put_messages([email("m1", 1)])
+    store.close()
+    store = EmailStore(path)
+    assert store.get("m1")["subject"] == "subject m1"
+    store.close()
+
+
+def test_reader_fetches_and_summarizes_each_message_once(store):
+    summarized = []
+
+    def summarizer(stored_email):
+        summarized.append(stored_email["id"])
+        return f"summary of {stored_email['body']}"
+
+    functions = FakeFunctions([["m2", "m1"]])
+    email_reader = reader(functions, store=store, summarizer=summarizer)
+    first = email_reader.read({"last_n_emails": 2})
+    assert first["status"] == "success"
+    assert [(row["subject"], row["summary"]) for row in first["data"]] == [("subject m2", "summary of body m2"),
+                                                                          ("subject m1", "summary of body m1")]
+
+    functions.pages = [["m3", "m2", "m1"]]
+    second = email_reader.read({"last_n_emails": 3})
+    assert [row["summary"] for row in second["data"]] == ["summary of body m3", "summary of body m2", "summary of body m1"]
+    assert functions.count("GMAIL__MESSAGES_GET") == 3
+    assert sorted(summarized) == ["m1", "m2", "m3"]
+
+
+def test_reader_without_summarizer_uses_the_snippet(store):
+    functions = FakeFunctions([["m1", "m2"]], failing_ids={"m2"})
+    result = reader(functions, store=store).read({"last_n_emails": 2})
+    assert result["data"] == [{"date": "Thu, 3 Apr 2025 17:00:00 +0200", "from": "Bob <bob@example.com>",
+                               "subject": "subject m1", "summary": "snippet m1"}]
+    # the failed message is fetched again next time
+    functions.failing_ids = set()
+    reader(functions, store=store).read({"last_n_emails": 2})
+    assert [arguments["path"]["id"] for name, arguments in functions.calls
+            if name == "GMAIL__MESSAGES_GET"] in (["m1", "m2", "m2"], ["m2", "m1", "m2"])
+    assert store.get("m2") is not None
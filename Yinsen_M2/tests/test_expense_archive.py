@@ -0,0 +1,83 @@
+import os
+import random
+from datetime import date, timedelta
+
+import pandas as pd
+import pytest
+
+from external_tools.expense_archive import ExpenseArchive
+from external_tools.expense_store import ExpenseStore
+
+TODAY = date(2025, 6, 15)
+
+RANGES = [
+    (None, None),
+    (date(2025, 3, 1), date(2025, 4, 1)),
+    (date(2025, 2, 14), date(2025, 5, 3)),
+    (date(2025, 5, 20), None),
+    (None, date(2025, 1, 10)),
+    (date(2025, 6, 1), date(2025, 6, 16)),
+    (date(2025, 7, 1), None),
+]
+
+COLUMN_SETS = [None, ["amount"], ["date", "category"], ["currency", "amount"]]
+
+
+def assert_same_frame(archived, stored):
+    pd.testing.assert_frame_equal(archived.reset_index(drop=True), stored.reset_index(drop=True), check_categorical=False)
+
+
+def assert_matches_store(archive, store):
+    for start, end in RANGES:
+        for columns in COLUMN_SETS:
+            assert_same_frame(archive.frame(columns, start, end, today=TODAY), store.typed_frame(start, end, columns))
+
+
+@pytest.fixture
+def store(tmp_path):
+    rng = random.Random(7)
+    store = ExpenseStore(str(tmp_path / "expenses.db"))
+    rows = []
+    for _ in range(400):
+        day = date(2025, 1, 1) + timedelta(days=rng.randrange(0, 166))  # January to mid June
+        rows.append((day.isoformat(), round(rng.uniform(1, 200), 2), rng.choice(["food", "travel", "shopping"]),
+                     rng.choice(["USD", "EUR"])))
+    store.add_many([sorted(rows)])
+    yield store
+    store.close()
+
+
+def test_archive_matches_store(store, tmp_path):
+    archive = ExpenseArchive(store, str(tmp_path / "archive"))
+    assert archive.compact(TODAY) == ["2025-01", "2025-02", "2025-03", "2025-04", "2025-05"]
+    assert_matches_store(archive, store)
+
+
+def test_late_insert_into_closed_month(store, tmp_path):
+    archive = ExpenseArchive(store, str(tmp_path / "archive"))
+    archive.compact(TODAY)
+    old_partition = archive.months["2025-03"]["dir"]
+
+    # a back-dated expense, with a category and currency no archived month has yet
+    store.add("10/03/2025", 99.99, "entertainment", "GBP")
+    assert_matches_store(archive, store)
+    assert archive.months["2025-03"]["dir"] != old_partition
+    assert not os.path.exists(os.path.join(archive.archive_dir, old_partition))
+    late = archive.frame(None, date(2025, 3, 10), date(2025, 3, 11), today=TODAY)
+    assert "entertainment" in set(late["category"])
+
+
+def test_archive_reopened_from_manifest(store, tmp_path):
+    ExpenseArchive(store, str(tmp_path / "archive")).compact(TODAY)
+    archive = ExpenseArchive(store, str(tmp_path / "archive"))
+    assert archive.compact(TODAY) == []
+    assert_matches_store(archive, store)
+
+
+def test_month_closing_is_compacted(store, tmp_path):
+    archive = ExpenseArchive(store, str(tmp_path / "archive"))
+    archive.compact(TODAY)
+    assert "2025-06" not in archive.months
+    next_month = date(2025, 7, 2)
+    assert_same_frame(archive.frame(None, None, None, today=next_month), store.typed_frame())
+    assert "2025-06" in archive.months
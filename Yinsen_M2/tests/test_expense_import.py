@@ -0,0 +1,157 @@
+import pandas as pd
+import pytest
+
+from external_tools.expense_import import StatementImporter, _parse_amounts, import_statement
+from external_tools.expense_store import ExpenseStore
+
+CATEGORIES = ["food", "travel", "entertainment", "shopping", "other"]
+
+
+def rows_of(importer, path):
+    return [row[:4] for chunk in importer.chunks(str(path)) for row in chunk]
+
+
+def test_parse_amounts():
+    amounts = _parse_amounts(pd.Series(["-12.50", "(7.25)", "$1,234.56", "-1.234,56", "12,5", "€ -3", "", "n/a", "1,234"]))
+    assert amounts.iloc[:6].tolist() == [-12.5, -7.25, 1234.56, -1234.56, 12.5, -3.0]
+    assert amounts.iloc[6:8].isna().all()
+    assert amounts.iloc[8] == 1234.0  # thousands separator, not a decimal comma
+
+
+def test_csv_signed_amounts(tmp_path):
+    path = tmp_path / "statement.csv"
+    path.write_text("\ufeffTransaction Date,Description,Amount,Currency\n"
+                    "03/04/2025,STARBUCKS LONDON,-4.20,gbp\n"
+                    "04/04/2025,SALARY,2500.00,GBP\n"
+                    "not a date,BROKEN,-3.00,GBP\n"
+                    "05/04/2025,NO AMOUNT,,GBP\n"
+                    "06/04/2025,Uber trip,(18.40),\n"
+                    "07/04/2025,Corner kiosk,-2.00,pounds\n", encoding="utf-8")
+    importer = StatementImporter(CATEGORIES, default_currency="eur")
+    assert rows_of(importer, path) == [
+        ("2025-04-03", 4.2, "food", "GBP"),
+        ("2025-04-06", 18.4, "travel", "EUR"),
+        ("2025-04-07", 2.0, "other", "EUR"),
+    ]
+    assert importer.stats == {"imported": 3, "skipped_invalid": 2, "skipped_credits": 1, "skipped_duplicates": 0}
+
+
+def test_csv_debit_column_and_decimal_commas(tmp_path):
+    path = tmp_path / "statement.csv"
+    path.write_text('Booking Date,Narrative,Debit,Credit,Category\n'
+                    '2025-04-01,Netflix,"15,99",,\n'
+                    '2025-04-02,Refund,,"20,00",\n'
+                    '2025-04-03,IKEA Berlin,"1.049,00",,Home\n'
+                    '2025-04-04,Lunch,"9,50",,Food\n', encoding="utf-8")
+    importer = StatementImporter(CATEGORIES, default_currency="EUR")
+    assert rows_of(importer, path) == [
+        ("2025-04-01", 15.99, "entertainment", "EUR"),
+        ("2025-04-03", 1049.0, "shopping", "EUR"),
+        ("2025-04-04", 9.5, "food", "EUR"),
+    ]
+    assert importer.stats["skipped_credits"] == 1
+
+
+def test_csv_day_first_dates_and_positive_debits(tmp_path):
+    path = tmp_path / "card.csv"
+    path.write_text("Date,Merchant,Amount\n"
+                    "13/04/2025 10:15,Hotel Lisboa,120.00\n"
+                    "02/04/2025,Payment received,-500.00\n", encoding="utf-8")
+    importer = StatementImporter(CATEGORIES, debits_positive=True)
+    assert rows_of(importer, path) == [("2025-04-13", 120.0, "travel", "USD")]
+
+
+def test_csv_without_amount_column(tmp_path):
+    path = tmp_path / "statement.csv"
+    path.write_text("Date,Description\n01/04/2025,Coffee\n", encoding="utf-8")
+    with pytest.raises(ValueError):
+        rows_of(StatementImporter(CATEGORIES), path)
+
+
+def test_unsupported_format(tmp_path):
+    path = tmp_path / "statement.pdf"
+    path.write_bytes(b"%PDF")
+    with pytest.raises(ValueError):
+        rows_of(StatementImporter(CATEGORIES), path)
+
+
+OFX = """OFXHEADER:100
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><CURDEF>CAD
+<BANKTRANLIST>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20250401120000[-5:EST]<TRNAMT>-12.34<NAME>Air Canada<MEMO>Flight change fee</STMTTRN>
+<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20250402<TRNAMT>100.00<NAME>Transfer</STMTTRN>
+<STMTTRN>
+<TRNTYPE>DEBIT
+<DTPOSTED>20250403
+<TRNAMT>-5.00
+<NAME>Tim Hortons coffee
+<CURRENCY>USD
+</STMTTRN>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>garbage<TRNAMT>-1.00<NAME>Broken</STMTTRN>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20250405<TRNAMT>-7.50<NAME>Misc</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+
+def test_ofx_transactions(tmp_path):
+    path = tmp_path / "statement.ofx"
+    path.write_text(OFX, encoding="utf-8")
+    importer = StatementImporter(CATEGORIES)
+    assert rows_of(importer, path) == [
+        ("2025-04-01", 12.34, "travel", "CAD"),
+        ("2025-04-03", 5.0, "food", "USD"),
+        ("2025-04-05", 7.5, "other", "CAD"),
+    ]
+    assert importer.stats == {"imported": 3, "skipped_invalid": 1, "skipped_credits": 1, "skipped_duplicates": 0}
+
+
+def test_import_statement_into_store(tmp_path):
+    store = ExpenseStore(str(tmp_path / "expenses.db"))
+    path = tmp_path / "statement.csv"
+    path.write_text("Date,Description,Amount\n01/04/2025,Pizza,-10\n02/04/2025,Cinema,-12\n", encoding="utf-8")
+    stats = import_statement(store, str(path), CATEGORIES, chunk_rows=1)
+    assert stats["imported"] == 2
+    assert [(e['date'], e['category']) for e in store.all()] == [("01/04/2025", "food"), ("02/04/2025", "entertainment")]
+
+    with pytest.raises(FileNotFoundError):
+        import_statement(store, str(tmp_path / "missing.csv"), CATEGORIES)
+    store.close()
+
+
+def test_reimport_skips_rows_already_imported(tmp_path):
+    store = ExpenseStore(str(tmp_path / "expenses.db"))
+    march = tmp_path / "march.csv"
+    march.write_text("Date,Description,Amount\n"
+                     "30/03/2025,Coffee,-3\n"
+                     "30/03/2025,Coffee,-3\n"  # a second coffee the same day is a real expense
+                     "31/03/2025,Pizza,-10\n", encoding="utf-8")
+    assert import_statement(store, str(march), CATEGORIES, chunk_rows=2)["imported"] == 3
+
+    stats = import_statement(store, str(march), CATEGORIES)
+    assert (stats["imported"], stats["skipped_duplicates"]) == (0, 3)
+
+    # an overlapping statement only adds what is new, spacing and case of the description do not matter
+    april = tmp_path / "april.csv"
+    april.write_text("Date,Description,Amount\n"
+                     "30/03/2025,COFFEE ,-3\n"
+                     "30/03/2025,coffee,-3\n"
+                     "30/03/2025,Coffee,-3\n"
+                     "01/04/2025,Cinema,-12\n", encoding="utf-8")
+    stats = import_statement(store, str(april), CATEGORIES)
+    assert (stats["imported"], stats["skipped_duplicates"]) == (2, 2)
+    assert [(e['date'], e['amount']) for e in store.all()] == [
+        ("30/03/2025", 3.0), ("30/03/2025", 3.0), ("30/03/2025", 3.0), ("31/03/2025", 10.0), ("01/04/2025", 12.0)]
+    assert store.rollup("day")[0] == {"bucket": "2025-03-30", "total_amount": 9.0, "count": 3}
+    store.close()
+
+
+def test_keywords_match_whole_words(tmp_path):
+    path = tmp_path / "statement.csv"
+    path.write_text("Date,Description,Amount\n"
+                    "01/04/2025,Business lunch club,-30\n"
+                    "02/04/2025,City bus,-2\n"
+                    "03/04/2025,Online training course,-50\n"
+                    "04/04/2025,Train tickets,-40\n"
+                    "05/04/2025,McDonald's,-8\n", encoding="utf-8")
+    categories = [row[2] for row in rows_of(StatementImporter(CATEGORIES), path)]
+    assert categories == ["other", "travel", "other", "travel", "food"]
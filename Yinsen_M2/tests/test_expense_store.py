@@ -0,0 +1,103 @@
+import sqlite3
+from collections import defaultdict
+
+import pytest
+
+from external_tools.expense_store import ExpenseStore, ROLLUP_PERIODS, rollup_buckets, to_iso_date
+
+
+def expected_rollups(store):
+    """Rollups recomputed from the stored expenses"""
+    totals = {period: defaultdict(lambda: [0.0, 0]) for period in ROLLUP_PERIODS}
+    for expense in store.all():
+        for period, bucket in rollup_buckets(to_iso_date(expense['date']), expense['category']).items():
+            totals[period][bucket][0] += expense['amount']
+            totals[period][bucket][1] += 1
+    return {period: [{"bucket": bucket, "total_amount": round(total, 2), "count": count}
+                     for bucket, (total, count) in sorted(buckets.items())]
+            for period, buckets in totals.items()}
+
+
+def stored_rollups(store):
+    return {period: store.rollup(period) for period in ROLLUP_PERIODS}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ExpenseStore(str(tmp_path / "expenses.db"))
+    yield store
+    store.close()
+
+
+def test_rollups_follow_add(store):
+    store.add("30/12/2024", 12.5, "food", "USD")
+    store.add("31/12/2024", 7.25, "food", "USD")  # ISO week 2025-W01
+    store.add("01/01/2025", 100, "travel", "EUR")
+    assert stored_rollups(store) == expected_rollups(store)
+    assert store.rollup("week") == [{"bucket": "2025-W01", "total_amount": 119.75, "count": 3}]
+    assert store.rollup("year") == [{"bucket": "2024", "total_amount": 19.75, "count": 2},
+                                    {"bucket": "2025", "total_amount": 100.0, "count": 1}]
+
+
+def test_rollups_follow_add_many(store):
+    store.add("15/03/2025", 3.1, "food", "USD")
+    inserted = store.add_many([[("2025-03-15", 0.1, "food", "USD"), ("2025-03-16", 0.2, "shopping", "USD")],
+                               [("2025-04-01", 40.0, "food", "GBP")]])
+    assert inserted == 3
+    assert stored_rollups(store) == expected_rollups(store)
+    assert store.rollup("day")[0] == {"bucket": "2025-03-15", "total_amount": 3.2, "count": 2}
+
+
+def test_failed_add_many_leaves_rollups_unchanged(store):
+    store.add("15/03/2025", 5, "food", "USD")
+    before = stored_rollups(store)
+
+    def chunks():
+        yield [("2025-03-15", 1.0, "food", "USD")]
+        raise ValueError("unreadable statement")
+
+    with pytest.raises(ValueError):
+        store.add_many(chunks())
+    assert stored_rollups(store) == before
+    assert len(store.all()) == 1
+
+
+def test_rollups_after_csv_migration(tmp_path):
+    csv_path = tmp_path / "expense_log.csv"
+    csv_path.write_text("date,amount,category,currency\n"
+                        "02/04/2025,10,food,USD\n"
+                        "01/04/2025,2.5,food,USD\n"
+                        "28/02/2025,30,travel,EUR\n"
+                        ",,,\n", encoding="utf-8")
+    store = ExpenseStore(str(tmp_path / "expenses.db"), legacy_csv_path=str(csv_path))
+    assert [expense['date'] for expense in store.all()] == ["28/02/2025", "01/04/2025", "02/04/2025"]
+    assert stored_rollups(store) == expected_rollups(store)
+    assert store.rollup("category") == [{"bucket": "food", "total_amount": 12.5, "count": 2},
+                                        {"bucket": "travel", "total_amount": 30.0, "count": 1}]
+    store.close()
+
+    # reopening does not import the CSV again
+    store = ExpenseStore(str(tmp_path / "expenses.db"), legacy_csv_path=str(csv_path))
+    assert store.rollup("month")[-1] == {"bucket": "2025-04", "total_amount": 12.5, "count": 2}
+    store.close()
+
+
+def test_rollups_built_for_database_without_them(tmp_path):
+    db_path = str(tmp_path / "expenses.db")
+    store = ExpenseStore(db_path)
+    store.add("01/05/2025", 8, "food", "USD")
+    store.add("09/05/2025", 4, "entertainment", "USD")
+    expected = stored_rollups(store)
+    store.close()
+
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("DELETE FROM expense_rollups")
+        conn.execute("DELETE FROM meta WHERE key = 'rollups_built'")
+    store = ExpenseStore(db_path)
+    assert stored_rollups(store) == expected
+    store.close()
+
+
+def test_unknown_rollup_period(store):
+    with pytest.raises(ValueError):
+        store.rollup("quarter")
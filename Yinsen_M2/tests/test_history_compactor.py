@@ -0,0 +1,138 @@
+import gzip
+import json
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from core_engines.agents.conversation_journal import ConversationJournal
+from core_engines.agents.history_compactor import SUMMARY_PREFIX, HistoryCompactor, is_summary_message
+
+
+class FakeCompletions:
+    def __init__(self, summary="the user likes tea", fail=False):
+        self.summary = summary
+        self.fail = fail
+        self.requests = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def create(self, **params):
+        self.release.wait(5)
+        self.requests.append(params)
+        if self.fail:
+            raise RuntimeError("API down")
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f" {self.summary} "))])
+
+
+def message(i):
+    return {"role": "user" if i % 2 == 0 else "assistant", "content": f"message {i}"}
+
+
+@pytest.fixture
+def agent(tmp_path):
+    history_file = str(tmp_path / "history" / "agent.json.gz")
+    completions = FakeCompletions()
+    agent = SimpleNamespace(agent_name="Flock", model_name="gpt-4o-mini", history_file=history_file,
+                            history_journal=ConversationJournal(history_file),
+                            client=SimpleNamespace(chat=SimpleNamespace(completions=completions)),
+                            conversation_history=[message(i) for i in range(10)])
+    agent.history_journal.sync(agent.conversation_history)
+    return agent
+
+
+def compact(compactor):
+    compactor.maybe_compact()
+    if compactor._thread is not None:
+        compactor._thread.join(5)
+
+
+def read_archive(compactor):
+    with gzip.open(compactor.archive_file, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_archive_path(agent):
+    assert HistoryCompactor(agent).archive_file.endswith("history/agent.archive.jsonl.gz")
+
+
+def test_no_compaction_under_the_limit(agent):
+    compactor = HistoryCompactor(agent, max_resident_messages=10, keep_recent_messages=4)
+    compact(compactor)
+    assert compactor._thread is None
+    assert not compactor.apply(agent.conversation_history)
+
+
+def test_old_turns_are_folded_into_a_summary(agent):
+    compactor = HistoryCompactor(agent, max_resident_messages=8, keep_recent_messages=4)
+    history = agent.conversation_history
+    compact(compactor)
+    # the background thread only prepares the summary
+    assert len(history) == 10
+
+    history.append(message(10))  # a turn finished while the summary was written
+    assert compactor.apply(history)
+    assert history is agent.conversation_history
+    assert history == [{"role": "system", "content": SUMMARY_PREFIX + "the user likes tea"}] + \
+        [message(i) for i in range(6, 11)]
+    assert is_summary_message(history[0])
+    assert read_archive(compactor) == [message(i) for i in range(6)]
+    assert ConversationJournal(agent.history_file).load() == history
+    assert "message 5" in agent.client.chat.completions.requests[0]["messages"][1]["content"]
+    assert not compactor.apply(history)  # nothing pending any more
+
+
+def test_earlier_summary_is_merged_not_archived(agent):
+    compactor = HistoryCompactor(agent, max_resident_messages=8, keep_recent_messages=4)
+    compact(compactor)
+    compactor.apply(agent.conversation_history)
+    agent.conversation_history += [message(i) for i in range(10, 16)]
+    agent.client.chat.completions.summary = "the user likes tea and cake"
+    compact(compactor)
+
+    assert compactor.apply(agent.conversation_history)
+    assert agent.conversation_history[0]["content"] == SUMMARY_PREFIX + "the user likes tea and cake"
+    assert len(agent.conversation_history) == 5
+    transcript = agent.client.chat.completions.requests[1]["messages"][1]["content"]
+    assert transcript.startswith("system: " + SUMMARY_PREFIX + "the user likes tea")
+    assert not any(is_summary_message(archived) for archived in read_archive(compactor))
+    assert len(read_archive(compactor)) == 6 + 6
+
+
+def test_history_changed_while_summarizing(agent):
+    compactor = HistoryCompactor(agent, max_resident_messages=8, keep_recent_messages=4)
+    compact(compactor)
+    history = agent.conversation_history
+    history[0] = {"role": "user", "content": "rewritten"}  # e.g. a discarded turn
+
+    assert not compactor.apply(history)
+    assert len(history) == 10
+    # the next compaction starts from the current history
+    compact(compactor)
+    assert compactor.apply(history)
+    assert read_archive(compactor)[0] == {"role": "user", "content": "rewritten"}
+
+
+def test_one_compaction_at_a_time(agent):
+    completions = agent.client.chat.completions
+    completions.release.clear()
+    compactor = HistoryCompactor(agent, max_resident_messages=8, keep_recent_messages=4)
+    compactor.maybe_compact()
+    first_thread = compactor._thread
+    compactor.maybe_compact()
+    assert compactor._thread is first_thread
+    completions.release.set()
+    first_thread.join(5)
+
+    # a finished summary waits for apply before the next one starts
+    compactor.maybe_compact()
+    assert compactor._thread is first_thread
+    assert len(completions.requests) == 1
+
+
+def test_failed_summary_leaves_history_alone(agent):
+    agent.client.chat.completions.fail = True
+    compactor = HistoryCompactor(agent, max_resident_messages=8, keep_recent_messages=4)
+    compact(compactor)
+    assert not compactor.apply(agent.conversation_history)
+    assert agent.conversation_history == [message(i) for i in range(10)]
@@ -0,0 +1,65 @@
+import os
+
+import pytest
+import yaml
+
+from core_engines.agents.intent_router import IntentRouter, tokenize
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN_AGENTS = ["orchestrator", "finance_manager", "study_manager", "health_manager"]
+
+
+@pytest.fixture
+def config(monkeypatch):
+    # instruction paths in config.yaml are relative to the project root
+    monkeypatch.chdir(PROJECT_ROOT)
+    with open("config/config.yaml", "r") as f:
+        return yaml.safe_load(f)
+
+
+@pytest.fixture
+def router(config):
+    return IntentRouter(config["agent"], MAIN_AGENTS, config["intent_router"])
+
+
+def test_tokenize_stems_and_drops_stopwords():
+    assert tokenize("Logging my expenses for the studies") == ["log", "expens", "study"]
+
+
+def test_resolve_alias(router, config):
+    assert router.resolve_alias(config["agent"]["finance_manager"]["name"]) == "finance_manager"
+    assert router.resolve_alias('"Finance Agent"') == "finance_manager"
+    assert router.resolve_alias("study_manager") == "study_manager"
+    assert router.resolve_alias("nobody") is None
+    assert router.resolve_alias(None) is None
+
+
+def test_match_switch_command(router):
+    assert router.match_switch_command("switch to the finance agent") == "finance_manager"
+    assert router.match_switch_command("please take me back to the orchestrator!") == "orchestrator"
+    assert router.match_switch_command("switch to nobody") is None
+    assert router.match_switch_command("I want to switch careers") is None
+
+
+def test_classify_domain_requests(router):
+    assert router.classify("I spent 20 dollars on lunch") == "finance_manager"
+    assert router.classify("help me revise for my exam") == "study_manager"
+    assert router.classify("hello") is None
+
+
+@pytest.mark.parametrize("user_input", ["send an email to bob", "schedule a meeting tomorrow at 5pm",
+                                        "check my inbox", "show today's events"])
+def test_shared_tool_requests_are_not_routed(router, user_input):
+    assert router.classify(user_input) is None
+
+
+def test_tool_request_routes_on_its_topic(router):
+    assert router.classify("send an email to bob about the budget report") == "finance_manager"
+
+
+def test_classifier_is_trained_on_first_use_when_disabled(config):
+    router = IntentRouter(config["agent"], MAIN_AGENTS, dict(config["intent_router"], enabled=False))
+    assert router.centroids is None
+    assert router.resolve_alias("finance agent") == "finance_manager"
+    assert router.classify("I spent 20 dollars on lunch") == "finance_manager"
+    assert router.centroids is not None
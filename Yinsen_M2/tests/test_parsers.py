@@ -0,0 +1,93 @@
+import random
+
+import pytest
+
+from core_engines.utils.parsers import FieldStreamer, StreamingResponseParser, convert_string_to_dict
+
+RESPONSE = """[detailed_response]: Logged 10 USD for food [see the log] and
+your balance list [1, 2] is unchanged.
+[summarized_response]: Logged it.
+[tool_usage_flag]: True
+[tool_usage_response]: Need expense manager tool to log 10 USD for food on 02/04/2025
+[ask_for_agent_switch_confirmation_flag]: False
+[invoke_another_agent_flag]: false
+[invoke_agent_name]:
+"""
+
+EXPECTED = {
+    "detailed_response": "Logged 10 USD for food [see the log] and\nyour balance list [1, 2] is unchanged.",
+    "summarized_response": "Logged it.",
+    "tool_usage_flag": True,
+    "tool_usage_response": "Need expense manager tool to log 10 USD for food on 02/04/2025",
+    "ask_for_agent_switch_confirmation_flag": False,
+    "invoke_another_agent_flag": False,
+    "invoke_agent_name": None,
+}
+
+
+def parse_chunks(chunks):
+    deltas = {}
+    parser = StreamingResponseParser(on_delta=lambda key, text: deltas.setdefault(key, []).append(text))
+    completed = []
+    for chunk in chunks:
+        completed += parser.feed(chunk)
+    completed += parser.close()
+    return parser, completed, {key: "".join(texts) for key, texts in deltas.items()}
+
+
+def test_single_chunk():
+    assert convert_string_to_dict(RESPONSE) == EXPECTED
+
+
+@pytest.mark.parametrize("split", range(1, len(RESPONSE)))
+def test_every_split_point(split):
+    parser, completed, deltas = parse_chunks([RESPONSE[:split], RESPONSE[split:]])
+    assert parser.fields == EXPECTED
+    assert dict(completed) == EXPECTED
+    assert deltas["detailed_response"] == EXPECTED["detailed_response"]
+
+
+def test_character_by_character_and_random_chunks():
+    rng = random.Random(4)
+    chunkings = [list(RESPONSE)]
+    for _ in range(50):
+        cuts = sorted(rng.sample(range(1, len(RESPONSE)), rng.randint(2, 30)))
+        chunkings.append([RESPONSE[start:end] for start, end in zip([0] + cuts, cuts + [len(RESPONSE)])])
+    for chunks in chunkings:
+        parser, completed, deltas = parse_chunks(chunks)
+        assert parser.fields == EXPECTED
+        assert [key for key, _ in completed] == list(EXPECTED)
+        for key, value in EXPECTED.items():
+            if isinstance(value, str):
+                assert deltas[key] == value
+
+
+def test_field_completes_when_next_header_arrives():
+    parser = StreamingResponseParser()
+    assert parser.feed("[tool_usage_response]: Need the calendar") == []
+    assert parser.feed(" tool\n[ask_for_agent") == []
+    assert parser.feed("_switch_confirmation_flag]") == []
+    assert parser.feed(":") == [("tool_usage_response", "Need the calendar tool")]
+    assert parser.close() == [("ask_for_agent_switch_confirmation_flag", None)]
+
+
+def test_text_before_first_header_is_ignored():
+    parser, completed, _ = parse_chunks(["Sure! ", "[summ", "arized_response]: Hi"])
+    assert completed == [("summarized_response", "Hi")]
+
+
+def test_field_streamer_emits_only_its_field():
+    streamer = FieldStreamer("final_response_to_user")
+    text = "[reasoning]: none\n[final_response_to_user]: <p>Hello, [Boss]</p>\n[flag]: True"
+    emitted = [streamer.feed(text[i:i + 3]) for i in range(0, len(text), 3)]
+    emitted.append(streamer.close())
+    assert "".join(emitted) == "<p>Hello, [Boss]</p>"
+
+
+def test_field_streamer_holds_back_possible_headers():
+    streamer = FieldStreamer("final_response_to_user")
+    assert streamer.feed("[final_response_to_user]: Hi [Bo") == "Hi"
+    assert streamer.feed("ss]") == ""
+    assert streamer.feed(" there\n[") == " [Boss] there"
+    assert streamer.feed("flag]: True") == ""
+    assert streamer.close() == ""
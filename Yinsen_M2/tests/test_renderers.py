@@ -0,0 +1,79 @@
+from core_engines.utils.renderers import LocalRenderer, is_tabular_result
+
+EXPENSES = {"status": "success", "data": [{"date": "2025-04-02", "amount": 12.5, "category": "food"},
+                                          {"date": "2025-04-03", "amount": 3.0, "category": "transport"}]}
+
+
+def reply(detailed_response="", summarized_response="", tool_usage_flag=False, **fields):
+    return dict(detailed_response=detailed_response, summarized_response=summarized_response,
+                tool_usage_flag=tool_usage_flag, **fields)
+
+
+def render(response_dict, response_format="TEXT", tool_execution_result=None, switch_status=None):
+    return LocalRenderer().render(response_dict, switch_status, tool_execution_result, response_format, "Flock")
+
+
+def test_is_tabular_result():
+    assert is_tabular_result(EXPENSES)
+    assert not is_tabular_result({"status": "success", "data": []})
+    assert not is_tabular_result({"status": "error", "data": [{"a": 1}]})
+    assert not is_tabular_result({"status": "success", "data": ["a", "b"]})
+    assert not is_tabular_result("done")
+
+
+def test_plain_reply_as_text():
+    result = render(reply("You spent 12.50 today. Nice work!", "You spent 12.50."))
+    assert result == {"final_response_to_user": "You spent 12.50 today. Nice work!",
+                      "summarized_response": "You spent 12.50."}
+
+
+def test_plain_reply_as_html():
+    result = render(reply("Your plan:\n- **Read** chapter 1\n- Revise <notes>\n\n1. Sleep", "A plan."), "HTML")
+    assert result["final_response_to_user"] == ("<p>Your plan:</p><ul><li><b>Read</b> chapter 1</li>"
+                                                "<li>Revise &lt;notes&gt;</li></ul><ol><li>Sleep</li></ol>")
+
+
+def test_summary_falls_back_to_first_sentence():
+    assert render(reply("Done. Anything else?"))["summarized_response"] == "Done."
+
+
+def test_agent_switch():
+    switched = render(reply("Switching", invoke_another_agent_flag=True, invoke_agent_name="Flock"),
+                      switch_status=True)
+    assert switched["final_response_to_user"] == "Successfully switched to Flock."
+    failed = render(reply("Switching", invoke_another_agent_flag=True, invoke_agent_name="Nobody"),
+                    response_format="HTML", switch_status=False)
+    assert failed["final_response_to_user"] == "<p>Could not switch to Nobody, you are still talking to Flock.</p>"
+
+
+def test_table_leads_with_the_agent_response():
+    result = render(reply("These are your expenses this week. Food is the biggest.", tool_usage_flag=True),
+                    tool_execution_result=EXPENSES)
+    assert result["final_response_to_user"] == (
+        "These are your expenses this week. Food is the biggest.\n"
+        "date       | amount | category\n"
+        "-----------+--------+----------\n"
+        "2025-04-02 | 12.50  | food\n"
+        "2025-04-03 | 3.00   | transport")
+    assert result["summarized_response"] == "These are your expenses this week."
+
+
+def test_table_as_html():
+    result = render(reply("Your <latest> expenses", "Two expenses.", tool_usage_flag=True), "HTML",
+                    tool_execution_result=EXPENSES)
+    assert result["final_response_to_user"].startswith(
+        "<p>Your &lt;latest&gt; expenses</p><table><tr><th>date</th><th>amount</th><th>category</th></tr>"
+        "<tr><td>2025-04-02</td><td>12.50</td><td>food</td></tr>")
+    assert result["summarized_response"] == "Two expenses."
+
+
+def test_table_without_agent_response():
+    result = render(reply(tool_usage_flag=True), tool_execution_result={"status": "success", "data": [{"a": 1}]})
+    assert result["final_response_to_user"] == "Here are the 1 item you asked for:\na\n-\n1"
+    assert result["summarized_response"] == "Here are the 1 item you asked for."
+
+
+def test_visualizer_needed():
+    assert render(reply("Hi"), response_format="VOICE") is None
+    assert render(reply("")) is None
+    assert render(reply("Logged it", tool_usage_flag=True), tool_execution_result={"status": "success"}) is None
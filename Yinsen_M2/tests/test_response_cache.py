@@ -0,0 +1,120 @@
+import os
+import time
+
+import pytest
+
+from core_engines.agents import llm_agent
+from core_engines.agents.llm_agent import LLMAgent
+from core_engines.agents.response_cache import ResponseCache
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr("core_engines.agents.response_cache.time.time", clock.time)
+    return clock
+
+
+def test_make_key_ignores_argument_order():
+    assert ResponseCache.make_key(a=1, b=[1, 2]) == ResponseCache.make_key(b=[1, 2], a=1)
+    assert ResponseCache.make_key(a=1) != ResponseCache.make_key(a=2)
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = ResponseCache(ttl_seconds=10)
+    cache.put("k", "response")
+    clock.now += 9
+    assert cache.get("k") == "response"
+    clock.now += 2
+    assert cache.get("k") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResponseCache(max_entries=2)
+    cache.put("a", "A")
+    cache.put("b", "B")
+    assert cache.get("a") == "A"  # b is now the least recently used
+    cache.put("c", "C")
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == ("A", "C")
+
+
+def test_empty_responses_are_not_cached():
+    cache = ResponseCache()
+    cache.put("k", "")
+    assert cache.get("k") is None
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    ResponseCache(disk_dir=str(tmp_path)).put("k", "from disk")
+    cache = ResponseCache(disk_dir=str(tmp_path))
+    assert cache.get("k") == "from disk"
+    assert cache.stats()["disk_hits"] == 1
+
+
+def test_sweep_removes_expired_temp_and_oldest_files(tmp_path):
+    cache = ResponseCache(ttl_seconds=100, disk_dir=str(tmp_path), sweep_interval_seconds=10 ** 9)
+    now = time.time()
+    for i in range(5):
+        cache.put(f"k{i}", f"response {i}")
+        os.utime(tmp_path / f"k{i}.json", (now - 50 + i, now - 50 + i))
+    os.utime(tmp_path / "k0.json", (now - 200, now - 200))  # expired
+    (tmp_path / "left-over.tmp").write_text("{")
+    cache.max_disk_entries = 3
+
+    assert cache.sweep() == 3  # the expired file, the temp file and the oldest file above the cap
+    assert sorted(os.listdir(tmp_path)) == ["k2.json", "k3.json", "k4.json"]
+
+
+def test_sweep_keeps_disk_under_byte_cap(tmp_path):
+    cache = ResponseCache(disk_dir=str(tmp_path), max_disk_bytes=1, sweep_interval_seconds=10 ** 9)
+    cache.put("k", "x" * 100)
+    cache.sweep()
+    assert os.listdir(tmp_path) == []
+
+
+def helper_agent():
+    agent = LLMAgent.__new__(LLMAgent)
+    agent.response_cache = ResponseCache()
+    agent.cache_key_scope = 'input'
+    agent.system_instructions = "Format the tool instructions as JSON."
+    agent.agent_type_to_name_map = {"orchestrator": "Mia"}
+    return agent
+
+
+def params(history, user_input, datetime_message="Current datetime: 02/04/2025 10:00"):
+    messages = [{"role": "system", "content": datetime_message}] + history + [{"role": "user", "content": user_input}]
+    return {"model": "gpt-4o-mini", "messages": messages, "temperature": 0.5}
+
+
+def test_helper_key_ignores_history_and_time_of_day(monkeypatch):
+    monkeypatch.setattr(llm_agent, "get_formatted_datetime", lambda **kwargs: "02/04/2025")
+    agent = helper_agent()
+    first = agent._cache_key(params([], "log 12 dollars for lunch today"))
+    later = agent._cache_key(params([{"role": "assistant", "content": "{}"}], "log 12 dollars for lunch today",
+                                    datetime_message="Current datetime: 02/04/2025 18:45"))
+    assert first == later
+    assert agent._cache_key(params([], "log 13 dollars for lunch today")) != first
+
+
+def test_helper_key_changes_with_the_date(monkeypatch):
+    agent = helper_agent()
+    monkeypatch.setattr(llm_agent, "get_formatted_datetime", lambda **kwargs: "02/04/2025")
+    today = agent._cache_key(params([], "schedule a meeting tomorrow at 5pm"))
+    monkeypatch.setattr(llm_agent, "get_formatted_datetime", lambda **kwargs: "03/04/2025")
+    assert agent._cache_key(params([], "schedule a meeting tomorrow at 5pm")) != today
+
+
+def test_request_key_covers_every_message():
+    agent = helper_agent()
+    agent.cache_key_scope = 'request'
+    assert agent._cache_key(params([], "hi")) != agent._cache_key(params([{"role": "user", "content": "x"}], "hi"))
@@ -0,0 +1,123 @@
+import asyncio
+import json
+import time
+
+from core_engines.agents.llm_agent import LLMAgent
+from core_engines.streams.audio.audio_output import AudioOutput
+from core_engines.streams.text.text_output import TextOutput
+from core_engines.utils.renderers import LocalRenderer
+from fake_openai import main_reply, script, visualizer_reply
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.005)
+    return condition()
+
+
+def test_agent_stream_records_the_turn_once_consumed(agent_config):
+    agent = LLMAgent("Mia", agent_config, agent_type="orchestrator", agent_category="main", agent_type_to_name_map="{}")
+    script(agent, "Hello there!", chunk_size=4)
+    stream = agent.generate_response("hi", stream=True)
+    assert agent.conversation_history == [{"role": "user", "content": "hi"}]
+    assert list(stream) == ["Hell", "o th", "ere!"]
+    assert agent.conversation_history[-1] == {"role": "assistant", "content": "Hello there!"}
+
+    reloaded = LLMAgent("Mia", agent_config, agent_type="orchestrator", agent_category="main", agent_type_to_name_map="{}")
+    assert reloaded.conversation_history == agent.conversation_history
+
+
+def scripted_mas(make_mas, visualizer_response=visualizer_reply("<p>Hello, [Boss]. All good.</p>")):
+    mas = make_mas()
+    events = []
+    script(mas.orchestrator_agent, main_reply("Hello. All good."), chunk_size=4, events=events)
+    script(mas.visualizer_agent, visualizer_response, chunk_size=3, events=events)
+    return mas, events
+
+
+def tokens(stream_events):
+    return "".join(event["text"] for event in stream_events if event["type"] == "token")
+
+
+def test_mas_stream_events(make_mas):
+    mas, _ = scripted_mas(make_mas)
+    stream_events = list(mas.stream_response_from_mas_system("hello", mas.current_agent, "HTML"))
+    assert stream_events[0] == {"type": "start", "current_agent_name": "Mia", "current_agent_type": "orchestrator"}
+    assert stream_events[-1]["type"] == "final"
+    # only final_response_to_user is streamed, in several pieces
+    assert tokens(stream_events) == "<p>Hello, [Boss]. All good.</p>"
+    assert sum(event["type"] == "token" for event in stream_events) > 2
+
+    mas, _ = scripted_mas(make_mas)
+    response, _ = mas.get_response_from_mas_system("hello", mas.current_agent, "HTML")
+    assert stream_events[-1]["response"] == response
+    assert response["final_response_to_user"] == "<p>Hello, [Boss]. All good.</p>"
+
+
+def test_async_mas_stream_matches_sync(make_mas):
+    mas, _ = scripted_mas(make_mas)
+    sync_events = list(mas.stream_response_from_mas_system("hello", mas.current_agent, "HTML"))
+
+    mas, _ = scripted_mas(make_mas)
+
+    async def collect():
+        return [event async for event in mas.astream_response_from_mas_system("hello", mas.current_agent, "HTML")]
+
+    async_events = asyncio.run(collect())
+    assert async_events[0] == sync_events[0]
+    assert tokens(async_events) == tokens(sync_events)
+    assert async_events[-1] == sync_events[-1]
+
+
+def test_structured_visualizer_output_is_sent_in_one_token(make_mas):
+    mas, _ = scripted_mas(make_mas, json.dumps({"final_response_to_user": "<p>Hi</p>", "summarized_response": "Hi"}))
+    stream_events = list(mas.stream_response_from_mas_system("hello", mas.current_agent, "HTML"))
+    assert [event for event in stream_events if event["type"] == "token"] == [{"type": "token", "text": "<p>Hi</p>"}]
+    assert stream_events[-1]["response"]["summarized_response"] == "Hi"
+
+
+def test_locally_rendered_reply_skips_the_visualizer(make_mas):
+    mas, events = scripted_mas(make_mas)
+    mas.local_renderer = LocalRenderer()
+    stream_events = list(mas.stream_response_from_mas_system("hello", mas.current_agent, "TEXT"))
+    assert [event["type"] for event in stream_events] == ["start", "token", "final"]
+    assert tokens(stream_events) == "Hello. All good."
+    assert all(name != "Viz" for _, name, _ in events)
+
+
+def test_tool_handler_starts_while_the_main_agent_streams(make_mas):
+    mas = make_mas()
+    events = []
+    main = script(mas.orchestrator_agent, main_reply("Logging it.", tool_usage_response="log 10 USD for food"),
+                  chunk_size=3, events=events)
+    tool_call = {"tool": "expense_manager", "instructions": {"action": "log_expense", "amount": 10, "category": "food"}}
+    script(mas.tool_handler_agent, json.dumps(tool_call), events=events)
+    script(mas.visualizer_agent, visualizer_reply("<p>Logged.</p>"), events=events)
+    # hold the end of the main stream until the tool handler has been called
+    main.on_stream_end = lambda: wait_until(lambda: any(event[:2] == ("start", "Tooly") for event in events))
+
+    stream_events = list(mas.stream_response_from_mas_system("log 10 USD for food", mas.current_agent, "HTML"))
+    names = [(kind, name) for kind, name, _ in events]
+    assert names.index(("start", "Tooly")) < names.index(("end", "Mia"))
+    assert [executed for _, executed in mas.toolbox.calls] == [tool_call]
+    assert tokens(stream_events) == "<p>Logged.</p>"
+
+
+def test_text_output_displays_chunks_as_they_arrive(tmp_path, capsys):
+    log_file = tmp_path / "chat.log"
+    text_output = TextOutput("Mia", {"log_file": str(log_file)})
+    assert text_output.display_stream(iter(["Hel", "lo", "!"]), prefix="> ") == "Hello!"
+    assert capsys.readouterr().out.endswith("Mia: > Hello!\n")
+    assert log_file.read_text().endswith("Mia: > Hello!\n")
+
+
+def test_speech_follows_the_stream_sentence_by_sentence():
+    audio_output = AudioOutput.__new__(AudioOutput)
+    spoken = []
+    audio_output.speak = spoken.append
+
+    chunks = ["Hello th", "ere. How", " are you?", " Fine\nthan", "ks"]
+    assert list(audio_output.speak_stream(iter(chunks))) == chunks
+    assert wait_until(lambda: len(spoken) == 4)
+    assert spoken == ["Hello there.", "How are you?", "Fine", "thanks"]
@@ -0,0 +1,90 @@
+import json
+import os
+
+import pytest
+
+from core_engines.agents.llm_agent import LLMAgent
+from core_engines.utils.parsers import convert_agent_response_to_dict, convert_tool_response_json_string_to_dict
+from external_tools.tool_registry import TOOL_ACTIONS
+
+SCHEMA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "core_engines", "instructions", "schemas")
+SCHEMAS = sorted(name for name in os.listdir(SCHEMA_DIR) if name.endswith(".json"))
+
+
+def load_schema(name):
+    with open(os.path.join(SCHEMA_DIR, name), "r") as f:
+        return json.load(f)
+
+
+def objects_in(schema):
+    """Every object schema nested in a schema"""
+    if isinstance(schema, dict):
+        if schema.get("type") == "object" or "properties" in schema:
+            yield schema
+        for value in schema.values():
+            yield from objects_in(value)
+    elif isinstance(schema, list):
+        for item in schema:
+            yield from objects_in(item)
+
+
+@pytest.mark.parametrize("name", SCHEMAS)
+def test_schemas_are_valid_strict_schemas(name):
+    schema = load_schema(name)
+    assert schema["strict"] is True
+    assert name.startswith(schema["name"].replace("_response", ""))
+    # strict mode needs every property listed as required and no additional properties
+    for obj in objects_in(schema["schema"]):
+        assert obj["additionalProperties"] is False
+        assert sorted(obj["required"]) == sorted(obj["properties"])
+
+
+def test_tool_handler_schema_matches_the_tool_actions():
+    schema = load_schema("tool_handler_agent.v1.json")["schema"]
+    branches = {}
+    for branch in schema["properties"]["instructions"]["anyOf"]:
+        if branch.get("type") == "object":
+            params = set(branch["properties"]) - {"action"}
+            branches[branch["properties"]["action"]["enum"][0]] = params
+    actions = {action: set(params) for tool in TOOL_ACTIONS.values() for action, params in tool.items()}
+    assert branches == actions
+    assert set(schema["properties"]["tool"]["enum"]) == set(TOOL_ACTIONS) | {None}
+
+
+def test_json_response_drops_null_placeholders():
+    response = json.dumps({"detailed_response": "Logged it", "summarized_response": "Logged",
+                           "tool_usage_flag": True, "invoke_agent_name": None,
+                           "tool_call": {"tool": "expense_manager",
+                                         "instructions": {"action": "log_expense", "amount": 10, "date": None}}})
+    assert convert_agent_response_to_dict("  " + response) == {
+        "detailed_response": "Logged it", "summarized_response": "Logged", "tool_usage_flag": True,
+        "tool_call": {"tool": "expense_manager", "instructions": {"action": "log_expense", "amount": 10}}}
+
+
+def test_text_response_still_parsed():
+    assert convert_agent_response_to_dict("[detailed_response]: Hi\n[tool_usage_flag]: False") == {
+        "detailed_response": "Hi", "tool_usage_flag": False}
+    # text that only looks like JSON falls back to the [key]: value format
+    assert convert_agent_response_to_dict("{not json\n[summarized_response]: ok") == {"summarized_response": "ok"}
+
+
+def test_tool_response_json():
+    assert convert_tool_response_json_string_to_dict("") == {}
+    assert convert_tool_response_json_string_to_dict('{"tool": null, "instructions": null}') == {}
+    with pytest.raises(ValueError):
+        convert_tool_response_json_string_to_dict("[tool]: calendar")
+
+
+def agent(structured_output):
+    agent = LLMAgent.__new__(LLMAgent)
+    agent.model_name, agent.max_tokens, agent.temperature = "gpt-4o-mini", 100, 0.5
+    agent.response_schema = agent._init_response_schema(structured_output)
+    return agent
+
+
+def test_response_format_only_when_enabled():
+    assert "response_format" not in agent({})._completion_params([])
+    assert "response_format" not in agent({"enabled": False, "schema": "missing.json"})._completion_params([])
+
+    params = agent({"enabled": True, "schema": os.path.join(SCHEMA_DIR, "visualizer_agent.v1.json")})._completion_params([])
+    assert params["response_format"] == {"type": "json_schema", "json_schema": load_schema("visualizer_agent.v1.json")}
@@ -0,0 +1,126 @@
+import json
+import logging
+
+import pytest
+
+from core_engines.multi_agent_model.MAS_system_1 import MAS_system_1
+from external_tools import tool_registry
+from external_tools.tool_registry import ToolRegistry
+
+
+@pytest.fixture
+def registry():
+    return ToolRegistry()
+
+
+def test_valid_call_is_coerced(registry):
+    tool_call, errors = registry.validate({"tool": "expense_manager", "instructions": {
+        "action": "log_expense", "amount": "12.5", "currency": "EUR", "category": "food", "date": " 03/04/2025 ",
+        "note": "dropped"}})
+    assert errors == []
+    assert tool_call == {"tool": "expense_manager", "instructions": {
+        "action": "log_expense", "amount": 12.5, "currency": "EUR", "category": "food", "date": "03/04/2025"}}
+
+
+def test_json_string_call(registry):
+    tool_call, errors = registry.validate(json.dumps({"tool": "email", "instructions": {
+        "action": "read", "last_n_emails": 5.0, "since_date": "", "query": None}}))
+    assert errors == []
+    assert tool_call == {"tool": "email", "instructions": {"action": "read", "last_n_emails": 5}}
+
+
+def test_defaults_are_filled_in(registry, monkeypatch):
+    monkeypatch.setattr(tool_registry, "get_formatted_datetime", lambda **kwargs: "18/10/2026")
+    tool_call, _ = registry.validate({"tool": "expense_manager", "instructions": {
+        "action": "log_expense", "amount": 3, "category": "food", "currency": ""}})
+    assert tool_call["instructions"] == {"action": "log_expense", "amount": 3, "currency": "USD",
+                                         "category": "food", "date": "18/10/2026"}
+
+
+@pytest.mark.parametrize("param_type, value, expected", [
+    ("number", "4", 4.0),
+    ("number", 4, 4),
+    ("integer", "7", 7),
+    ("integer", 7.0, 7),
+    ("boolean", " True", True),
+    ("boolean", False, False),
+    ("list", '[{"field": "category"}]', [{"field": "category"}]),
+    ("list", ["amount"], ["amount"]),
+    ("string", 5, "5"),
+    ("date", "01/02/2025", "01/02/2025"),
+    ("datetime", "01/02/2025 17:30", "01/02/2025 17:30"),
+])
+def test_coerce(registry, param_type, value, expected):
+    coerced = registry._coerce(value, param_type)
+    assert coerced == expected and type(coerced) is type(expected)
+
+
+@pytest.mark.parametrize("param_type, value", [
+    ("number", True),
+    ("number", "ten"),
+    ("integer", 2.5),
+    ("integer", False),
+    ("boolean", "yes"),
+    ("boolean", 1),
+    ("list", '{"a": 1}'),
+    ("list", "not json"),
+    ("date", "2025-02-01"),
+    ("datetime", "01/02/2025"),
+])
+def test_coerce_rejects(registry, param_type, value):
+    with pytest.raises((TypeError, ValueError)):
+        registry._coerce(value, param_type)
+
+
+def test_invalid_calls(registry):
+    assert registry.validate("{not json")[1][0].startswith("tool call is not valid JSON")
+    assert registry.validate(["calendar"]) == (None, ["tool call must be a JSON object"])
+    assert registry.validate({"tool": "diary", "instructions": {}}) == (None, ["unknown tool: diary"])
+    assert registry.validate({"tool": "calendar", "instructions": "view"}) == (None, ["instructions must be a JSON object"])
+    assert registry.validate({"tool": "calendar", "instructions": {"action": "delete"}}) == \
+        (None, ["unknown action for calendar: delete"])
+
+
+def test_all_problems_are_reported(registry):
+    tool_call, errors = registry.validate({"tool": "calendar", "instructions": {
+        "action": "create", "start_time": "tomorrow at 5", "allow_conflicts": "maybe"}})
+    assert tool_call is None
+    assert errors == ["invalid datetime for start_time: 'tomorrow at 5'",
+                      "missing required parameter: description",
+                      "invalid boolean for allow_conflicts: 'maybe'"]
+
+
+def mas():
+    system = MAS_system_1.__new__(MAS_system_1)
+    system.logger = logging.getLogger("test")
+    system.tool_registry = ToolRegistry()
+    return system
+
+
+VIEW_CALL = {"tool": "calendar", "instructions": {"action": "view", "date": "03/04/2025"}}
+
+
+def starts_tool_handler(system, fields, key="tool_usage_response"):
+    """Whether the streamed response starts the tool handler agent once key is complete"""
+    return system._tool_request_complete(key, dict({"tool_usage_flag": True}, **fields))
+
+
+def test_main_agent_tool_call_is_dispatched_directly():
+    system = mas()
+    assert system._validated_tool_call({"tool_call": json.dumps(VIEW_CALL)}) == VIEW_CALL
+    assert not starts_tool_handler(system, {"tool_call": VIEW_CALL})
+
+
+@pytest.mark.parametrize("tool_call", [None, "", "None", "null",
+                                       {"tool": "calendar", "instructions": {"action": "view", "date": "today"}}])
+def test_missing_or_invalid_tool_call_uses_the_tool_handler(tool_call):
+    system = mas()
+    assert system._validated_tool_call({"tool_call": tool_call}) is None
+    assert starts_tool_handler(system, {"tool_call": tool_call})
+
+
+def test_tool_handler_not_started_early_otherwise():
+    system = mas()
+    assert not starts_tool_handler(system, {"tool_call": None, "invoke_another_agent_flag": True})
+    assert not starts_tool_handler(system, {"tool_call": None, "tool_usage_flag": False})
+    assert not starts_tool_handler(system, {"tool_call": None}, key="tool_call")